@@ -0,0 +1,139 @@
+"""
+Flask（werkzeug 多线程）与 ASGI（AsyncDeviceController + 内置 asyncio 服务器）设备接口对比压测
+
+1. 吞吐 / 延迟：两种服务各在独立进程中运行，多进程客户端以相同负载请求（复用 bench_gateway.run_load）
+2. 长轮询：ASGI 服务上同时挂起 N 个 GET /api/devices/<id>/state?wait=...，
+   一次控制请求后统计全部等待者返回的延迟，以及挂起期间服务进程的线程数
+
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_asgi --clients 8 --devices 100 --duration 10 --waiters 1000
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+from Cloud.benchmark.bench_gateway import run_load
+from Cloud.benchmark.fleet import percentile
+from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+from Cloud.client.util.Logs import configure_subsystem
+
+
+def _serve_flask(conn):
+    from werkzeug.serving import make_server
+    from Cloud.client.controller import DeviceController
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, DeviceController.app, threaded=True)
+    conn.send(server.port)
+    conn.close()
+    server.serve_forever()
+
+
+def _serve_asgi(conn):
+    from Cloud.client.controller import AsyncDeviceController
+    from Cloud.client.util.Asgi import Server
+
+    def ready(port):
+        conn.send(port)
+        conn.close()
+    asyncio.run(Server(AsyncDeviceController.app, "127.0.0.1", 0).serve_forever(ready))
+
+
+def _start(target):
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=target, args=(child,), daemon=True)
+    process.start()
+    return process, parent.recv()
+
+
+def _threads(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("Threads:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _register(port: int, device_ids):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    for device_id in device_ids:
+        connection.request("POST", "/api/devices", json.dumps({"type": "light", "device_id": device_id}),
+                           {"Content-Type": "application/json"})
+        connection.getresponse().read()
+    connection.close()
+
+
+async def _long_poll(port: int, pid: int, device_id: str, waiters: int, timeout: float):
+    """N 个连接同时等待同一设备的下一次状态，控制请求发出后统计各自返回的延迟"""
+    connections = []
+    for _ in range(waiters):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET /api/devices/{device_id}/state?wait={timeout} HTTP/1.1\r\n"
+                     f"Host: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+        connections.append((reader, writer))
+    await asyncio.sleep(1.0)
+    threads = _threads(pid)
+
+    body = json.dumps({"state": "on"})
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    sent = time.perf_counter()
+    writer.write(f"POST /api/devices/{device_id}/control HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n{body}".encode())
+
+    async def finish(reader, writer):
+        await reader.read()
+        writer.close()
+        return time.perf_counter() - sent
+
+    latencies_ms = [s * 1000 for s in await asyncio.gather(*(finish(r, w) for r, w in connections))]
+    return {
+        "waiters": waiters,
+        "server_threads_while_waiting": threads,
+        "wake_p50_ms": round(percentile(latencies_ms, 0.50), 3),
+        "wake_p99_ms": round(percentile(latencies_ms, 0.99), 3),
+        "wake_max_ms": round(max(latencies_ms), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask vs ASGI device API benchmark")
+    parser.add_argument("--clients", type=int, default=8, help="客户端进程数（每个一条长连接）")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--waiters", type=int, default=1000, help="长轮询并发等待数（0 跳过）")
+    args = parser.parse_args()
+
+    configure_subsystem("broker", level=logging.WARNING)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    broker = EmbeddedBroker("127.0.0.1", 0).start_in_thread()
+    os.environ["MQTT_BROKER"] = "127.0.0.1"
+    os.environ["MQTT_PORT"] = str(broker.port)
+    device_ids = [f"asgi_light_{i}" for i in range(args.devices)]
+
+    result = {"cpu_count": os.cpu_count(), "clients": args.clients, "devices": args.devices}
+    for name, target in (("flask", _serve_flask), ("asgi", _serve_asgi)):
+        process, port = _start(target)
+        _register(port, device_ids)
+        result[name] = run_load(port, device_ids, args.clients, args.duration, args.write_ratio)
+        result[name]["server_threads"] = _threads(process.pid)
+        if name == "asgi" and args.waiters:
+            result["asgi_long_poll"] = asyncio.run(
+                _long_poll(port, process.pid, device_ids[0], args.waiters, timeout=30))
+        process.terminate()
+        process.join(timeout=5)
+
+    broker.stop_thread()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+JSON 编解码微基准：标准库 json vs. Codec（orjson 或纯 Python 回退）
+
+用法（仓库根目录）：python -m Cloud.benchmark.bench_codec [--number 100000]
+"""
+import argparse
+import json
+import time
+import timeit
+from datetime import datetime
+from enum import Enum
+
+from Cloud.client.util import Codec
+
+
+class _DeviceType(Enum):
+    LIGHT = "light"
+
+
+# 各热点路径上的典型负载
+PAYLOADS = {
+    "bulb_state": {"state": "on", "brightness": 75, "color": "white", "timestamp": int(time.time())},
+    "lock_state": {"locked": True, "timestamp": time.time()},
+    "sensor_state": {"temperature": 25.3, "humidity": 48.2, "light": 512, "timestamp": time.time()},
+    "bulb_command": {"brightness": 40},
+    "device_list_100": [
+        {"device_id": f"bulb_{i}", "type": "light",
+         "state": {"device_id": f"bulb_{i}", "state": "on", "brightness": i % 100, "color": "warm"}}
+        for i in range(100)
+    ],
+    "iot_device": {"type": _DeviceType.LIGHT, "name": "主卧灯", "status": "off", "brightness": 70,
+                   "last_update": datetime.now(), "user_id": "user_001"},
+}
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, default=Codec._default).encode('utf-8')
+
+
+def run(number):
+    rows = []
+    for name, payload in PAYLOADS.items():
+        encoded = Codec.dumps(payload)
+        results = {}
+        for label, encode, decode in (
+            ("json", _stdlib_dumps, json.loads),
+            (Codec.BACKEND, Codec.dumps, Codec.loads),
+        ):
+            n = max(1, number // (100 if name == "device_list_100" else 1))
+            enc = timeit.timeit(lambda: encode(payload), number=n) / n
+            dec = timeit.timeit(lambda: decode(encoded), number=n) / n
+            results[label] = (enc, dec)
+        rows.append((name, len(encoded), results))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"Codec backend: {Codec.BACKEND}")
+    print(f"{'payload':<16}{'bytes':>7}{'json enc':>12}{'codec enc':>12}{'json dec':>12}{'codec dec':>12}")
+    for name, size, results in run(args.number):
+        (json_enc, json_dec), (codec_enc, codec_dec) = results["json"], results[Codec.BACKEND]
+        print(f"{name:<16}{size:>7}{json_enc * 1e6:>10.2f}us{codec_enc * 1e6:>10.2f}us"
+              f"{json_dec * 1e6:>10.2f}us{codec_dec * 1e6:>10.2f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+设备列表压缩压测：N 台设备时 GET /api/devices/view 每次请求的响应字节数和服务端 CPU 时间
+  - identity：不压缩
+  - <编码>_cold：每次请求前清空快照缓存（相当于每次重新序列化并压缩）
+  - <编码>_cached：设备未变化，直接返回缓存的压缩结果
+  - <编码>_changing：每次请求前有一台设备状态变化（重新序列化和压缩一次）
+可用编码取决于安装了哪些可选依赖（gzip 总是可用，br 需要 brotli，zstd 需要 zstandard）
+压测前先做一次缓存一致性检查（设备建连期间请求 /view 后，新设备必须出现在列表中）
+
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_compression --sizes 1000,10000 --requests 50
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from unittest import mock
+
+from Cloud.client.controller import DeviceController
+from Cloud.client.entity.Bulb import SmartBulb
+from Cloud.client.util import Compression
+
+
+def measure(client, accept_encoding, requests: int, before=None):
+    """返回平均响应字节数和平均 CPU 毫秒"""
+    headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+    size, cpu = 0, 0.0
+    for _ in range(requests):
+        if before is not None:
+            before()
+        start = time.process_time()
+        response = client.get("/api/devices/view", headers=headers)
+        body = response.get_data()
+        cpu += time.process_time() - start
+        size += len(body)
+        assert response.headers.get("Content-Encoding") == accept_encoding
+    return {"bytes": size // requests, "cpu_ms": round(cpu / requests * 1000, 3)}
+
+
+def check_create_during_view(client, manager):
+    """
+    回归检查：设备建连期间的 /view 不能把旧列表缓存在新版本号下
+    （create_device 先登记设备再推进变更序号，否则建连完成后 /view 仍看不到新设备）
+    """
+    connecting = threading.Event()
+    release = threading.Event()
+
+    def slow_connect(self):
+        connecting.set()
+        release.wait(5)
+        return True
+
+    with mock.patch.object(SmartBulb, "connect", slow_connect):
+        creator = threading.Thread(target=manager.create_device,
+                                   args=("light", "consistency_bulb"), kwargs={"broker": "127.0.0.1", "port": 1883})
+        creator.start()
+        connecting.wait(5)
+        client.get("/api/devices/view")
+        release.set()
+        creator.join()
+    listed = {device["device_id"] for device in client.get("/api/devices/view").get_json()}
+    assert "consistency_bulb" in listed, "/api/devices/view is missing a device created during a view request"
+    manager.delete_device("consistency_bulb")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response compression benchmark")
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    manager = DeviceController.manager
+    snapshots = DeviceController.snapshots
+    client = DeviceController.app.test_client()
+    check_create_during_view(client, manager)
+    result = {"encodings": list(Compression.ENCODINGS), "runs": []}
+    for size in (int(s) for s in args.sizes.split(",")):
+        for device_id in list(manager.devices):
+            manager.changes.forget(device_id)
+            manager.groups.forget(device_id)
+            del manager.devices[device_id]
+        devices = []
+        for i in range(size):
+            device = SmartBulb(f"bench_light_{i}", "127.0.0.1")
+            device._publish_state = lambda: None  # 只测序列化和压缩
+            device.update_state(state=rng.choice(("on", "off")))
+            manager.devices[device.device_id] = device
+            manager.changes.track(device.device_id, "light", device)
+            devices.append(device)
+
+        def change_one():
+            rng.choice(devices).update_state(state=rng.choice(("on", "off")))
+
+        snapshots.clear()
+        run = {"devices": size, "identity": measure(client, None, args.requests, snapshots.clear)}
+        for encoding in Compression.ENCODINGS:
+            run[f"{encoding}_cold"] = measure(client, encoding, args.requests, snapshots.clear)
+            measure(client, encoding, 1)
+            run[f"{encoding}_cached"] = measure(client, encoding, args.requests)
+            run[f"{encoding}_changing"] = measure(client, encoding, args.requests, change_one)
+        result["runs"].append(run)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
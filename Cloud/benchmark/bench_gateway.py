@@ -0,0 +1,126 @@
+"""
+分片网关压测：分别以 1..N 个分片启动 ShardedGateway，多进程客户端经前端路由并发请求
+（默认 80% GET /api/devices/<id>/state、20% POST /api/devices/<id>/control），
+输出各分片数下的吞吐和延迟分位数；shards=1 时另测直连分片（无路由）作为基线
+
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_gateway --shards 1,2,4 --clients 8 --devices 100 --duration 10
+吞吐能否随分片数增长取决于机器核数（分片进程、路由进程、客户端进程共享 CPU）
+"""
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from Cloud.benchmark.fleet import percentile
+from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+from Cloud.client.controller.ShardedGateway import ShardedGateway
+from Cloud.client.util.Logs import configure_subsystem
+
+
+def _client(port: int, device_ids, duration: float, write_ratio: float, seed: int, results):
+    """客户端进程：一条长连接上顺序发请求，返回每个请求的延迟（秒）"""
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        device_id = rng.choice(device_ids)
+        start = time.perf_counter()
+        if rng.random() < write_ratio:
+            body = json.dumps({"state": rng.choice(("on", "off"))})
+            connection.request("POST", f"/api/devices/{device_id}/control", body,
+                               {"Content-Type": "application/json"})
+        else:
+            connection.request("GET", f"/api/devices/{device_id}/state")
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors += 1
+    connection.close()
+    results.put((latencies, errors))
+
+
+def run_load(port: int, device_ids, clients: int, duration: float, write_ratio: float):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=_client, args=(port, device_ids, duration, write_ratio, i, results))
+                 for i in range(clients)]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        samples, failed = results.get()
+        latencies.extend(samples)
+        errors += failed
+    for process in processes:
+        process.join()
+    samples_ms = [s * 1000 for s in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(samples_ms, 0.50), 3) if samples_ms else None,
+        "p99_ms": round(percentile(samples_ms, 0.99), 3) if samples_ms else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded gateway benchmark")
+    parser.add_argument("--shards", default="1,2,4", help="逗号分隔的分片数")
+    parser.add_argument("--clients", type=int, default=8, help="客户端进程数（每个一条长连接）")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    for subsystem in ("gateway", "broker"):
+        configure_subsystem(subsystem, level=logging.WARNING)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    # 代理在本进程，分片进程（spawn）通过环境变量连接它
+    broker = EmbeddedBroker("127.0.0.1", 0).start_in_thread()
+    os.environ["MQTT_BROKER"] = "127.0.0.1"
+    os.environ["MQTT_PORT"] = str(broker.port)
+    device_ids = [f"gw_light_{i}" for i in range(args.devices)]
+
+    result = {"cpu_count": os.cpu_count(), "clients": args.clients, "devices": args.devices, "runs": []}
+    for shards in (int(s) for s in args.shards.split(",")):
+        gateway = ShardedGateway(shards)
+        gateway.start_shards()
+        ready = threading.Event()
+        threading.Thread(target=gateway.serve, kwargs={"port": 0, "ready": lambda port: ready.set()},
+                         daemon=True).start()
+        ready.wait()
+        port = gateway.router.port
+
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        for device_id in device_ids:
+            connection.request("POST", "/api/devices", json.dumps({"type": "light", "device_id": device_id}),
+                               {"Content-Type": "application/json"})
+            connection.getresponse().read()
+        connection.request("GET", "/api/devices/view")
+        listed = len(json.loads(connection.getresponse().read()))
+        connection.close()
+
+        run = {"shards": shards, "listed_devices": listed,
+               "gateway": run_load(port, device_ids, args.clients, args.duration, args.write_ratio)}
+        if shards == 1:
+            run["direct"] = run_load(gateway.router.ports[0], device_ids, args.clients, args.duration,
+                                     args.write_ratio)
+        run["forwarded_per_shard"] = list(gateway.router.forwarded)
+        result["runs"].append(run)
+        gateway.stop()
+
+    broker.stop_thread()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
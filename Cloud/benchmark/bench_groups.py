@@ -0,0 +1,94 @@
+"""
+分组聚合压测：N 台设备分到若干房间（房间挂在楼层下），对比
+  - 读一个房间的聚合状态：GroupRegistry（增量维护） vs 遍历 list_devices() 现算（原先仪表盘的做法）
+  - 每次设备状态变化的额外开销（监听里更新所属房间和楼层的聚合）
+
+设备不连接代理，只走状态更新和监听路径
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_groups --devices 10000 --rooms 100 --updates 100000
+"""
+import argparse
+import json
+import random
+import time
+
+from Cloud.client.controller.GroupRegistry import GroupRegistry
+from Cloud.client.entity.Bulb import SmartBulb
+
+
+def scan_room(devices, members):
+    """不用分组时的做法：遍历全部设备，现算某个房间的开灯数和平均亮度"""
+    on, brightness = 0, 0
+    for device_id, device in devices.items():
+        if device_id in members:
+            state = device.current_state
+            if state["state"] == "on":
+                on += 1
+                brightness += state["brightness"]
+    return on, brightness / on if on else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group aggregate benchmark")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--updates", type=int, default=100000)
+    parser.add_argument("--reads", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    registry = GroupRegistry()
+    registry.create_group("floor_1")
+    for r in range(args.rooms):
+        registry.create_group(f"room_{r}", kind="room", parent="floor_1")
+
+    devices = {}
+    for i in range(args.devices):
+        device_id = f"bench_light_{i}"
+        device = SmartBulb(device_id, "127.0.0.1")
+        device._publish_state = lambda: None  # 只测状态和监听路径
+        devices[device_id] = device
+        registry.track(device_id, "light", device)
+        registry.add_member(f"room_{i % args.rooms}", device_id)
+
+    plain = SmartBulb("bench_plain", "127.0.0.1")
+    plain._publish_state = lambda: None
+    commands = [("on", rng.randint(1, 100)) if rng.random() < 0.5 else ("off", None) for _ in range(args.updates)]
+    start = time.perf_counter()
+    for state, brightness in commands:
+        plain.update_state(state=state, brightness=brightness)
+    baseline = time.perf_counter() - start
+
+    targets = [devices[f"bench_light_{rng.randrange(args.devices)}"] for _ in range(args.updates)]
+    start = time.perf_counter()
+    for device, (state, brightness) in zip(targets, commands):
+        device.update_state(state=state, brightness=brightness)
+    grouped = time.perf_counter() - start
+
+    members = registry.groups["room_0"].members
+    start = time.perf_counter()
+    for _ in range(args.reads):
+        registry.get("room_0")
+    read_aggregate = time.perf_counter() - start
+    scan_reads = max(1, args.reads // 100)
+    start = time.perf_counter()
+    for _ in range(scan_reads):
+        expected = scan_room(devices, members)
+    read_scan = time.perf_counter() - start
+
+    summary = registry.get("room_0")["lights"]
+    assert summary["on"] == expected[0]
+
+    print(json.dumps({
+        "devices": args.devices,
+        "rooms": args.rooms,
+        "update_us": round(baseline / args.updates * 1e6, 2),
+        "update_with_groups_us": round(grouped / args.updates * 1e6, 2),
+        "room_read_aggregate_us": round(read_aggregate / args.reads * 1e6, 2),
+        "room_read_scan_us": round(read_scan / scan_reads * 1e6, 2),
+        "room_0_lights": summary
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+惰性连接压测：对比常连（eager）与惰性（lazy）两种模式下大部分设备空闲时的套接字、线程与内存占用，
+并测挂起设备被命令唤醒时的 命令→状态 延迟
+
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_lazy --mode eager --devices 200
+    python -m Cloud.benchmark.bench_lazy --mode lazy --devices 5000 --commands 200 --idle-timeout 2
+（eager 模式受 paho select() 的 1024 文件描述符上限约束，单进程约 250 台）
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import time
+
+from Cloud.benchmark.fleet import LatencyMonitor, percentile, resource_usage
+from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+from Cloud.client.controller.LazyConnector import ACTIVE
+from Cloud.client.controller.Manager import DeviceManager
+from Cloud.client.util.Codec import dumps
+from Cloud.client.util.Logs import configure_subsystem
+
+
+def open_fds() -> int:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+
+def footprint():
+    usage = resource_usage()
+    usage["fds"] = open_fds()
+    return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lazy MQTT connection benchmark")
+    parser.add_argument("--mode", choices=("eager", "lazy"), default="lazy")
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--commands", type=int, default=100, help="发给随机挂起设备的命令数")
+    parser.add_argument("--idle-timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    for subsystem in ("bulb", "lock", "sensor", "manager", "broker", "lazy"):
+        configure_subsystem(subsystem, level=logging.WARNING)
+    random.seed(0)
+
+    broker = EmbeddedBroker("127.0.0.1", 0).start_in_thread()
+    monitor = LatencyMonitor("127.0.0.1", broker.port)
+    time.sleep(0.3)
+
+    manager = DeviceManager()
+    manager.connect_mode = args.mode
+    manager.idle_timeout = args.idle_timeout
+
+    before = footprint()
+    start = time.perf_counter()
+    ids = [f"lazy_light_{i}" for i in range(args.devices)]
+    for device_id in ids:
+        manager.create_device("light", device_id, broker="127.0.0.1", port=broker.port)
+    created = time.perf_counter() - start
+    if args.mode == "eager":
+        while len(monitor.devices_seen) < args.devices and time.perf_counter() - start < 60:
+            time.sleep(0.1)
+    time.sleep(0.5)
+    after = footprint()
+
+    result = {
+        "mode": args.mode,
+        "devices": args.devices,
+        "create_seconds": round(created, 3),
+        "idle_fds": after["fds"] - before["fds"],
+        "idle_threads": after["threads"] - before["threads"],
+        "idle_rss_mb": round(after["rss_mb"] - before["rss_mb"], 1),
+        "idle_rss_kb_per_device": round((after["rss_mb"] - before["rss_mb"]) * 1024 / args.devices, 2)
+    }
+
+    # 给随机设备发命令（lazy 模式下它们处于挂起状态，需要先唤醒）
+    monitor.samples.clear()
+    targets = random.sample(ids, min(args.commands, len(ids)))
+    for device_id in targets:
+        if not monitor.try_begin(device_id):
+            continue
+        monitor.client.publish(f"home/lights/{device_id}/control/set_state", dumps({"state": "on"}), qos=1)
+        time.sleep(0.01)
+    deadline = time.perf_counter() + 10
+    while monitor.outstanding() and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    samples_ms = [s * 1000 for s in monitor.samples]
+    result["command_latency_ms"] = {
+        "completed": len(samples_ms),
+        "p50": percentile(samples_ms, 0.50),
+        "p99": percentile(samples_ms, 0.99),
+        "max": max(samples_ms) if samples_ms else None
+    }
+
+    if args.mode == "lazy":
+        connector = next(iter(manager.connectors.values()))
+        result["active_after_commands"] = sum(1 for i in ids if connector.state_of(i) == ACTIVE)
+        time.sleep(args.idle_timeout * 2 + 0.5)
+        result["active_after_idle"] = sum(1 for i in ids if connector.state_of(i) == ACTIVE)
+        result["fds_after_idle"] = open_fds() - before["fds"]
+
+    for device_id in ids:
+        manager.delete_device(device_id)
+    for connector in manager.connectors.values():
+        connector.stop()
+    monitor.stop()
+    broker.stop_thread()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
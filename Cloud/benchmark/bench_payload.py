@@ -0,0 +1,49 @@
+"""
+状态负载体积对比：JSON vs. MessagePack / CBOR（含 MQTT 5.0 Content-Type 属性开销）
+
+用法（仓库根目录）：python -m Cloud.benchmark.bench_payload [--devices 10000]
+"""
+import argparse
+import time
+
+from Cloud.client.util import Payload
+
+# 与各实体 _publish_state 发布的字段一致
+STATES = {
+    "SmartBulb": {"state": "on", "brightness": 75, "color": "white", "timestamp": int(time.time())},
+    "SmartLock": {"locked": True, "timestamp": time.time()},
+    "EnvironmentSensor": {"temperature": 25.3, "humidity": 48.2, "light": 512, "timestamp": time.time()},
+}
+
+
+def wire_size(state, content_type):
+    """负载字节数 + Content-Type 属性（1 字节标识 + 2 字节长度 + 内容）"""
+    return len(Payload.encode(state, content_type)) + 3 + len(content_type)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=10_000, help="估算保留消息总量时的设备数")
+    args = parser.parse_args()
+
+    formats = Payload.available()
+    print(f"可用格式: {', '.join(formats)}")
+    header = f"{'device':<20}" + "".join(f"{t.split('/')[1]:>14}" for t in formats)
+    print(header)
+    for name, state in STATES.items():
+        json_size = wire_size(state, Payload.JSON)
+        cells = []
+        for content_type in formats:
+            size = wire_size(state, content_type)
+            saving = (1 - size / json_size) * 100
+            cells.append(f"{size:>6}B {saving:>5.1f}%")
+        print(f"{name:<20}" + "".join(f"{c:>14}" for c in cells))
+
+    print(f"\n{args.devices} 台设备保留状态总量（每类各 {args.devices // 3} 台）:")
+    for content_type in formats:
+        total = sum(wire_size(state, content_type) for state in STATES.values()) * (args.devices // 3)
+        print(f"  {content_type:<22}{total / 1024:>10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+重连风暴压测：N 台设备连上内置代理后重启代理，测全部设备恢复连接所需时间，
+以及门锁 / 传感器 / 灯泡各自的恢复时间（验证优先级）
+
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_reconnect --devices 200 --downtime 2
+    python -m Cloud.benchmark.bench_reconnect --devices 200 --rate 1000 --concurrency 1000   # 近似不限流
+（受 paho select() 的 1024 文件描述符上限约束，单进程约 250 台）
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Cloud.benchmark.fleet import percentile
+from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+from Cloud.client.controller.ReconnectCoordinator import coordinator
+from Cloud.client.entity.Bulb import SmartBulb
+from Cloud.client.entity.Lock import SmartLock
+from Cloud.client.entity.Sensor import EnvironmentSensor
+from Cloud.client.util.Logs import configure_subsystem
+
+KINDS = (("lock", SmartLock), ("sensor", EnvironmentSensor), ("bulb", SmartBulb))
+
+
+def wait_connected(devices, timeout: float) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if all(device.client.is_connected() for _, device in devices):
+            break
+        time.sleep(0.05)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconnect storm benchmark")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--downtime", type=float, default=2.0, help="代理停机秒数")
+    parser.add_argument("--rate", type=float, default=coordinator.rate, help="每秒允许发起的重连数")
+    parser.add_argument("--concurrency", type=int, default=coordinator.max_concurrent, help="同时进行的重连上限")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    for subsystem in ("bulb", "lock", "sensor", "broker", "reconnect"):
+        configure_subsystem(subsystem, level=logging.CRITICAL)
+    coordinator.rate = args.rate
+    coordinator.burst = max(1, int(args.rate))
+    coordinator.max_concurrent = args.concurrency
+
+    broker = EmbeddedBroker("127.0.0.1", 0).start_in_thread()
+    port = broker.port
+    devices = []
+    for i in range(args.devices):
+        kind, cls = KINDS[i % len(KINDS)]
+        devices.append((kind, cls(f"storm_{kind}_{i}", "127.0.0.1", port)))
+    for _, device in devices:
+        device.connect()
+    initial = wait_connected(devices, args.timeout)
+
+    # 重启代理（同一端口），所有会话同时断开
+    broker.stop_thread()
+    time.sleep(args.downtime)
+    broker = EmbeddedBroker("127.0.0.1", port).start_in_thread()
+    restarted = time.perf_counter()
+
+    # 记录每台设备重新连上的时刻
+    recovered = {}
+    while len(recovered) < len(devices) and time.perf_counter() - restarted < args.timeout:
+        now = time.perf_counter() - restarted
+        for index, (_, device) in enumerate(devices):
+            if index not in recovered and device.client.is_connected():
+                recovered[index] = now
+        time.sleep(0.01)
+
+    result = {
+        "devices": args.devices,
+        "downtime_seconds": args.downtime,
+        "rate": args.rate,
+        "concurrency": args.concurrency,
+        "initial_connect_seconds": round(initial, 3),
+        "recovered": len(recovered),
+        "full_recovery_seconds": round(max(recovered.values()), 3) if recovered else None,
+        "by_kind": {}
+    }
+    for kind, _ in KINDS:
+        times = [recovered[i] for i, (k, _) in enumerate(devices) if k == kind and i in recovered]
+        result["by_kind"][kind] = {
+            "recovered": len(times),
+            "p50_seconds": round(percentile(times, 0.50), 3) if times else None,
+            "max_seconds": round(max(times), 3) if times else None
+        }
+    result["coordinator"] = coordinator.stats()
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(lambda item: item[1].disconnect(), devices))
+    broker.stop_thread()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
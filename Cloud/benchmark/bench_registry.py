@@ -0,0 +1,114 @@
+"""
+设备注册表持久化压测：写入 N 台设备的变更日志、生成快照，再测冷加载与 DeviceManager 热重启就绪时间
+
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_registry --devices 50000
+    python -m Cloud.benchmark.bench_registry --devices 200 --connect parallel   # 连内置代理，测全部连上的时间
+
+注意：paho 客户端用 select() 轮询，文件描述符超过 1024 后无法工作，
+单进程内同时保持连接的设备约 250 台，parallel 模式请控制设备数
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Cloud.client.util.Logs import configure_subsystem
+from Cloud.client.util.RegistryStore import DEVICE_TYPES, DeviceRecord, RegistryStore
+
+
+def make_records(count: int, broker: str, port: int):
+    return [DeviceRecord(DEVICE_TYPES[i % 3], f"device_{i:06d}", broker, port) for i in range(count)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Device registry persistence benchmark")
+    parser.add_argument("--devices", type=int, default=50000)
+    parser.add_argument("--tail", type=float, default=0.02, help="快照后追加到日志的变更比例")
+    parser.add_argument("--connect", choices=("none", "lazy", "parallel"), default="lazy",
+                        help="热重启后的连接方式（parallel 会启动内置代理并等待全部连上）")
+    parser.add_argument("--dir", default=None, help="存储目录（默认临时目录，结束后删除）")
+    args = parser.parse_args()
+
+    for subsystem in ("bulb", "lock", "sensor", "manager", "broker"):
+        configure_subsystem(subsystem, level=logging.WARNING)
+
+    directory = args.dir or tempfile.mkdtemp(prefix="registry_bench_")
+    broker = None
+    host, port = "test.mosquitto.org", 1883
+    if args.connect == "parallel":
+        from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+        broker = EmbeddedBroker("127.0.0.1", 0).start_in_thread()
+        host, port = "127.0.0.1", broker.port
+
+    result = {"devices": args.devices, "connect": args.connect}
+    try:
+        records = make_records(args.devices, host, port)
+
+        # 1. 逐条追加（模拟逐个 POST 创建设备）
+        store = RegistryStore(directory, compact_every=args.devices * 2)
+        store.load()
+        sample = records[:min(len(records), 10000)]
+        _, elapsed = timed(lambda: [store.add(record) for record in sample])
+        result["append_us_per_record"] = round(elapsed / len(sample) * 1e6, 2)
+
+        # 2. 批量追加剩余记录并生成快照
+        _, elapsed = timed(lambda: store.add_many(records[len(sample):]))
+        result["bulk_append_seconds"] = round(elapsed, 4)
+        _, elapsed = timed(store.snapshot)
+        result["snapshot_seconds"] = round(elapsed, 4)
+        result["snapshot_bytes"] = os.path.getsize(store.snapshot_path)
+
+        # 3. 快照之后的日志尾部：一部分删除、一部分重新添加
+        tail = int(args.devices * args.tail)
+        for record in records[:tail // 2]:
+            store.delete(record.device_id)
+        store.add_many(records[:tail // 4])
+        result["log_tail_records"] = store.log_records
+        store.close()
+
+        # 4. 冷加载（快照 + 重放日志）
+        loaded, elapsed = timed(lambda: RegistryStore(directory).load())
+        result["load_seconds"] = round(elapsed, 4)
+        result["loaded_devices"] = len(loaded)
+
+        # 5. DeviceManager 热重启：重建全部设备实例即可对外服务
+        from Cloud.client.controller.Manager import DeviceManager
+        manager = DeviceManager()
+        restored, elapsed = timed(lambda: manager.enable_persistence(directory, connect=args.connect))
+        result["restored_devices"] = restored
+        result["time_to_ready_seconds"] = round(elapsed, 3)
+
+        if args.connect == "parallel":
+            start = time.perf_counter()
+            devices = list(manager.devices.values())
+            while time.perf_counter() - start < 60:
+                connected = sum(1 for device in devices if device.client.is_connected())
+                if connected == len(devices):
+                    break
+                time.sleep(0.2)
+            result["connected_devices"] = connected
+            result["time_to_connected_seconds"] = round(time.perf_counter() - start + elapsed, 3)
+            with ThreadPoolExecutor(max_workers=32) as pool:
+                list(pool.map(lambda device: device.disconnect(), devices))
+    finally:
+        if broker:
+            broker.stop_thread()
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
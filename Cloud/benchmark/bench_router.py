@@ -0,0 +1,94 @@
+"""
+主题路由压测：10 万条订阅下每秒可分发的消息数
+对比逐条调用 topic_matches 的线性扫描（原 EmbeddedBroker 的做法）、不带缓存的 trie 与带缓存的 trie
+
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_router --subscriptions 100000 --messages 200000
+"""
+import argparse
+import json
+import random
+import time
+
+from Cloud.broker.EmbeddedBroker import topic_matches
+from Cloud.client.util.TopicRouter import TopicRouter
+
+KINDS = ("lights", "locks", "sensors")
+COMMANDS = ("set_state", "set_brightness", "set_color", "get_state")
+
+
+def make_filters(count: int):
+    """每台设备一条 control/+ 订阅，外加少量跨设备的通配订阅"""
+    filters = [f"home/{KINDS[i % 3]}/device_{i}/control/+" for i in range(count - 4)]
+    filters += ["home/+/+/state", "home/lights/#", "home/+/+/control/#", "#"]
+    return filters
+
+
+def make_topics(count: int, devices: int, seed: int = 0):
+    rng = random.Random(seed)
+    topics = []
+    for _ in range(count):
+        i = rng.randrange(devices)
+        topics.append(f"home/{KINDS[i % 3]}/device_{i}/control/{rng.choice(COMMANDS)}")
+    return topics
+
+
+def rate(count: int, elapsed: float) -> float:
+    return round(count / elapsed, 1) if elapsed else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MQTT topic router benchmark")
+    parser.add_argument("--subscriptions", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--linear-messages", type=int, default=20, help="线性扫描太慢，只测少量消息")
+    parser.add_argument("--hot-devices", type=int, default=1000, help="消息集中在多少台设备上（决定缓存命中率）")
+    args = parser.parse_args()
+
+    filters = make_filters(args.subscriptions)
+    handled = [0]
+
+    def handler(slot, command, message):
+        handled[0] += 1
+
+    result = {"subscriptions": len(filters), "messages": args.messages}
+
+    # 1. 构建
+    start = time.perf_counter()
+    router = TopicRouter()
+    for index, topic_filter in enumerate(filters):
+        router.add(topic_filter, handler, index)
+    result["build_seconds"] = round(time.perf_counter() - start, 3)
+
+    hot = min(args.hot_devices, args.subscriptions - 4)
+    topics = make_topics(args.messages, hot)
+
+    # 2. 线性扫描
+    start = time.perf_counter()
+    for topic in topics[:args.linear_messages]:
+        for topic_filter in filters:
+            topic_matches(topic_filter, topic)
+    result["linear_msgs_per_sec"] = rate(args.linear_messages, time.perf_counter() - start)
+
+    # 3. trie（不缓存，每条消息切分主题并走树）
+    uncached = TopicRouter(cache_size=0)
+    for index, topic_filter in enumerate(filters):
+        uncached.add(topic_filter, handler, index)
+    start = time.perf_counter()
+    for topic in topics:
+        uncached.dispatch(topic)
+    result["trie_msgs_per_sec"] = rate(len(topics), time.perf_counter() - start)
+
+    # 4. trie + 主题缓存
+    start = time.perf_counter()
+    for topic in topics:
+        router.dispatch(topic)
+    result["trie_cached_msgs_per_sec"] = rate(len(topics), time.perf_counter() - start)
+
+    # 每条消息应匹配：设备自己的 control/+、home/+/+/control/#、# 以及灯的 home/lights/#
+    result["routes_per_message"] = round(handled[0] / (2 * len(topics)), 2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+场景激活压测：10 / 100 / 1000 台设备（80% 灯泡、20% 门锁）上反复在两个场景间切换，
+输出场景激活延迟（从开始下发到全部设备确认）的分位数；
+另测逐台下发并等待确认（手写脚本的做法）作为基线
+
+设备分布在多个子进程中（每个进程最多 --per-process 台，避开 select() 的文件描述符上限），代理在本进程
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_scenes --sizes 10,100,1000 --rounds 20
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+from Cloud.benchmark.fleet import percentile
+from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+from Cloud.client.controller.SceneEngine import SceneEngine
+from Cloud.client.util.Logs import configure_subsystem
+
+
+def device_type(i: int) -> str:
+    return "lock" if i % 5 == 4 else "light"
+
+
+def _host(port: int, start: int, count: int, conn):
+    """设备进程：连接 [start, start + count) 号设备，收到任意消息后断开退出"""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from Cloud.client.entity.Bulb import SmartBulb
+    from Cloud.client.entity.Lock import SmartLock
+
+    devices = []
+    for i in range(start, start + count):
+        cls = SmartLock if device_type(i) == "lock" else SmartBulb
+        device = cls(f"scene_dev_{i}", "127.0.0.1", port)
+        device.connect()
+        devices.append(device)
+    deadline = time.monotonic() + 30
+    while not all(device.client.is_connected() for device in devices) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    conn.send(sum(device.client.is_connected() for device in devices))
+    conn.recv()
+    for device in devices:
+        device.disconnect()
+
+
+def targets(size: int, on: bool):
+    scene = {}
+    for i in range(size):
+        if device_type(i) == "lock":
+            scene[f"scene_dev_{i}"] = {"type": "lock", "locked": not on}
+        elif on:
+            scene[f"scene_dev_{i}"] = {"type": "light", "state": "on", "brightness": 60, "color": "warm"}
+        else:
+            scene[f"scene_dev_{i}"] = {"type": "light", "state": "off"}
+    return scene
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scene activation benchmark")
+    parser.add_argument("--sizes", default="10,100,1000")
+    parser.add_argument("--rounds", type=int, default=20, help="每种规模的激活次数")
+    parser.add_argument("--per-process", type=int, default=200)
+    args = parser.parse_args()
+
+    configure_subsystem("broker", level=logging.WARNING)
+    configure_subsystem("controller", level=logging.ERROR)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    broker = EmbeddedBroker("127.0.0.1", 0).start_in_thread()
+    # 引擎先于设备连接，占用较小的文件描述符
+    engine = SceneEngine("127.0.0.1", broker.port, timeout=10.0)
+    engine.connect()
+
+    context = multiprocessing.get_context("spawn")
+    hosts, connected = [], 0
+    for start in range(0, max(sizes), args.per_process):
+        parent, child = context.Pipe()
+        process = context.Process(target=_host, daemon=True,
+                                  args=(broker.port, start, min(args.per_process, max(sizes) - start), child))
+        process.start()
+        hosts.append((process, parent))
+    for _, parent in hosts:
+        connected += parent.recv()
+    time.sleep(1.0)  # 等引擎收齐各设备的初始状态
+
+    result = {"cpu_count": os.cpu_count(), "devices_connected": connected, "runs": []}
+    for size in sizes:
+        engine.define(f"on_{size}", targets(size, True))
+        engine.define(f"off_{size}", targets(size, False))
+        latencies, statuses = [], {}
+        for r in range(args.rounds):
+            outcome = engine.activate(f"on_{size}" if r % 2 == 0 else f"off_{size}")
+            latencies.append(outcome["latency_ms"])
+            statuses[outcome["status"]] = statuses.get(outcome["status"], 0) + 1
+
+        # 基线：逐台下发，每台确认后再发下一台
+        for i, (device_id, target) in enumerate(targets(size, True).items()):
+            engine.define(f"single_{i}", {device_id: target})
+        begin = time.perf_counter()
+        for i in range(size):
+            engine.activate(f"single_{i}")
+        sequential_ms = (time.perf_counter() - begin) * 1000
+        for i in range(size):
+            engine.delete(f"single_{i}")
+        engine.activate(f"off_{size}")
+
+        result["runs"].append({
+            "devices": size,
+            "statuses": statuses,
+            "activation_p50_ms": round(percentile(latencies, 0.50), 3),
+            "activation_p99_ms": round(percentile(latencies, 0.99), 3),
+            "activation_max_ms": round(max(latencies), 3),
+            "sequential_ms": round(sequential_ms, 3)
+        })
+
+    for process, parent in hosts:
+        parent.send(None)
+    for process, _ in hosts:
+        process.join(timeout=10)
+    engine.disconnect()
+    broker.stop_thread()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+增量同步压测：N 台设备，每次刷新之间有一部分设备状态变化，对比
+  - 全量：GET /api/devices/view
+  - 增量：GET /api/devices/changes?since=<游标>（可选 gzip）
+每次刷新的响应字节数和服务端 CPU 时间（Flask 测试客户端，同进程内计时）
+
+设备不连接代理，只走状态更新和监听路径
+用法（仓库根目录）：
+    python -m Cloud.benchmark.bench_sync --sizes 1000,10000 --changed 0.01 --refreshes 50
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+
+from Cloud.client.controller import DeviceController
+from Cloud.client.entity.Bulb import SmartBulb
+
+
+def measure(client, path, headers, refreshes: int, mutate, on_body=None):
+    """每次请求前先改一批设备，返回平均字节数和平均 CPU 毫秒；path 是返回请求路径的函数"""
+    size, cpu = 0, 0.0
+    for _ in range(refreshes):
+        mutate()
+        start = time.process_time()
+        response = client.get(path(), headers=headers)
+        body = response.get_data()
+        cpu += time.process_time() - start
+        size += len(body)
+        if on_body is not None:
+            on_body(gzip.decompress(body) if "Content-Encoding" in response.headers else body)
+    return {"bytes": size // refreshes, "cpu_ms": round(cpu / refreshes * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delta sync benchmark")
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--changed", type=float, default=0.01, help="每次刷新之间状态变化的设备比例")
+    parser.add_argument("--refreshes", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    manager = DeviceController.manager
+    client = DeviceController.app.test_client()
+    result = {"changed": args.changed, "runs": []}
+    for size in (int(s) for s in args.sizes.split(",")):
+        for device_id in list(manager.devices):
+            manager.changes.forget(device_id)
+            manager.groups.forget(device_id)
+            del manager.devices[device_id]
+        devices = []
+        for i in range(size):
+            device = SmartBulb(f"sync_light_{i}", "127.0.0.1")
+            device._publish_state = lambda: None  # 只测状态和监听路径
+            manager.devices[device.device_id] = device
+            manager.changes.track(device.device_id, "light", device)
+            devices.append(device)
+
+        def mutate():
+            for device in rng.sample(devices, max(1, int(size * args.changed))):
+                device.update_state(state=rng.choice(("on", "off")))
+
+        cursor = [manager.changes.since(0)["cursor"]]
+
+        def delta():
+            return f"/api/devices/changes?since={cursor[0]}"
+
+        def advance(body):
+            cursor[0] = json.loads(body)["cursor"]
+
+        run = {"devices": size, "full": measure(client, lambda: "/api/devices/view", {}, args.refreshes, mutate)}
+        run["delta"] = measure(client, delta, {}, args.refreshes, mutate, advance)
+        run["delta_gzip"] = measure(client, delta, {"Accept-Encoding": "gzip"}, args.refreshes, mutate, advance)
+        result["runs"].append(run)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
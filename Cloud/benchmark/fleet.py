@@ -0,0 +1,323 @@
+"""
+设备集群模拟与压测：在本地代理上启动 N 个模拟设备，按设定速率下发命令/上报遥测，
+输出吞吐、命令→状态延迟分位数、CPU、RSS、线程数（JSON，便于回归对比）
+
+用法（仓库根目录）：
+    python -m Cloud.benchmark.fleet --bulbs 200 --locks 50 --sensors 50 --rate 500 --duration 10
+    python -m Cloud.benchmark.fleet --mode http --output results.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import paho.mqtt.client as mqtt
+
+from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+from Cloud.client.controller.BulbController import BulbController
+from Cloud.client.entity.Bulb import SmartBulb
+from Cloud.client.entity.Lock import SmartLock
+from Cloud.client.entity.Sensor import EnvironmentSensor
+from Cloud.client.util import Codec
+
+
+def percentile(samples: List[float], p: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def resource_usage() -> Dict[str, float]:
+    """当前进程 CPU 时间、常驻内存与线程数"""
+    times = os.times()
+    rss_mb = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_mb = int(line.split()[1]) / 1024
+    except OSError:
+        # 非 Linux：退回峰值 RSS（macOS 单位为字节）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return {
+        "cpu_seconds": times.user + times.system,
+        "rss_mb": round(rss_mb, 1),
+        "threads": threading.active_count()
+    }
+
+
+class LatencyMonitor:
+    """订阅所有状态主题，统计命令下发到对应状态发布之间的延迟"""
+
+    def __init__(self, broker: str, port: int):
+        self._pending: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.samples: List[float] = []
+        self.states_seen = 0
+        self.devices_seen = set()
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"fleet_monitor_{os.getpid()}",
+                                  protocol=mqtt.MQTTv5)
+        self.client.on_message = self._on_message
+        self.client.connect(broker, port, keepalive=60)
+        self.client.subscribe("home/+/+/state", qos=1)
+        self.client.loop_start()
+
+    def _on_message(self, client, userdata, message):
+        device_id = message.topic.split('/')[2]
+        now = time.perf_counter()
+        with self._lock:
+            self.states_seen += 1
+            self.devices_seen.add(device_id)
+            sent_at = self._pending.pop(device_id, None)
+            if sent_at is not None:
+                self.samples.append(now - sent_at)
+
+    def try_begin(self, device_id: str) -> bool:
+        """登记一条命令；该设备已有未完成命令时返回 False（每台设备同时只测一条）"""
+        with self._lock:
+            if device_id in self._pending:
+                return False
+            self._pending[device_id] = time.perf_counter()
+            return True
+
+    def cancel(self, device_id: str):
+        with self._lock:
+            self._pending.pop(device_id, None)
+
+    def outstanding(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stop(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class Fleet:
+    """一组模拟设备"""
+
+    def __init__(self, bulbs: int, locks: int, sensors: int, broker: str, port: int, manager=None):
+        self.broker = broker
+        self.port = port
+        self.bulbs: List[SmartBulb] = []
+        self.locks: List[SmartLock] = []
+        self.sensors: List[EnvironmentSensor] = []
+        prefix = f"fleet{os.getpid()}"
+        for kind, count, target in (("light", bulbs, self.bulbs), ("lock", locks, self.locks),
+                                    ("sensor", sensors, self.sensors)):
+            for i in range(count):
+                device_id = f"{prefix}_{kind}_{i}"
+                if manager is not None:
+                    manager.create_device(kind, device_id, broker=broker, port=port)
+                    device = manager.get_device(device_id)
+                else:
+                    cls = {"light": SmartBulb, "lock": SmartLock, "sensor": EnvironmentSensor}[kind]
+                    device = cls(device_id, broker, port)
+                    device.connect()
+                device.logger.setLevel(logging.WARNING)
+                target.append(device)
+
+    @property
+    def devices(self):
+        return self.bulbs + self.locks + self.sensors
+
+    def stop(self):
+        for device in self.devices:
+            device.disconnect()
+
+
+class Pacer:
+    """按固定速率节拍循环，直到时长结束"""
+
+    def __init__(self, rate: float, duration: float):
+        self.interval = 1.0 / rate if rate > 0 else None
+        self.deadline = time.perf_counter() + duration
+
+    def __iter__(self):
+        next_at = time.perf_counter()
+        while self.interval and time.perf_counter() < self.deadline:
+            yield
+            next_at += self.interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def _bulb_command(i: int) -> Dict:
+    return {"state": "on", "brightness": i % 101}
+
+
+def prepare_controllers(fleet: Fleet, controllers: int) -> List[BulbController]:
+    """为前 controllers 个灯泡创建 BulbController 并打开灯泡（灯泡关闭时不接受亮度命令）"""
+    ctrls = []
+    for bulb in fleet.bulbs[:controllers]:
+        ctrl = BulbController(bulb.device_id, fleet.broker, fleet.port)
+        ctrl.logger.setLevel(logging.WARNING)
+        ctrl.connect()
+        ctrls.append(ctrl)
+    time.sleep(1.0)
+    for ctrl in ctrls:
+        ctrl.turn_on()
+    time.sleep(0.5)
+    return ctrls
+
+
+def drive_mqtt(fleet: Fleet, monitor: LatencyMonitor, rate: float, duration: float,
+               ctrls: List[BulbController]) -> int:
+    """经 BulbController（灯）和直接 MQTT 命令（门锁）下发"""
+    targets = [("bulb", c) for c in ctrls] + [("lock", l) for l in fleet.locks]
+    sent = 0
+    for i, _ in enumerate(Pacer(rate, duration)):
+        kind, target = random.choice(targets)
+        device_id = target.bulb_id if kind == "bulb" else target.device_id
+        if not monitor.try_begin(device_id):
+            continue
+        if kind == "bulb":
+            ok = target.set_brightness(i % 101) if i % 2 else target.turn_on()
+        else:
+            ok = monitor.client.publish(f"home/locks/{device_id}/control/lock",
+                                        Codec.dumps({"locked": bool(i % 2)}), qos=1).rc == 0
+        if ok:
+            sent += 1
+        else:
+            monitor.cancel(device_id)
+    return sent
+
+
+def drive_http(fleet: Fleet, monitor: LatencyMonitor, rate: float, duration: float) -> int:
+    """经 DeviceController 的 Flask 接口下发（进程内 test client，不含网络栈开销）"""
+    from Cloud.client.controller.DeviceController import app
+    client = app.test_client()
+    targets = [(d.device_id, "bulb") for d in fleet.bulbs] + [(d.device_id, "lock") for d in fleet.locks]
+    sent = 0
+    for i, _ in enumerate(Pacer(rate, duration)):
+        device_id, kind = random.choice(targets)
+        if not monitor.try_begin(device_id):
+            continue
+        body = _bulb_command(i) if kind == "bulb" else {"locked": i % 2}
+        response = client.post(f"/api/devices/{device_id}/control", json=body)
+        if response.status_code == 200:
+            sent += 1
+        else:
+            monitor.cancel(device_id)
+    return sent
+
+
+def drive_telemetry(fleet: Fleet, rate: float, stop: threading.Event):
+    """传感器遥测：所有传感器合计每秒 rate 条读数"""
+    if not fleet.sensors or rate <= 0:
+        return
+    for _ in Pacer(rate, float("inf")):
+        if stop.is_set():
+            return
+        sensor = random.choice(fleet.sensors)
+        sensor.update_readings(random.uniform(18, 30), random.uniform(30, 70), random.randint(100, 900))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet load benchmark")
+    parser.add_argument("--bulbs", type=int, default=100)
+    parser.add_argument("--locks", type=int, default=20)
+    parser.add_argument("--sensors", type=int, default=20)
+    parser.add_argument("--mode", choices=("mqtt", "http"), default="mqtt")
+    parser.add_argument("--rate", type=float, default=200, help="命令速率（条/秒）")
+    parser.add_argument("--telemetry-rate", type=float, default=100, help="遥测速率（条/秒）")
+    parser.add_argument("--duration", type=float, default=10, help="压测时长（秒）")
+    parser.add_argument("--controllers", type=int, default=20, help="mqtt 模式下 BulbController 数量")
+    parser.add_argument("--broker", default=None, help="外部代理地址（默认启动内置代理）")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--output", default=None, help="结果 JSON 输出文件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(0)
+
+    broker = None
+    if args.broker is None:
+        broker = EmbeddedBroker("127.0.0.1", args.port).start_in_thread()
+        host, port = "127.0.0.1", broker.port
+    else:
+        host, port = args.broker, args.port or 1883
+
+    baseline = resource_usage()
+    manager = None
+    if args.mode == "http":
+        from Cloud.client.controller.Manager import DeviceManager
+        manager = DeviceManager()
+
+    started = time.perf_counter()
+    fleet = Fleet(args.bulbs, args.locks, args.sensors, host, port, manager)
+    monitor = LatencyMonitor(host, port)
+    total = len(fleet.devices)
+    while len(monitor.devices_seen) < total and time.perf_counter() - started < 60:
+        time.sleep(0.1)
+    ready_seconds = time.perf_counter() - started
+
+    stop = threading.Event()
+    telemetry = threading.Thread(target=drive_telemetry, args=(fleet, args.telemetry_rate, stop), daemon=True)
+    telemetry.start()
+
+    ctrls = prepare_controllers(fleet, args.controllers) if args.mode == "mqtt" else []
+    monitor.samples.clear()
+
+    before = resource_usage()
+    run_started = time.perf_counter()
+    if args.mode == "mqtt":
+        sent = drive_mqtt(fleet, monitor, args.rate, args.duration, ctrls)
+    else:
+        sent = drive_http(fleet, monitor, args.rate, args.duration)
+    # 等待在途命令的状态回执
+    drain_deadline = time.perf_counter() + 5
+    while monitor.outstanding() and time.perf_counter() < drain_deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - run_started
+    after = resource_usage()
+    stop.set()
+
+    samples_ms = [s * 1000 for s in monitor.samples]
+    result = {
+        "config": vars(args),
+        "devices": total,
+        "ready_seconds": round(ready_seconds, 3),
+        "commands_sent": sent,
+        "commands_completed": len(samples_ms),
+        "throughput_cmds_per_s": round(len(samples_ms) / elapsed, 1),
+        "states_seen": monitor.states_seen,
+        "latency_ms": {
+            "p50": percentile(samples_ms, 0.50),
+            "p99": percentile(samples_ms, 0.99),
+            "p999": percentile(samples_ms, 0.999),
+            "max": max(samples_ms) if samples_ms else None
+        },
+        "cpu_seconds": round(after["cpu_seconds"] - before["cpu_seconds"], 3),
+        "cpu_percent": round((after["cpu_seconds"] - before["cpu_seconds"]) / elapsed * 100, 1),
+        "rss_mb": after["rss_mb"],
+        "rss_delta_mb": round(after["rss_mb"] - baseline["rss_mb"], 1),
+        "threads": after["threads"],
+        "broker": broker.stats() if broker else None
+    }
+
+    for ctrl in ctrls:
+        ctrl.disconnect()
+    monitor.stop()
+    fleet.stop()
+    if broker:
+        broker.stop_thread()
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
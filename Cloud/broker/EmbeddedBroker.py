@@ -0,0 +1,385 @@
+import argparse
+import asyncio
+import logging
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.TopicRouter import TopicRouter
+
+# MQTT 控制报文类型
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+MQTT_V311 = 4
+MQTT_V5 = 5
+
+# 支持的最大 QoS（QoS 2 的报文会按 QoS 1 转发）
+MAX_QOS = 1
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """判断主题是否匹配订阅过滤器（支持 + / # 通配符）"""
+    if topic_filter == topic:
+        return True
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    # 以 $ 开头的系统主题不匹配首级通配符
+    if topic.startswith('$') and filter_parts[0] in ('+', '#'):
+        return False
+    for i, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[i]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value % 128
+        value //= 128
+        if value:
+            byte |= 0x80
+        out.append(byte)
+        if not value:
+            return bytes(out)
+
+
+def _decode_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    multiplier, value = 1, 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            return value, offset
+        multiplier *= 128
+
+
+def _read_string(data: bytes, offset: int) -> Tuple[bytes, int]:
+    length = struct.unpack_from('!H', data, offset)[0]
+    offset += 2
+    return data[offset:offset + length], offset + length
+
+
+def _encode_string(value: bytes) -> bytes:
+    return struct.pack('!H', len(value)) + value
+
+
+def _read_properties(data: bytes, offset: int) -> Tuple[bytes, int]:
+    """读取 MQTT 5.0 属性段，原样返回（含长度前缀）以便转发"""
+    length, start = _decode_varint(data, offset)
+    return data[offset:start + length], start + length
+
+
+def _packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([(packet_type << 4) | flags]) + _encode_varint(len(body)) + body
+
+
+_EMPTY_PROPERTIES = b'\x00'
+
+
+class _Session:
+    """一个客户端连接的会话状态（仅支持 clean session）"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.client_id = ""
+        self.version = MQTT_V311
+        self.subscriptions: Dict[str, Tuple[int, bool]] = {}  # 过滤器 -> (QoS, retain as published)
+        self.will: Optional[Tuple[str, bytes, int, bool, bytes]] = None
+        self._next_id = 0
+
+    def next_packet_id(self) -> int:
+        self._next_id = self._next_id % 65535 + 1
+        return self._next_id
+
+    def send(self, data: bytes):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+
+class EmbeddedBroker:
+    """
+    进程内轻量 MQTT 代理（MQTT 3.1.1 / 5.0）
+    支持 QoS 0/1、保留消息、+ / # 通配符，用于离线部署、集成测试和压测
+    不支持持久会话与 QoS 2 端到端语义
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 1883):
+        self.host = host
+        self.port = port
+        self.sessions: Dict[str, _Session] = {}
+        self.retained: Dict[str, Tuple[bytes, int, bytes]] = {}  # 主题 -> (负载, QoS, 属性)
+        self.router = TopicRouter()  # 订阅过滤器 -> 会话
+        self._retained_topics = TopicRouter(cache_size=0)  # 保留消息的主题，供通配订阅反向匹配
+        self.messages_in = 0
+        self.messages_out = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.logger = get_logger("broker")
+
+    # ---------- 生命周期 ----------
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        # port=0 时使用系统分配的端口
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"Embedded broker listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for session in list(self.sessions.values()):
+            session.writer.close()
+        self.sessions.clear()
+        self.router.clear()
+
+    def start_in_thread(self) -> "EmbeddedBroker":
+        """在后台线程中运行代理（供同步代码使用），监听就绪后返回"""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="EmbeddedBroker", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop_thread(self):
+        if self._loop and self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # ---------- 连接处理 ----------
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = _Session(writer)
+        clean_exit = False
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7F) * multiplier
+                    if not byte & 0x80:
+                        break
+                    multiplier *= 128
+                body = await reader.readexactly(length) if length else b''
+                packet_type, flags = header[0] >> 4, header[0] & 0x0F
+
+                if packet_type == DISCONNECT:
+                    clean_exit = True
+                    break
+                if not session.client_id and packet_type != CONNECT:
+                    break
+                self._dispatch(session, packet_type, flags, body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            self.logger.error(f"Protocol error from {session.client_id or 'unknown'}: {str(e)}")
+        finally:
+            if self.sessions.get(session.client_id) is session:
+                del self.sessions[session.client_id]
+            for topic_filter in session.subscriptions:
+                self.router.remove(topic_filter, slot=session)
+            if session.will and not clean_exit:
+                topic, payload, qos, retain, properties = session.will
+                self.publish(topic, payload, qos, retain, properties)
+            writer.close()
+
+    def _dispatch(self, session: _Session, packet_type: int, flags: int, body: bytes):
+        if packet_type == CONNECT:
+            self._on_connect(session, body)
+        elif packet_type == PUBLISH:
+            self._on_publish(session, flags, body)
+        elif packet_type == PUBREL:
+            session.send(_packet(PUBCOMP, 0, body[:2]))
+        elif packet_type == SUBSCRIBE:
+            self._on_subscribe(session, body)
+        elif packet_type == UNSUBSCRIBE:
+            self._on_unsubscribe(session, body)
+        elif packet_type == PINGREQ:
+            session.send(_packet(PINGRESP, 0, b''))
+        # PUBACK / PUBREC / PUBCOMP：不做重传，直接忽略
+
+    def _on_connect(self, session: _Session, body: bytes):
+        _, offset = _read_string(body, 0)  # 协议名
+        session.version = body[offset]
+        connect_flags = body[offset + 1]
+        offset += 4  # 协议级别 + 连接标志 + keepalive
+        if session.version == MQTT_V5:
+            _, offset = _read_properties(body, offset)
+
+        client_id, offset = _read_string(body, offset)
+        session.client_id = client_id.decode('utf-8') or f"auto-{id(session)}"
+
+        if connect_flags & 0x04:
+            will_properties = _EMPTY_PROPERTIES
+            if session.version == MQTT_V5:
+                will_properties, offset = _read_properties(body, offset)
+            will_topic, offset = _read_string(body, offset)
+            will_payload, offset = _read_string(body, offset)
+            session.will = (will_topic.decode('utf-8'), will_payload, (connect_flags >> 3) & 0x03,
+                            bool(connect_flags & 0x20), will_properties)
+
+        # 同一 client_id 重复连接时踢掉旧连接
+        previous = self.sessions.get(session.client_id)
+        if previous is not None:
+            previous.writer.close()
+        self.sessions[session.client_id] = session
+
+        if session.version == MQTT_V5:
+            session.send(_packet(CONNACK, 0, b'\x00\x00' + _EMPTY_PROPERTIES))
+        else:
+            session.send(_packet(CONNACK, 0, b'\x00\x00'))
+
+    def _on_publish(self, session: _Session, flags: int, body: bytes):
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        topic, offset = _read_string(body, 0)
+        packet_id = None
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+        properties = _EMPTY_PROPERTIES
+        if session.version == MQTT_V5:
+            properties, offset = _read_properties(body, offset)
+        payload = body[offset:]
+
+        if qos == 1:
+            session.send(_packet(PUBACK, 0, packet_id))
+        elif qos == 2:
+            session.send(_packet(PUBREC, 0, packet_id))
+
+        self.publish(topic.decode('utf-8'), payload, min(qos, MAX_QOS), retain, properties)
+
+    def _on_subscribe(self, session: _Session, body: bytes):
+        packet_id = body[:2]
+        offset = 2
+        if session.version == MQTT_V5:
+            _, offset = _read_properties(body, offset)
+
+        granted = bytearray()
+        new_filters = []
+        while offset < len(body):
+            topic_filter, offset = _read_string(body, offset)
+            options = body[offset]
+            offset += 1
+            qos = min(options & 0x03, MAX_QOS)
+            retain_as_published = bool(options & 0x08)
+            topic_filter = topic_filter.decode('utf-8')
+            session.subscriptions[topic_filter] = (qos, retain_as_published)
+            self.router.add(topic_filter, slot=session)
+            new_filters.append((topic_filter, qos))
+            granted.append(qos)
+
+        ack = packet_id + (_EMPTY_PROPERTIES if session.version == MQTT_V5 else b'') + bytes(granted)
+        session.send(_packet(SUBACK, 0, ack))
+
+        # 下发匹配的保留消息：精确过滤器直接查表，通配过滤器沿保留主题的 trie 匹配，不逐条扫描全部保留消息
+        for topic_filter, sub_qos in new_filters:
+            if '+' in topic_filter or '#' in topic_filter:
+                topics = [route.slot for route in self._retained_topics.match_filter(topic_filter)]
+            else:
+                topics = [topic_filter]
+            for topic in topics:
+                message = self.retained.get(topic)
+                if message is not None:
+                    payload, qos, properties = message
+                    self._deliver(session, topic, payload, min(qos, sub_qos), True, properties)
+
+    def _on_unsubscribe(self, session: _Session, body: bytes):
+        packet_id = body[:2]
+        offset = 2
+        if session.version == MQTT_V5:
+            _, offset = _read_properties(body, offset)
+        count = 0
+        while offset < len(body):
+            topic_filter, offset = _read_string(body, offset)
+            topic_filter = topic_filter.decode('utf-8')
+            if session.subscriptions.pop(topic_filter, None) is not None:
+                self.router.remove(topic_filter, slot=session)
+            count += 1
+        if session.version == MQTT_V5:
+            session.send(_packet(UNSUBACK, 0, packet_id + _EMPTY_PROPERTIES + b'\x00' * count))
+        else:
+            session.send(_packet(UNSUBACK, 0, packet_id))
+
+    # ---------- 消息路由 ----------
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False,
+                properties: bytes = _EMPTY_PROPERTIES):
+        """向所有匹配的订阅者转发消息（也可供进程内代码直接调用）"""
+        self.messages_in += 1
+        if retain:
+            if payload:
+                if topic not in self.retained:
+                    self._retained_topics.add(topic, slot=topic)
+                self.retained[topic] = (payload, qos, properties)
+            elif self.retained.pop(topic, None) is not None:
+                self._retained_topics.remove(topic, slot=topic)
+
+        # 同一会话有多个过滤器匹配时只投递一次，取其中最高的 QoS
+        best: Dict[_Session, Tuple[int, bool]] = {}
+        for route in self.router.match(topic):
+            session = route.slot
+            options = session.subscriptions.get(route.topic_filter)
+            if options is not None and (session not in best or options[0] > best[session][0]):
+                best[session] = options
+        for session, (sub_qos, retain_as_published) in best.items():
+            self._deliver(session, topic, payload, min(qos, sub_qos), retain and retain_as_published, properties)
+
+    def _deliver(self, session: _Session, topic: str, payload: bytes, qos: int, retain: bool,
+                 properties: bytes):
+        body = bytearray(_encode_string(topic.encode('utf-8')))
+        if qos:
+            body += struct.pack('!H', session.next_packet_id())
+        if session.version == MQTT_V5:
+            body += properties
+        body += payload
+        session.send(_packet(PUBLISH, (qos << 1) | int(retain), bytes(body)))
+        self.messages_out += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "clients": len(self.sessions),
+            "subscriptions": sum(len(s.subscriptions) for s in self.sessions.values()),
+            "retained": len(self.retained),
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedded MQTT broker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    broker = EmbeddedBroker(args.host, args.port)
+
+    async def main():
+        await broker.start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,332 @@
+"""
+设备接口的 ASGI 版本：路由和返回与 DeviceController（Flask）一致，处理函数为 async
+
+    python -m Cloud.client.controller.AsyncDeviceController --port 5000
+    uvicorn Cloud.client.controller.AsyncDeviceController:app --port 5000   （安装了 uvicorn 时）
+
+建立 MQTT 连接等阻塞操作放到线程池，读状态等内存操作直接在事件循环里完成；
+MQTT_EMBEDDED_BROKER=1 时内置代理与接口共用同一个事件循环
+另外支持长轮询：GET /api/devices/<device_id>/state?wait=秒数 会等到设备下一次发布状态（或超时）再返回
+"""
+import argparse
+import asyncio
+import os
+from typing import Dict, List
+
+import paho.mqtt.client as mqtt
+
+from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+from Cloud.client.controller.GroupRegistry import GroupError
+from Cloud.client.controller.Manager import CONTROLS, DeviceManager
+from Cloud.client.controller.SceneEngine import SceneError
+from Cloud.client.entity.Sensor import EnvironmentSensor
+from Cloud.client.util import Asgi, Compression, Metrics
+from Cloud.client.util.Asgi import Request, Response, json_response, run_blocking
+from Cloud.client.util.Codec import dumps
+from Cloud.client.util.CommandSchema import CommandError
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.Tracing import tracer
+
+DEFAULT_BROKER = os.getenv("MQTT_BROKER", "test.mosquitto.org")
+DEFAULT_PORT = int(os.getenv("MQTT_PORT", "1883"))
+
+# 长轮询最长等待秒数
+MAX_WAIT = 60.0
+
+logger = get_logger("asgi", "device_controller")
+app = Asgi.App("device_controller_asgi")
+manager = DeviceManager()
+snapshots = Compression.SnapshotCache()
+# 抓取时只按类型计数，不序列化设备状态
+Metrics.DEVICES.set_function(manager.count_devices)
+
+
+class StateWatcher:
+    """订阅 home/+/+/state，把设备状态消息转成事件循环中的通知（长轮询在这里等待）"""
+
+    def __init__(self, broker: str, port: int):
+        self.broker = broker
+        self.port = port
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._loop = None
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=f"asgi_watch_{os.getpid()}_{id(self):x}",
+            protocol=mqtt.MQTTv5
+        )
+        self.client.on_connect = lambda client, userdata, flags, reason_code, properties: \
+            client.subscribe("home/+/+/state", qos=0)
+        self.client.on_message = self._on_message
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        try:
+            await run_blocking(self.client.connect, self.broker, self.port, 60)
+            self.client.loop_start()
+        except OSError as e:
+            logger.warning("State watcher could not connect, long polls will time out: %s", e)
+
+    async def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def _on_message(self, client, userdata, msg):
+        # MQTT 网络线程：只有在有人等待时才切回事件循环
+        device_id = msg.topic.split('/')[2]
+        if device_id in self._waiters:
+            self._loop.call_soon_threadsafe(self._notify, device_id)
+
+    def _notify(self, device_id: str):
+        for future in self._waiters.pop(device_id, ()):
+            if not future.done():
+                future.set_result(True)
+
+    async def wait(self, device_id: str, timeout: float) -> bool:
+        """等待设备下一次发布状态，超时返回 False"""
+        future = self._loop.create_future()
+        self._waiters.setdefault(device_id, []).append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters = self._waiters.get(device_id)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[device_id]
+
+
+_runtime = {}
+
+
+@app.on_startup
+async def _start():
+    global DEFAULT_BROKER
+    if os.getenv("MQTT_EMBEDDED_BROKER") == "1":
+        broker = EmbeddedBroker("127.0.0.1", DEFAULT_PORT)
+        await broker.start()
+        _runtime["broker"] = broker
+        DEFAULT_BROKER = "127.0.0.1"
+    watcher = StateWatcher(DEFAULT_BROKER, DEFAULT_PORT)
+    await watcher.start()
+    _runtime["watcher"] = watcher
+
+
+@app.on_shutdown
+async def _stop():
+    if "watcher" in _runtime:
+        await _runtime.pop("watcher").stop()
+    if "broker" in _runtime:
+        await _runtime.pop("broker").stop()
+
+
+# ---------- 设备管理接口 ----------
+@app.route('/api/devices', methods=('POST',))
+async def device_collection(request: Request):
+    data = request.json()
+    try:
+        required = {'type', 'device_id'}
+        if not isinstance(data, dict) or not required.issubset(data):
+            missing = required - set(data.keys()) if isinstance(data, dict) else required
+            return json_response({"error": f"缺少必要参数: {missing}"}, 400)
+
+        params = {
+            'broker': data.get('broker', DEFAULT_BROKER),
+            'port': data.get('port', DEFAULT_PORT)
+        }
+        # 建立 MQTT 连接是阻塞操作
+        success = await run_blocking(manager.create_device, device_type=data['type'],
+                                     device_id=data['device_id'], **params)
+        if not success:
+            return json_response({"error": "device_connection_failed"}, 502)
+        return json_response(manager.get_device(data['device_id']).current_state, 201)
+    except Exception as e:
+        return json_response({"error": str(e)}, 400)
+
+
+@app.route('/api/devices/<device_id>', methods=('DELETE',))
+async def delete_device(request: Request, device_id: str):
+    if await run_blocking(manager.delete_device, device_id):
+        return json_response({"status": "deleted"})
+    return json_response({"error": "device_not_found"}, 404)
+
+
+@app.route('/api/devices/view')
+async def show_device(request: Request):
+    body, headers = snapshots.encode("view", lambda: dumps(manager.list_devices()),
+                                     request.headers.get('accept-encoding'), version=manager.changes.seq)
+    return Response(body, headers=headers)
+
+
+@app.route('/api/devices/changes')
+async def device_changes(request: Request):
+    result = manager.changes.since(request.arg('since', 0, type=int), limit=request.arg('limit', type=int))
+    body, headers = Compression.encode(dumps(result), request.headers.get('accept-encoding'))
+    return Response(body, headers=headers)
+
+
+@app.route('/api/devices/<device_id>/control', methods=('POST',))
+async def control_device(request: Request, device_id: str):
+    device = manager.get_device(device_id)
+    if not device:
+        return json_response({"error": "device_not_found"}, 404)
+
+    control = CONTROLS.get(type(device))
+    if control is None:
+        if isinstance(device, EnvironmentSensor):
+            return json_response({"error": "sensor could not be controlled"}, 400)
+        return json_response({"error": "invalid_command"}, 400)
+
+    schema, update = control
+    try:
+        params = schema.validate("update", request.json())
+    except CommandError as e:
+        return json_response({"error": "no_valid_parameters", "message": str(e)}, 400)
+
+    try:
+        if manager.connect_mode == "lazy":
+            # 挂起的设备发布状态前要先建连
+            await run_blocking(update, device, **params)
+        else:
+            update(device, **params)
+    except Exception as e:
+        logger.error("Control error: %s", e, exc_info=True)
+        return json_response({"error": "control_failed", "message": str(e)}, 500)
+    return json_response(device.current_state)
+
+
+@app.route('/api/devices/<device_id>/state')
+async def get_state(request: Request, device_id: str):
+    device = manager.get_device(device_id)
+    if not device:
+        return json_response({"error": "device could not be found"}, 404)
+    wait = request.arg('wait', 0.0, type=float)
+    if wait > 0 and "watcher" in _runtime:
+        await _runtime["watcher"].wait(device_id, min(wait, MAX_WAIT))
+    return json_response(device.current_state)
+
+
+@app.route('/api/devices/<device_id>/history')
+async def get_history(request: Request, device_id: str):
+    """传感器历史读数的窗口聚合（metric / resolution / start / end）"""
+    device = manager.get_device(device_id)
+    if not device:
+        return json_response({"error": "device could not be found"}, 404)
+    if not isinstance(device, EnvironmentSensor):
+        return json_response({"error": "history is only available for sensors"}, 400)
+    try:
+        result = device.history.query(
+            metric=request.arg('metric', 'temperature'),
+            start=request.arg('start', type=float),
+            end=request.arg('end', type=float),
+            resolution=request.arg('resolution', 'auto')
+        )
+    except ValueError as e:
+        return json_response({"error": "invalid_query", "message": str(e)}, 400)
+    return json_response(result)
+
+
+# ---------- 分组 / 房间 ----------
+@app.route('/api/groups', methods=('POST',))
+async def create_group(request: Request):
+    data = request.json() or {}
+    if not data.get('group_id'):
+        return json_response({"error": "缺少必要参数: {'group_id'}"}, 400)
+    try:
+        group = manager.groups.create_group(data['group_id'], name=data.get('name'),
+                                            kind=data.get('kind', 'group'), parent=data.get('parent'))
+    except GroupError as e:
+        return json_response({"error": "invalid_group", "message": str(e)}, 400)
+    return json_response(group.summary(members=True), 201)
+
+
+@app.route('/api/groups')
+async def list_groups(request: Request):
+    return json_response(manager.groups.list_groups(kind=request.arg('kind')))
+
+
+@app.route('/api/groups/<group_id>')
+async def get_group(request: Request, group_id: str):
+    if summary := manager.groups.get(group_id):
+        return json_response(summary)
+    return json_response({"error": "group_not_found"}, 404)
+
+
+@app.route('/api/groups/<group_id>', methods=('DELETE',))
+async def delete_group(request: Request, group_id: str):
+    if manager.groups.delete_group(group_id):
+        return json_response({"status": "deleted"})
+    return json_response({"error": "group_not_found"}, 404)
+
+
+@app.route('/api/groups/<group_id>/devices/<device_id>', methods=('PUT',))
+async def add_group_member(request: Request, group_id: str, device_id: str):
+    try:
+        manager.groups.add_member(group_id, device_id)
+    except GroupError as e:
+        return json_response({"error": "not_found", "message": str(e)}, 404)
+    return json_response(manager.groups.get(group_id))
+
+
+@app.route('/api/groups/<group_id>/devices/<device_id>', methods=('DELETE',))
+async def remove_group_member(request: Request, group_id: str, device_id: str):
+    if manager.groups.remove_member(group_id, device_id):
+        return json_response(manager.groups.get(group_id))
+    return json_response({"error": "not_found"}, 404)
+
+
+# ---------- 场景 ----------
+async def _scene_engine():
+    # 首次使用时要建立 MQTT 连接
+    return await run_blocking(manager.scene_engine, DEFAULT_BROKER, DEFAULT_PORT)
+
+
+@app.route('/api/scenes', methods=('POST',))
+async def define_scene(request: Request):
+    data = request.json() or {}
+    try:
+        scene = (await _scene_engine()).define(data.get('name'), data.get('targets'))
+    except SceneError as e:
+        return json_response({"error": "invalid_scene", "message": str(e)}, 400)
+    return json_response(scene.to_dict(), 201)
+
+
+@app.route('/api/scenes')
+async def list_scenes(request: Request):
+    return json_response((await _scene_engine()).list_scenes())
+
+
+@app.route('/api/scenes/<name>', methods=('DELETE',))
+async def delete_scene(request: Request, name: str):
+    if (await _scene_engine()).delete(name):
+        return json_response({"status": "deleted"})
+    return json_response({"error": "scene_not_found"}, 404)
+
+
+@app.route('/api/scenes/<name>/activate', methods=('POST',))
+async def activate_scene(request: Request, name: str):
+    engine = await _scene_engine()
+    try:
+        # 等待设备确认是阻塞的
+        result = await run_blocking(engine.activate, name, timeout=request.arg('timeout', type=float))
+    except SceneError as e:
+        return json_response({"error": "scene_not_found", "message": str(e)}, 404)
+    return json_response(result, 200 if result["status"] == "applied" else 502)
+
+
+# ---------- 链路追踪 ----------
+@app.route('/api/traces')
+async def export_traces(request: Request):
+    return json_response({
+        "stats": tracer.stats(),
+        "traces": tracer.export(trace_id=request.arg('trace_id'), limit=request.arg('limit', 100, type=int))
+    })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Device API (ASGI)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    Asgi.run(app, args.host, args.port)
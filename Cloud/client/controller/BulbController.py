@@ -1,5 +1,13 @@
 import paho.mqtt.client as mqtt
-import json
+from Cloud.client.util.Codec import dumps
+from Cloud.client.util.Payload import accept_header, decode_message, publish_properties, JSON
+from Cloud.client.util import Tracing
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.Tracing import tracer
+from Cloud.client.util.Metrics import COMMAND_ROUND_TRIP_SECONDS, MQTT_PUBLISHED, MQTT_RECEIVED
+from Cloud.client.util.CommandSchema import LIGHT, CommandError
+from Cloud.client.controller.ReconnectCoordinator import coordinator
+from collections import OrderedDict
 import time
 import logging
 from typing import Optional, Dict, Any
@@ -9,26 +17,32 @@ class BulbController:
     MQTT灯泡控制器 (使用 paho-mqtt VERSION2 API)
     """
 
-    def __init__(self, bulb_id: str, broker: str = "test.mosquitto.org", port: int = 1883):
+    def __init__(self, bulb_id: str, broker: str = "test.mosquitto.org", port: int = 1883,
+                 payload_format: str = "auto"):
         self.bulb_id = bulb_id
         self.broker = broker
         self.port = port
         self.current_state = None
         self.subscribed_topics = {}
 
-        # 设置日志
-        self.logger = logging.getLogger(f"Controller_{bulb_id}")
-        self.logger.setLevel(logging.INFO)
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
+        # 命令中声明可接受的状态负载格式，设备据此协商（命令本身仍用 JSON，兼容旧设备）
+        self.accept = accept_header(payload_format)
+        self.command_properties = publish_properties(JSON, accept=self.accept)
+
+        # 已发出、尚未收到对应状态的命令：trace_id -> (命令, 发出时间戳, perf_counter)
+        # 未被追踪的命令记在键 None 下（只保留最近一条）
+        self._inflight = OrderedDict()
+        self._inflight_limit = 256
+
+        # 设置日志（统一日志管道）
+        self.logger = get_logger("controller", bulb_id)
 
         # 使用新版API初始化MQTT客户端
         self.client = mqtt.Client(
             mqtt.CallbackAPIVersion.VERSION2,  # 关键修改
             client_id=f"ctrl_{bulb_id}_{int(time.time())}",  # 唯一客户端ID
-            protocol=mqtt.MQTTv5  # 使用MQTT 5.0协议
+            protocol=mqtt.MQTTv5,  # 使用MQTT 5.0协议
+            reconnect_on_failure=False  # 断线重连交给 ReconnectCoordinator 统一调度
         )
 
         # 设置新版回调方法
@@ -56,9 +70,10 @@ class BulbController:
 
     def disconnect(self) -> bool:
         """断开MQTT连接"""
+        coordinator.cancel(self._reconnect_key)
         try:
-            self.client.loop_stop()
             self.client.disconnect()
+            self.client.loop_stop()
             self.logger.info("Disconnected from MQTT broker")
             return True
         except Exception as e:
@@ -88,11 +103,11 @@ class BulbController:
         """MQTT消息回调 (VERSION2兼容)"""
         try:
             topic = message.topic
-            payload = message.payload.decode('utf-8')
-
             if topic.endswith("/state"):
-                self.current_state = json.loads(payload)
-                self.logger.debug(f"State updated: {self.current_state}")
+                MQTT_RECEIVED.inc("controller", "lights/state")
+                self.current_state = decode_message(message)
+                self._finish_command(Tracing.from_message(message))
+                self.logger.debug("State updated: %s", self.current_state)
 
                 # 触发已注册的回调
                 if topic in self.subscribed_topics:
@@ -104,8 +119,18 @@ class BulbController:
         """MQTT断开连接回调 (VERSION2)"""
         self.logger.warning(f"Disconnected with reason: {reason_code}")
         if reason_code != mqtt.MQTT_ERR_SUCCESS:
-            self.logger.info("Attempting to reconnect...")
-            self.connect()
+            self.logger.info("Scheduling reconnect...")
+            coordinator.request(self._reconnect_key, self._attempt_reconnect, "controller")
+
+    @property
+    def _reconnect_key(self) -> str:
+        # 同一灯泡可能有多个控制端，用实例区分
+        return f"controller:{self.bulb_id}:{id(self):x}"
+
+    def _attempt_reconnect(self) -> bool:
+        """单次重连尝试（由 ReconnectCoordinator 按退避和准入控制调度）"""
+        self.client.loop_stop()  # 回收已退出的网络线程
+        return self.connect()
 
     def turn_on(self) -> bool:
         """打开灯泡"""
@@ -117,9 +142,6 @@ class BulbController:
 
     def set_brightness(self, level: int) -> bool:
         """设置亮度 (0-100)"""
-        if not 0 <= level <= 100:
-            self.logger.error("Brightness must be between 0 and 100")
-            return False
         return self._send_command("set_brightness", {"brightness": level})
 
     def set_color(self, color: str) -> bool:
@@ -142,23 +164,50 @@ class BulbController:
         self.subscribed_topics[state_topic] = callback
         return True
 
+    def _finish_command(self, trace_id: Optional[str]):
+        """收到状态时记录对应命令的往返耗时（带 trace ID 的同时写入链路追踪）"""
+        inflight = self._inflight.pop(trace_id, None)
+        if inflight is not None:
+            command, started, begin = inflight
+            elapsed = time.perf_counter() - begin
+            COMMAND_ROUND_TRIP_SECONDS.observe(elapsed, "controller", command)
+            tracer.record(trace_id, "controller.round_trip", started, elapsed,
+                          device_id=self.bulb_id, command=command)
+
     def _send_command(self, command: str, payload: Optional[Dict] = None) -> bool:
-        """发送MQTT命令"""
+        """发送MQTT命令（按 LIGHT 命令定义校验，非法参数不会发出）"""
+        try:
+            payload = LIGHT.validate(command, payload)
+        except CommandError as e:
+            self.logger.error(f"Invalid command: {e}")
+            return False
         topic = f"{self.base_topic}/control/{command}"
 
+        # 沿用调用方的 trace，否则为本条命令新建一个
+        trace_id = Tracing.current() or tracer.start_trace()
+        properties = self.command_properties
+        if trace_id is not None:
+            properties = publish_properties(JSON, accept=self.accept, trace_id=trace_id)
+        self._inflight[trace_id] = (command, time.time(), time.perf_counter())
+        while len(self._inflight) > self._inflight_limit:
+            self._inflight.popitem(last=False)
+
         try:
-            result = self.client.publish(
-                topic,
-                payload=json.dumps(payload) if payload else "",
-                qos=1,
-                retain=False
-            )
+            with tracer.span("controller.publish", trace_id, command=command):
+                result = self.client.publish(
+                    topic,
+                    payload=dumps(payload) if payload else "",
+                    qos=1,
+                    retain=False,
+                    properties=properties
+                )
 
             if result.rc != mqtt.MQTT_ERR_SUCCESS:
                 self.logger.error(f"Failed to publish: {mqtt.error_string(result.rc)}")
                 return False
+            MQTT_PUBLISHED.inc("controller", "lights/control")
 
-            self.logger.debug(f"Command '{command}' sent to {topic}")
+            self.logger.debug("Command '%s' sent to %s", command, topic)
             return True
         except Exception as e:
             self.logger.error(f"Error sending command: {str(e)}")
@@ -0,0 +1,117 @@
+"""
+设备变更日志：每次设备新增、状态变化、删除分配一个单调递增的序号，客户端带上次拿到的游标增量同步
+
+日志只保留每台设备最新的一条（按序号排列的 OrderedDict，更新时移到末尾），
+因此查询“游标之后的变化”只需从末尾倒着取到游标为止，开销与变化数成正比而与设备总数无关；
+删除记为墓碑，最多保留 max_tombstones 条，游标早于已丢弃的墓碑时要求客户端全量重新同步
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class Change(NamedTuple):
+    seq: int
+    device_id: str
+    device_type: str
+    state: Optional[Dict[str, Any]]  # None 表示已删除
+
+
+class ChangeLog:
+    def __init__(self, max_tombstones: int = 10000):
+        self.max_tombstones = max_tombstones
+        # 序号从启动时的微秒时间戳开始：服务重启后旧游标必然小于新的起点，客户端会全量重新同步
+        self.seq = time.time_ns() // 1000
+        # 游标小于 horizon 的客户端可能错过了已丢弃的墓碑（或来自重启前）
+        self.horizon = self.seq
+        self._entries: "OrderedDict[str, Change]" = OrderedDict()
+        # 墓碑按删除顺序排队，超出上限时从队首丢弃（设备被重新创建后队中的旧项作废）
+        self._tombstones = deque()
+        self._listeners: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    # ---------- 设备 ----------
+    def track(self, device_id: str, device_type: str, device):
+        """记录设备新增，并在其 state_listeners 上挂监听记录之后的每次状态变化"""
+        def listener(state):
+            self.record(device_id, device_type, state)
+
+        with self._lock:
+            entry = self._listeners.pop(device_id, None)
+            self._listeners[device_id] = (device, listener)
+            device.state_listeners.append(listener)
+            self._append(device_id, device_type, device.current_state)
+        if entry is not None and entry[1] in entry[0].state_listeners:
+            entry[0].state_listeners.remove(entry[1])
+
+    def forget(self, device_id: str):
+        """记录设备删除（墓碑）并移除监听"""
+        with self._lock:
+            entry = self._listeners.pop(device_id, None)
+            previous = self._entries.get(device_id)
+            if previous is not None and previous.state is not None:
+                self._append(device_id, previous.device_type, None)
+                self._tombstones.append((self.seq, device_id))
+                self._trim()
+        if entry is not None and entry[1] in entry[0].state_listeners:
+            entry[0].state_listeners.remove(entry[1])
+
+    def record(self, device_id: str, device_type: str, state: Dict[str, Any]):
+        with self._lock:
+            if device_id in self._listeners:
+                self._append(device_id, device_type, state)
+
+    def _append(self, device_id: str, device_type: str, state: Optional[Dict[str, Any]]):
+        self._entries.pop(device_id, None)
+        self.seq += 1
+        self._entries[device_id] = Change(self.seq, device_id, device_type, state)
+
+    def _trim(self):
+        while len(self._tombstones) > self.max_tombstones:
+            seq, device_id = self._tombstones.popleft()
+            change = self._entries.get(device_id)
+            if change is not None and change.seq == seq:
+                del self._entries[device_id]
+                self.horizon = seq
+
+    # ---------- 查询 ----------
+    def since(self, cursor: int, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        游标之后的变化：{"cursor": 新游标, "reset": 是否需要全量, "changes": [...], "deleted": [...], "more": 是否还有}
+        cursor 早于 horizon 或大于当前序号（不是本服务发出的游标）时 reset 为 True，changes 为全部现存设备
+        limit 限制增量的条数，客户端以返回的 cursor 继续拉取直到 more 为 False（全量时不分页：分页游标可能早于 horizon）
+        """
+        with self._lock:
+            reset = cursor < self.horizon or cursor > self.seq
+            if reset:
+                cursor = 0
+            picked: List[Change] = []
+            for change in reversed(self._entries.values()):
+                if change.seq <= cursor:
+                    break
+                picked.append(change)
+            seq = self.seq
+        picked.reverse()
+        if limit is not None:
+            limit = max(limit, 1)
+        more = limit is not None and not reset and len(picked) > limit
+        if more:
+            picked = picked[:limit]
+            seq = picked[-1].seq
+
+        changes, deleted = [], []
+        for change in picked:
+            if change.state is None:
+                if not reset:
+                    deleted.append(change.device_id)
+                continue
+            # 设备 ID 已在外层给出，状态里不再重复
+            state = {key: value for key, value in change.state.items() if key != "device_id"}
+            changes.append({"id": change.device_id, "type": change.device_type, "state": state})
+        return {"cursor": seq, "reset": reset, "changes": changes, "deleted": deleted, "more": more}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"seq": self.seq, "entries": len(self._entries), "tombstones": len(self._tombstones),
+                    "horizon": self.horizon}
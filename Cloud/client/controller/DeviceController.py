@@ -3,16 +3,35 @@ from flask_socketio import SocketIO
 from flask import Flask, request, jsonify
 
 import logging
+import os
 from typing import Dict, Any
 
-from Cloud.client.controller.Manager import DeviceManager
-from Cloud.client.entity.Bulb import SmartBulb
-from Cloud.client.entity.Lock import SmartLock
+from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+from Cloud.client.controller.GroupRegistry import GroupError
+from Cloud.client.controller.Manager import CONTROLS, DeviceManager
+from Cloud.client.controller.SceneEngine import SceneError
 from Cloud.client.entity.Sensor import EnvironmentSensor
+from Cloud.client.util.Codec import dumps, install_flask
+from Cloud.client.util import Compression
+from Cloud.client.util.CommandSchema import CommandError
+from Cloud.client.util import Metrics
+from Cloud.client.util import Tracing
+from Cloud.client.util.Tracing import tracer
+from Cloud.client.util.Wsgi import KeepAliveRequestHandler
 
 app = Flask(__name__)
+install_flask(app)
+Tracing.install_flask(app)
+Metrics.install_flask(app, "device_controller")
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 manager = DeviceManager()
+snapshots = Compression.SnapshotCache()
+# 抓取时只按类型计数，不序列化设备状态
+Metrics.DEVICES.set_function(manager.count_devices)
+
+# 默认 MQTT 代理；设置 MQTT_EMBEDDED_BROKER=1 时在进程内启动代理并默认连接它
+DEFAULT_BROKER = os.getenv("MQTT_BROKER", "test.mosquitto.org")
+DEFAULT_PORT = int(os.getenv("MQTT_PORT", "1883"))
 
 # ---------- 设备管理接口 ----------
 @app.route('/api/devices', methods=['POST'])
@@ -26,8 +45,8 @@ def device_collection():
 
         # 可选参数默认值
         params = {
-            'broker': data.get('broker', 'test.mosquitto.org'),
-            'port': data.get('port', 1883)
+            'broker': data.get('broker', DEFAULT_BROKER),
+            'port': data.get('port', DEFAULT_PORT)
         }
 
         # 创建设备
@@ -54,7 +73,10 @@ def delete_device(device_id: str):
 @app.route('/api/devices/view', methods=['GET'])
 def show_device():
     try:
-        return jsonify(manager.list_devices())
+        # 以变更日志序号为版本缓存序列化和压缩结果，设备没有变化时直接返回缓存的字节
+        body, headers = snapshots.encode("view", lambda: dumps(manager.list_devices()),
+                                         request.headers.get('Accept-Encoding'), version=manager.changes.seq)
+        return app.response_class(body, mimetype="application/json", headers=headers)
     except Exception as e:
         logging.error(f"Control error: {str(e)}", exc_info=True)
         return jsonify({
@@ -63,46 +85,39 @@ def show_device():
         }), 500
 
 
+@app.route('/api/devices/changes', methods=['GET'])
+def device_changes():
+    """
+    增量同步：返回游标 since 之后新增 / 变化 / 删除的设备（limit 限制条数，more 为真时以新游标继续拉取）
+    不带 since 或游标已失效时 reset 为真，返回全部设备；客户端接受 gzip 时压缩
+    """
+    result = manager.changes.since(request.args.get('since', 0, type=int), limit=request.args.get('limit', type=int))
+    body, headers = Compression.encode(dumps(result), request.headers.get('Accept-Encoding'))
+    return app.response_class(body, mimetype="application/json", headers=headers)
+
+
 @app.route('/api/devices/<device_id>/control', methods=['POST'])
 def control_device(device_id: str):
     try:
-        data = request.json
         device = manager.get_device(device_id)
 
         if not device:
             return jsonify({"error": "device_not_found"}), 404
 
-        # 智能灯泡专用控制
-        if isinstance(device, SmartBulb):
-            # 构造控制参数
-            control_params = {}
-            if 'state' in data:
-                control_params['state'] = data['state']
-            if 'brightness' in data:
-                control_params['brightness'] = data['brightness']
-            if 'color' in data:
-                control_params['color'] = data['color']
-
-            if control_params:
-                # 统一调用设备控制方法
-                device.update_state(**control_params)
-                return jsonify(device.current_state)
-            else:
-                return jsonify({"error": "no_valid_parameters"}), 400
-
-        # 其他设备类型的通用控制路由
-        if isinstance(device,SmartLock):
-            locked=data['locked']
-            if locked==0 or locked==1:
-                device.set_lock(locked)
-                return jsonify(device.current_state)
-            else:
-                return jsonify({"error": "no_valid_parameters"}), 400
-
-        if isinstance(device,EnvironmentSensor):
-            return jsonify({"error": "sensor could not be controlled"}), 400
-
-        return jsonify({"error": "invalid_command"}), 400
+        control = CONTROLS.get(type(device))
+        if control is None:
+            if isinstance(device, EnvironmentSensor):
+                return jsonify({"error": "sensor could not be controlled"}), 400
+            return jsonify({"error": "invalid_command"}), 400
+
+        schema, update = control
+        try:
+            params = schema.validate("update", request.get_json(silent=True))
+        except CommandError as e:
+            return jsonify({"error": "no_valid_parameters", "message": str(e)}), 400
+
+        update(device, **params)
+        return jsonify(device.current_state)
 
     except Exception as e:
         logging.error(f"Control error: {str(e)}", exc_info=True)
@@ -128,6 +143,134 @@ def get_state(device_id: str):
         }), 500
 
 
+@app.route('/api/devices/<device_id>/history', methods=['GET'])
+def get_history(device_id: str):
+    """传感器历史读数的窗口聚合（metric / resolution / start / end）"""
+    try:
+        device = manager.get_device(device_id)
+        if not device:
+            return jsonify({"error": "device could not be found"}), 404
+        if not isinstance(device, EnvironmentSensor):
+            return jsonify({"error": "history is only available for sensors"}), 400
+
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        result = device.history.query(
+            metric=request.args.get('metric', 'temperature'),
+            start=start,
+            end=end,
+            resolution=request.args.get('resolution', 'auto')
+        )
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": "invalid_query", "message": str(e)}), 400
+    except Exception as e:
+        logging.error(f"History error: {str(e)}", exc_info=True)
+        return jsonify({
+            "error": "history_get_failed",
+            "message": str(e)
+        }), 500
+
+
+# ---------- 分组 / 房间 ----------
+# 聚合状态在设备状态变化时增量维护，以下读接口不遍历成员设备
+@app.route('/api/groups', methods=['POST'])
+def create_group():
+    data = request.get_json(silent=True) or {}
+    if not data.get('group_id'):
+        return jsonify({"error": "缺少必要参数: {'group_id'}"}), 400
+    try:
+        group = manager.groups.create_group(data['group_id'], name=data.get('name'),
+                                            kind=data.get('kind', 'group'), parent=data.get('parent'))
+    except GroupError as e:
+        return jsonify({"error": "invalid_group", "message": str(e)}), 400
+    return jsonify(group.summary(members=True)), 201
+
+
+@app.route('/api/groups', methods=['GET'])
+def list_groups():
+    """全部分组的聚合状态（kind=room 只列房间）"""
+    return jsonify(manager.groups.list_groups(kind=request.args.get('kind')))
+
+
+@app.route('/api/groups/<group_id>', methods=['GET'])
+def get_group(group_id: str):
+    if summary := manager.groups.get(group_id):
+        return jsonify(summary)
+    return jsonify({"error": "group_not_found"}), 404
+
+
+@app.route('/api/groups/<group_id>', methods=['DELETE'])
+def delete_group(group_id: str):
+    if manager.groups.delete_group(group_id):
+        return jsonify({"status": "deleted"})
+    return jsonify({"error": "group_not_found"}), 404
+
+
+@app.route('/api/groups/<group_id>/devices/<device_id>', methods=['PUT'])
+def add_group_member(group_id: str, device_id: str):
+    try:
+        manager.groups.add_member(group_id, device_id)
+    except GroupError as e:
+        return jsonify({"error": "not_found", "message": str(e)}), 404
+    return jsonify(manager.groups.get(group_id))
+
+
+@app.route('/api/groups/<group_id>/devices/<device_id>', methods=['DELETE'])
+def remove_group_member(group_id: str, device_id: str):
+    if manager.groups.remove_member(group_id, device_id):
+        return jsonify(manager.groups.get(group_id))
+    return jsonify({"error": "not_found"}), 404
+
+
+# ---------- 场景 ----------
+@app.route('/api/scenes', methods=['POST'])
+def define_scene():
+    """新建或替换场景：{"name": ..., "targets": {device_id: {"type": "light", "state": "on", ...}}}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        scene = manager.scene_engine(DEFAULT_BROKER, DEFAULT_PORT).define(data.get('name'), data.get('targets'))
+    except SceneError as e:
+        return jsonify({"error": "invalid_scene", "message": str(e)}), 400
+    return jsonify(scene.to_dict()), 201
+
+
+@app.route('/api/scenes', methods=['GET'])
+def list_scenes():
+    return jsonify(manager.scene_engine(DEFAULT_BROKER, DEFAULT_PORT).list_scenes())
+
+
+@app.route('/api/scenes/<name>', methods=['DELETE'])
+def delete_scene(name: str):
+    if manager.scene_engine(DEFAULT_BROKER, DEFAULT_PORT).delete(name):
+        return jsonify({"status": "deleted"})
+    return jsonify({"error": "scene_not_found"}), 404
+
+
+@app.route('/api/scenes/<name>/activate', methods=['POST'])
+def activate_scene(name: str):
+    """激活场景并等待全部设备确认（?timeout=秒），部分失败时自动回滚"""
+    engine = manager.scene_engine(DEFAULT_BROKER, DEFAULT_PORT)
+    try:
+        result = engine.activate(name, timeout=request.args.get('timeout', type=float))
+    except SceneError as e:
+        return jsonify({"error": "scene_not_found", "message": str(e)}), 404
+    return jsonify(result), 200 if result["status"] == "applied" else 502
+
+
+# ---------- 链路追踪 ----------
+@app.route('/api/traces', methods=['GET'])
+def export_traces():
+    """导出环形缓冲区中的 trace（trace_id 过滤单条，limit 限制条数）"""
+    return jsonify({
+        "stats": tracer.stats(),
+        "traces": tracer.export(
+            trace_id=request.args.get('trace_id'),
+            limit=request.args.get('limit', 100, type=int)
+        )
+    })
+
+
 # ---------- WebSocket ----------
 @socketio.on('connect')
 def handle_connect():
@@ -144,4 +287,11 @@ def handle_subscribe(data: Dict):
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
-    socketio.run(app, host='127.0.0.1', port=5000, debug=True,allow_unsafe_werkzeug=True)
\ No newline at end of file
+    embedded_broker = os.getenv("MQTT_EMBEDDED_BROKER") == "1"
+    if embedded_broker:
+        EmbeddedBroker("127.0.0.1", DEFAULT_PORT).start_in_thread()
+        DEFAULT_BROKER = "127.0.0.1"
+    # werkzeug 默认每个响应后关闭连接，换成支持长连接的处理器；
+    # 重载器会在子进程里再执行一遍这里，内置代理时关闭重载，避免两个代理争用同一端口
+    socketio.run(app, host='127.0.0.1', port=5000, debug=True,allow_unsafe_werkzeug=True,
+                 use_reloader=not embedded_broker, request_handler=KeepAliveRequestHandler)
\ No newline at end of file
@@ -0,0 +1,247 @@
+"""
+设备分组 / 房间：分组可以嵌套（如 一楼 -> 客厅），每个分组维护成员设备的聚合状态
+
+聚合按增量维护：每台设备记住自己上一次计入的贡献（开灯数、亮度和、未锁数、温湿度和……），
+状态变化时只把差值加到它所属的分组及其祖先上，开销与分组内设备数无关；读取分组状态不遍历成员
+一台设备最多属于一个房间（加入新房间即从旧房间移出），普通分组不限
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+KINDS = ("room", "group")
+
+# 贡献向量的各分量
+LIGHTS, LIGHTS_ON, BRIGHTNESS_ON, LOCKS, UNLOCKED, SENSORS, TEMPERATURE, HUMIDITY = range(8)
+_ZERO = (0, 0, 0, 0, 0, 0, 0.0, 0.0)
+
+
+def _light(state) -> Tuple:
+    on = state["state"] == "on"
+    return 1, int(on), state["brightness"] if on else 0, 0, 0, 0, 0.0, 0.0
+
+
+def _lock(state) -> Tuple:
+    return 0, 0, 0, 1, int(not state["locked"]), 0, 0.0, 0.0
+
+
+def _sensor(state) -> Tuple:
+    return 0, 0, 0, 0, 0, 1, float(state["temperature"]), float(state["humidity"])
+
+
+CONTRIBUTIONS = {"light": _light, "lock": _lock, "sensor": _sensor}
+
+
+class GroupError(ValueError):
+    pass
+
+
+class DeviceGroup:
+    """分组：直接成员、子分组和聚合计数（含所有子孙分组中的设备，每台设备只计一次）"""
+
+    __slots__ = ("group_id", "name", "kind", "parent", "children", "members", "totals")
+
+    def __init__(self, group_id: str, name: str, kind: str, parent: Optional[str]):
+        self.group_id = group_id
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.children: Set[str] = set()
+        self.members: Set[str] = set()
+        self.totals = list(_ZERO)
+
+    def summary(self, members: bool = False) -> Dict:
+        """聚合状态；members=True 时附带直接成员的设备 ID"""
+        t = self.totals
+        summary = {
+            "group_id": self.group_id,
+            "name": self.name,
+            "kind": self.kind,
+            "parent": self.parent,
+            "children": sorted(self.children),
+            "member_count": len(self.members),
+            "lights": {
+                "total": t[LIGHTS],
+                "on": t[LIGHTS_ON],
+                "average_brightness": round(t[BRIGHTNESS_ON] / t[LIGHTS_ON], 1) if t[LIGHTS_ON] else None
+            },
+            "locks": {
+                "total": t[LOCKS],
+                "unlocked": t[UNLOCKED],
+                "any_unlocked": t[UNLOCKED] > 0
+            },
+            "sensors": {
+                "total": t[SENSORS],
+                "mean_temperature": round(t[TEMPERATURE] / t[SENSORS], 2) if t[SENSORS] else None,
+                "mean_humidity": round(t[HUMIDITY] / t[SENSORS], 2) if t[SENSORS] else None
+            }
+        }
+        if members:
+            summary["devices"] = sorted(self.members)
+        return summary
+
+
+class GroupRegistry:
+    """
+    分组注册表：track() 在设备的 state_listeners 上挂监听，状态变化时增量更新所属分组的聚合
+    所有方法线程安全（监听在 MQTT 网络线程和 HTTP 线程中都会被调用）
+    """
+
+    def __init__(self):
+        self.groups: Dict[str, DeviceGroup] = {}
+        self._lock = threading.Lock()
+        self._contribution: Dict[str, Tuple] = {}
+        self._listeners: Dict[str, tuple] = {}
+        self._device_groups: Dict[str, Set[str]] = {}
+        # 设备 -> 受其状态影响的分组（直接所属分组及其祖先，去重），成员关系变化时重算
+        self._affected: Dict[str, Tuple[DeviceGroup, ...]] = {}
+
+    # ---------- 设备 ----------
+    def track(self, device_id: str, device_type: str, device):
+        """开始跟踪设备状态（DeviceManager 创建 / 恢复设备时调用）"""
+        contribute = CONTRIBUTIONS[device_type]
+        if device_id in self._listeners:
+            self.forget(device_id)
+
+        def listener(state, device_id=device_id):
+            self._apply(device_id, contribute(state))
+
+        with self._lock:
+            # 在锁内挂监听并取初始状态：并发的状态变化会等到这里结束后再按差值计入
+            device.state_listeners.append(listener)
+            self._contribution[device_id] = contribute(device.current_state)
+            self._listeners[device_id] = (device, listener)
+            self._device_groups.setdefault(device_id, set())
+            self._affected.setdefault(device_id, ())
+
+    def forget(self, device_id: str):
+        """停止跟踪并从所有分组中移除设备（DeviceManager 删除设备时调用）"""
+        with self._lock:
+            entry = self._listeners.pop(device_id, None)
+            for group_id in self._device_groups.pop(device_id, ()):
+                self.groups[group_id].members.discard(device_id)
+            self._move(device_id, self._affected.pop(device_id, ()), ())
+            self._contribution.pop(device_id, None)
+        if entry is not None:
+            device, listener = entry
+            if listener in device.state_listeners:
+                device.state_listeners.remove(listener)
+
+    def _apply(self, device_id: str, contribution: Tuple):
+        """设备状态变化：把新旧贡献之差加到受影响的分组上"""
+        with self._lock:
+            previous = self._contribution.get(device_id)
+            if previous is None or previous == contribution:
+                return
+            self._contribution[device_id] = contribution
+            delta = [new - old for new, old in zip(contribution, previous)]
+            for group in self._affected[device_id]:
+                totals = group.totals
+                for i, d in enumerate(delta):
+                    if d:
+                        totals[i] += d
+
+    # ---------- 分组 ----------
+    def create_group(self, group_id: str, name: Optional[str] = None, kind: str = "group",
+                     parent: Optional[str] = None) -> DeviceGroup:
+        if kind not in KINDS:
+            raise GroupError(f"kind must be one of {KINDS}")
+        with self._lock:
+            if group_id in self.groups:
+                raise GroupError(f"group {group_id} already exists")
+            if parent is not None and parent not in self.groups:
+                raise GroupError(f"parent group {parent} not found")
+            group = DeviceGroup(group_id, name or group_id, kind, parent)
+            self.groups[group_id] = group
+            if parent is not None:
+                self.groups[parent].children.add(group_id)
+            return group
+
+    def delete_group(self, group_id: str) -> bool:
+        """删除分组；子分组挂到被删分组的父分组下，成员设备移出"""
+        with self._lock:
+            group = self.groups.get(group_id)
+            if group is None:
+                return False
+            members = list(group.members)
+            for device_id in members:
+                self._device_groups[device_id].discard(group_id)
+            group.members.clear()
+            for child_id in group.children:
+                self.groups[child_id].parent = group.parent
+                if group.parent is not None:
+                    self.groups[group.parent].children.add(child_id)
+            if group.parent is not None:
+                self.groups[group.parent].children.discard(group_id)
+            group.children.clear()
+            del self.groups[group_id]
+            # 按新的层级重算原先计入该分组的设备
+            for device_id, affected in list(self._affected.items()):
+                if group in affected:
+                    self._refresh(device_id)
+            return True
+
+    def add_member(self, group_id: str, device_id: str):
+        with self._lock:
+            group = self.groups.get(group_id)
+            if group is None:
+                raise GroupError(f"group {group_id} not found")
+            if device_id not in self._contribution:
+                raise GroupError(f"device {device_id} not found")
+            groups = self._device_groups[device_id]
+            if group.kind == "room":
+                # 一台设备只能在一个房间
+                for other in [g for g in groups if self.groups[g].kind == "room" and g != group_id]:
+                    groups.discard(other)
+                    self.groups[other].members.discard(device_id)
+            groups.add(group_id)
+            group.members.add(device_id)
+            self._refresh(device_id)
+
+    def remove_member(self, group_id: str, device_id: str) -> bool:
+        with self._lock:
+            group = self.groups.get(group_id)
+            if group is None or device_id not in group.members:
+                return False
+            group.members.discard(device_id)
+            self._device_groups[device_id].discard(group_id)
+            self._refresh(device_id)
+            return True
+
+    def get(self, group_id: str) -> Optional[Dict]:
+        with self._lock:
+            group = self.groups.get(group_id)
+            return group.summary(members=True) if group is not None else None
+
+    def list_groups(self, kind: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            return [group.summary() for group in self.groups.values() if kind is None or group.kind == kind]
+
+    def groups_of(self, device_id: str) -> List[str]:
+        with self._lock:
+            return sorted(self._device_groups.get(device_id, ()))
+
+    # ---------- 内部 ----------
+    def _ancestors(self, group_id: str) -> Iterable[DeviceGroup]:
+        while group_id is not None:
+            group = self.groups[group_id]
+            yield group
+            group_id = group.parent
+
+    def _refresh(self, device_id: str):
+        """重算设备的影响集合，并把它的贡献从旧集合移到新集合"""
+        affected = {}
+        for group_id in self._device_groups.get(device_id, ()):
+            for group in self._ancestors(group_id):
+                affected[group.group_id] = group
+        self._move(device_id, self._affected.get(device_id, ()), tuple(affected.values()))
+
+    def _move(self, device_id: str, old: Tuple[DeviceGroup, ...], new: Tuple[DeviceGroup, ...]):
+        contribution = self._contribution.get(device_id, _ZERO)
+        for group in set(old) - set(new):
+            for i, value in enumerate(contribution):
+                group.totals[i] -= value
+        for group in set(new) - set(old):
+            for i, value in enumerate(contribution):
+                group.totals[i] += value
+        if device_id in self._affected:
+            self._affected[device_id] = new
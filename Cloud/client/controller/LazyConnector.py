@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import paho.mqtt.client as mqtt
+
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.Metrics import Counter, Gauge
+from Cloud.client.util.TopicRouter import TopicRouter
+
+# 设备连接状态
+PARKED = "parked"
+WAKING = "waking"
+ACTIVE = "active"
+PARKING = "parking"
+
+LAZY_TRANSITIONS = Counter("lazy_connection_transitions_total", "Device wake-ups and parks",
+                           ("transition",))
+LAZY_DEVICES = Gauge("lazy_connection_devices", "Devices managed by lazy connectors", ("state",))
+
+
+class LazyConnector:
+    """
+    惰性连接：设备平时不建立专属 MQTT 会话（无套接字、无网络线程），
+    由一个共享客户端订阅 home/+/+/control/#，替挂起的设备接收命令；
+    收到命令或设备要发布状态时才连接（唤醒），空闲超过 idle_timeout 秒后断开（挂起）
+    挂起期间的状态读取直接使用设备实例上的本地状态；挂起时设备换用新的 MQTT 客户端，
+    旧客户端连同网络循环的 socketpair 一起释放，挂起的设备不占文件描述符
+    """
+
+    def __init__(self, broker: str, port: int = 1883, idle_timeout: float = 300.0, wake_timeout: float = 5.0,
+                 wake_workers: int = 8):
+        self.broker = broker
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.wake_timeout = wake_timeout
+        self.logger = get_logger("lazy", f"{broker}:{port}")
+
+        self._devices: Dict[str, object] = {}
+        self._states: Dict[str, str] = {}
+        self._last_active: Dict[str, float] = {}
+        self._ready: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        # 共享订阅收到的命令按主题直接路由到对应设备
+        self._router = TopicRouter()
+        # 唤醒需要建连，放到线程池里做，避免阻塞共享客户端的消息循环
+        self._wake_pool = ThreadPoolExecutor(max_workers=wake_workers, thread_name_prefix="lazy-wake")
+        self._stop = threading.Event()
+
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=f"lazy_hub_{os.getpid()}_{id(self):x}",
+            protocol=mqtt.MQTTv5
+        )
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="lazy-sweeper", daemon=True)
+
+        LAZY_DEVICES.set_function(self._state_counts)
+
+    # ---------- 生命周期 ----------
+    def start(self) -> bool:
+        try:
+            self.client.connect(self.broker, self.port, keepalive=60)
+            self.client.loop_start()
+        except Exception as e:
+            self.logger.error(f"Shared connection failed: {str(e)}")
+            return False
+        self._sweeper.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        LAZY_DEVICES.remove_function(self._state_counts)
+        self.client.disconnect()
+        self.client.loop_stop()
+        self._wake_pool.shutdown(wait=False)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            self.logger.error(f"Shared connection failed: {reason_code}")
+            return
+        client.subscribe("home/+/+/control/#", qos=1)
+
+    # ---------- 设备登记 ----------
+    def register(self, device):
+        """登记设备（挂起状态，不建立连接）"""
+        device.activity_hook = self.touch
+        with self._lock:
+            self._devices[device.device_id] = device
+            self._states[device.device_id] = PARKED
+            self._ready[device.device_id] = threading.Event()
+            self._last_active[device.device_id] = time.monotonic()
+        self._router.add(f"{device.base_topic}/control/+", self._route, device.device_id)
+
+    def unregister(self, device_id: str):
+        with self._lock:
+            device = self._devices.pop(device_id, None)
+            self._states.pop(device_id, None)
+            self._ready.pop(device_id, None)
+            self._last_active.pop(device_id, None)
+        if device is not None:
+            device.activity_hook = None
+            self._router.remove(f"{device.base_topic}/control/+", slot=device_id)
+
+    def state_of(self, device_id: str) -> Optional[str]:
+        return self._states.get(device_id)
+
+    def _state_counts(self):
+        counts = {PARKED: 0, WAKING: 0, ACTIVE: 0, PARKING: 0}
+        for state in list(self._states.values()):
+            counts[state] += 1
+        return counts
+
+    # ---------- 唤醒 / 挂起 ----------
+    def touch(self, device) -> bool:
+        """设备有活动（发布状态前由设备调用）；挂起中则同步唤醒，返回是否已连接"""
+        device_id = device.device_id
+        with self._lock:
+            if device_id in self._last_active:
+                self._last_active[device_id] = time.monotonic()
+            if self._states.get(device_id) == ACTIVE:
+                return True
+        return self.wake(device_id)
+
+    def wake(self, device_id: str) -> bool:
+        """建立设备的专属会话并等待连接完成；并发调用只会建连一次"""
+        with self._lock:
+            state = self._states.get(device_id)
+            if state is None:
+                return False
+            ready = self._ready[device_id]
+            connect = state == PARKED
+            if connect:
+                self._states[device_id] = WAKING
+                ready.clear()
+            device = self._devices[device_id]
+
+        if not connect:
+            # 正在唤醒但会话已建立：设备在自己的连接回调里发布状态时会走到这里（回调运行在
+            # 网络线程上，等待唤醒完成会卡住连接流程），会话已可用，直接返回
+            if state == WAKING and device.client.is_connected():
+                return True
+            if not ready.wait(self.wake_timeout):
+                return False
+            if state == PARKING:
+                # 挂起完成后重新唤醒
+                return self.wake(device_id)
+            return self._states.get(device_id) == ACTIVE
+
+        ok = device.connect()
+        deadline = time.monotonic() + self.wake_timeout
+        while ok and not device.client.is_connected() and time.monotonic() < deadline:
+            time.sleep(0.005)
+        ok = ok and device.client.is_connected()
+
+        with self._lock:
+            if device_id in self._states:
+                self._states[device_id] = ACTIVE if ok else PARKED
+                self._last_active[device_id] = time.monotonic()
+        ready.set()
+        LAZY_TRANSITIONS.inc("wake" if ok else "wake_failed")
+        return ok
+
+    def park(self, device_id: str) -> bool:
+        """断开设备的专属会话（正常断开，不会触发自动重连）"""
+        with self._lock:
+            if self._states.get(device_id) != ACTIVE:
+                return False
+            self._states[device_id] = PARKING
+            ready = self._ready[device_id]
+            ready.clear()
+            device = self._devices[device_id]
+        # 设备的 disconnect() 发送 DISCONNECT 后 loop_stop()，网络线程退出；
+        # paho 的唤醒用 socketpair 要到下次 connect 才关闭，换用新客户端让旧客户端连同套接字一起回收
+        device.disconnect()
+        device.renew_client()
+        with self._lock:
+            if device_id in self._states:
+                self._states[device_id] = PARKED
+        ready.set()
+        LAZY_TRANSITIONS.inc("park")
+        return True
+
+    def _sweep_loop(self):
+        interval = max(0.05, min(self.idle_timeout / 2, 5.0))
+        while not self._stop.wait(interval):
+            now = time.monotonic()
+            idle = [device_id for device_id, state in list(self._states.items())
+                    if state == ACTIVE and now - self._last_active.get(device_id, now) > self.idle_timeout]
+            # 断开要等各自的网络线程退出，并行做
+            list(self._wake_pool.map(self.park, idle))
+
+    # ---------- 共享订阅 ----------
+    def _on_message(self, client, userdata, msg):
+        """替挂起/唤醒中的设备接收命令：唤醒后交给设备自己的消息处理函数"""
+        self._router.dispatch(msg.topic, msg)
+
+    def _route(self, device_id: str, command: str, msg):
+        if self._states.get(device_id) in (PARKED, WAKING, PARKING):
+            self._wake_pool.submit(self._deliver, device_id, msg)
+
+    def _deliver(self, device_id: str, msg):
+        device = self._devices.get(device_id)
+        # touch() 在锁内刷新活跃时间（已注销的设备不会被重新登记），挂起中则先唤醒
+        if device is None or not self.touch(device):
+            return
+        device._on_message(device.client, None, msg)
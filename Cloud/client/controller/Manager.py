@@ -1,13 +1,34 @@
 from flask_socketio import SocketIO
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 from Cloud.client.entity.Bulb import SmartBulb
 from Cloud.client.entity.Sensor import EnvironmentSensor
 from Cloud.client.entity.Lock import SmartLock
-import logging
+from Cloud.client.util.CommandSchema import LIGHT, LOCK
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.RegistryStore import DeviceRecord, RegistryStore
+from Cloud.client.controller.LazyConnector import LazyConnector
+from Cloud.client.controller.ChangeLog import ChangeLog
+from Cloud.client.controller.GroupRegistry import GroupRegistry
+from Cloud.client.controller.SceneEngine import SceneEngine
+
+# 设备类 -> (命令定义, 更新方法)：HTTP 控制接口把请求体按 schema 的 update 命令校验后以关键字参数传入
+CONTROLS = {
+    SmartBulb: (LIGHT, SmartBulb.update_state),
+    SmartLock: (LOCK, SmartLock.set_lock)
+}
+
 
 class DeviceManager:
     """
     统一设备管理器（支持灯泡、传感器、门锁）
+    设置环境变量 DEVICE_REGISTRY_DIR 后注册表持久化到该目录，重启时自动恢复
+    （DEVICE_RESTORE_MODE=parallel/lazy/none 决定恢复后的连接方式）
+    DEVICE_CONNECT_MODE=lazy 时新建设备也不立即连接，空闲 DEVICE_IDLE_TIMEOUT 秒后自动挂起
+    设备分组 / 房间及其聚合状态见 groups（GroupRegistry），供客户端增量同步的变更日志见 changes（ChangeLog）
     """
 
     _instance = None
@@ -16,17 +37,23 @@ class DeviceManager:
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance.devices: Dict[str, object] = {}
+            cls._instance.store = None
+            cls._instance.connect_mode = os.getenv("DEVICE_CONNECT_MODE", "eager")
+            cls._instance.idle_timeout = float(os.getenv("DEVICE_IDLE_TIMEOUT", "300"))
+            cls._instance.connectors: Dict[tuple, LazyConnector] = {}
+            cls._instance._connectors_lock = threading.Lock()
+            cls._instance.groups = GroupRegistry()
+            cls._instance.changes = ChangeLog()
+            cls._instance.scenes = None
             cls._instance._setup_logger()
+            registry_dir = os.getenv("DEVICE_REGISTRY_DIR")
+            if registry_dir:
+                cls._instance.enable_persistence(registry_dir, connect=os.getenv("DEVICE_RESTORE_MODE", "parallel"))
         return cls._instance
 
     def _setup_logger(self):
-        """配置日志系统"""
-        self.logger = logging.getLogger("DeviceManager")
-        self.logger.setLevel(logging.INFO)
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
+        """配置日志系统（统一日志管道）"""
+        self.logger = get_logger("manager")
 
     def create_device(self, device_type: str, device_id: str, **kwargs) -> bool:
         """增强版创建设备"""
@@ -48,9 +75,23 @@ class DeviceManager:
             'lock': SmartLock
         }
         device = device_classes[device_type](device_id,**kwargs)
-        device.connect()
-
+        # 先登记再推进变更序号：/view 的快照缓存以序号为版本，序号变化时设备必须已可见
         self.devices[device_id] = device
+        self.groups.track(device_id, device_type, device)
+        self.changes.track(device_id, device_type, device)
+        try:
+            if self.connect_mode == "lazy":
+                self._connector_for(device).register(device)
+            else:
+                device.connect()
+        except Exception:
+            self.devices.pop(device_id, None)
+            self.groups.forget(device_id)
+            self.changes.forget(device_id)
+            raise
+
+        if self.store is not None:
+            self.store.add(DeviceRecord(device_type, device_id, kwargs['broker'], kwargs.get('port', 1883)))
         return True
 
 
@@ -60,14 +101,78 @@ class DeviceManager:
         if device_id not in self.devices:
             return False
 
-        self.devices[device_id].disconnect()
-        del self.devices[device_id]
+        device = self.devices.pop(device_id)
+        self.groups.forget(device_id)
+        self.changes.forget(device_id)
+        connector = self.connectors.get((device.broker, device.port))
+        if connector is not None:
+            connector.unregister(device_id)
+        device.disconnect()
+        if self.store is not None:
+            self.store.delete(device_id)
         return True
 
     def get_device(self, device_id: str):
         """获取设备实例"""
         return self.devices.get(device_id)
 
+    # ---------- 惰性连接 ----------
+    def _connector_for(self, device) -> LazyConnector:
+        """同一代理上的设备共用一个 LazyConnector（一条共享连接）"""
+        key = (device.broker, device.port)
+        with self._connectors_lock:
+            connector = self.connectors.get(key)
+            if connector is None:
+                connector = LazyConnector(device.broker, device.port, idle_timeout=self.idle_timeout)
+                connector.start()
+                self.connectors[key] = connector
+            return connector
+
+    # ---------- 场景 ----------
+    def scene_engine(self, broker: str, port: int) -> SceneEngine:
+        """场景引擎（首次使用时创建并连接；启用持久化时场景保存在注册表目录下的 scenes.json）"""
+        with self._connectors_lock:
+            if self.scenes is None:
+                path = os.path.join(self.store.directory, "scenes.json") if self.store is not None else None
+                self.scenes = SceneEngine(broker, port, path=path)
+                self.scenes.connect()
+            return self.scenes
+
+    # ---------- 持久化 ----------
+    def enable_persistence(self, directory: str, connect: str = "parallel", workers: int = 32) -> int:
+        """
+        打开注册表存储并恢复其中的设备，返回恢复的设备数
+        connect: parallel 后台线程池并行连接 / lazy 交给 LazyConnector，有命令或状态变化时才连接 / none 不连接
+        """
+        if connect not in ("parallel", "lazy", "none"):
+            raise ValueError(f"Unknown restore mode: {connect}")
+        self.store = RegistryStore(directory)
+        records = self.store.load()
+
+        restored = []
+        for record in records.values():
+            if record.device_id in self.devices:
+                continue
+            device = self._get_device_class(record.device_type)(record.device_id, broker=record.broker,
+                                                                 port=record.port)
+            self.devices[record.device_id] = device
+            self.groups.track(record.device_id, record.device_type, device)
+            self.changes.track(record.device_id, record.device_type, device)
+            restored.append(record.device_id)
+
+        if connect == "parallel" and restored:
+            pool = ThreadPoolExecutor(max_workers=min(workers, len(restored)), thread_name_prefix="restore")
+            for device_id in restored:
+                pool.submit(self.devices[device_id].connect)
+            pool.shutdown(wait=False)
+        elif connect == "lazy":
+            for device_id in restored:
+                device = self.devices[device_id]
+                self._connector_for(device).register(device)
+
+        self.logger.info("Restored %d devices from %s (connect=%s)", len(restored), directory, connect)
+        return len(restored)
+
     def _handle_state_update(self, device_id: str, state: Dict[str, any]):
         """推送状态更新到前端"""
         SocketIO().emit('device_update', {
@@ -80,14 +185,21 @@ class DeviceManager:
         return [
             {
                 "device_id": dev_id,
-                "type": "light" if isinstance(dev, SmartBulb) else
-                "sensor" if isinstance(dev, EnvironmentSensor) else "lock",
+                "type": self._type_name(dev),
                 "state": dev.current_state
             }
             for dev_id, dev in self.devices.items()
             if not filter_type or isinstance(dev, self._get_device_class(filter_type))
         ]
 
+    def count_devices(self) -> Dict[str, int]:
+        """按类型统计设备数（不读取设备状态，供指标抓取）"""
+        return Counter(self._type_name(dev) for dev in list(self.devices.values()))
+
+    @staticmethod
+    def _type_name(dev) -> str:
+        return "light" if isinstance(dev, SmartBulb) else "sensor" if isinstance(dev, EnvironmentSensor) else "lock"
+
     def _get_device_class(self, device_type: str):
         """获取设备类"""
         type_map = {
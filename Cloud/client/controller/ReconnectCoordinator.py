@@ -0,0 +1,160 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.Metrics import MQTT_RECONNECTS, Gauge
+
+# 优先级（数字越小越先重连）：门锁等安全相关设备优先，其次传感器，灯和控制端最后
+PRIORITIES = {"lock": 0, "sensor": 1, "bulb": 2, "controller": 3}
+
+RECONNECT_PENDING = Gauge("mqtt_reconnects_pending", "Reconnects waiting for backoff or admission")
+
+
+class ReconnectCoordinator:
+    """
+    全局重连调度
+    断线的客户端登记一个重连动作，按 decorrelated jitter 退避后进入就绪队列；
+    就绪队列按优先级出队，并受令牌桶（每秒 rate 次、突发 burst 次）和并发数 max_concurrent 限制，
+    避免代理重启后所有设备同时重连
+    """
+
+    def __init__(self, rate: float = 50.0, burst: int = 50, max_concurrent: int = 16,
+                 base_delay: float = 0.5, max_delay: float = 60.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.logger = get_logger("reconnect")
+
+        self._cond = threading.Condition()
+        self._delayed = []   # (到期时间, 序号, key)
+        self._ready = []     # (优先级, 到期时间, 序号, key)
+        self._entries: Dict[str, dict] = {}
+        self._seq = itertools.count()
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._running = 0
+        self._thread: Optional[threading.Thread] = None
+        self.attempts = 0
+        self.failures = 0
+
+        RECONNECT_PENDING.set_function(lambda: len(self._entries))
+
+    # ---------- 对外接口 ----------
+    def request(self, key: str, reconnect: Callable[[], bool], kind: str = "bulb"):
+        """
+        登记重连：reconnect() 执行一次连接尝试并返回是否成功，失败会按退避重新排队
+        同一 key 已在排队时忽略重复登记
+        """
+        with self._cond:
+            if key in self._entries:
+                return
+            entry = {"reconnect": reconnect, "kind": kind, "priority": PRIORITIES.get(kind, len(PRIORITIES)),
+                     "delay": self.base_delay, "attempts": 0}
+            self._entries[key] = entry
+            self._schedule(key, entry)
+            self._ensure_thread()
+            self._cond.notify()
+
+    def cancel(self, key: str):
+        """主动断开或删除设备时取消尚未执行的重连"""
+        with self._cond:
+            self._entries.pop(key, None)
+
+    def pending(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "pending": len(self._entries),
+                "running": self._running,
+                "attempts": self.attempts,
+                "failures": self.failures
+            }
+
+    # ---------- 调度 ----------
+    def _backoff(self, entry) -> float:
+        """decorrelated jitter：sleep = min(cap, uniform(base, 上次 * 3))"""
+        entry["delay"] = min(self.max_delay, random.uniform(self.base_delay, entry["delay"] * 3))
+        return entry["delay"]
+
+    def _schedule(self, key: str, entry):
+        heapq.heappush(self._delayed, (time.monotonic() + self._backoff(entry), next(self._seq), key))
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="reconnect-coordinator", daemon=True)
+            self._thread.start()
+
+    def _take_token(self, now: float) -> float:
+        """有令牌时取走并返回 0，否则返回需要等待的秒数"""
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _run(self):
+        with self._cond:
+            while self._entries or self._delayed or self._ready:
+                now = time.monotonic()
+                # 到期的条目进入按优先级排序的就绪队列
+                while self._delayed and self._delayed[0][0] <= now:
+                    due, seq, key = heapq.heappop(self._delayed)
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        heapq.heappush(self._ready, (entry["priority"], due, seq, key))
+
+                # 丢掉已取消的条目
+                while self._ready and self._ready[0][3] not in self._entries:
+                    heapq.heappop(self._ready)
+
+                wait = self._delayed[0][0] - now if self._delayed else 1.0
+                if self._ready and self._running < self.max_concurrent:
+                    token_wait = self._take_token(now)
+                    if token_wait == 0:
+                        _, _, _, key = heapq.heappop(self._ready)
+                        self._running += 1
+                        threading.Thread(target=self._attempt, args=(key, self._entries[key]),
+                                         name="reconnect-attempt", daemon=True).start()
+                        continue
+                    wait = min(wait, token_wait)
+                self._cond.wait(timeout=max(wait, 0.001))
+            self._thread = None
+
+    def _attempt(self, key: str, entry):
+        try:
+            ok = bool(entry["reconnect"]())
+        except Exception as e:
+            self.logger.warning("Reconnect %s failed: %s", key, e)
+            ok = False
+
+        with self._cond:
+            self._running -= 1
+            self.attempts += 1
+            entry["attempts"] += 1
+            MQTT_RECONNECTS.inc(entry["kind"], "success" if ok else "failure")
+            if self._entries.get(key) is entry:
+                if ok:
+                    del self._entries[key]
+                else:
+                    self.failures += 1
+                    self._schedule(key, entry)
+            self._cond.notify()
+
+
+coordinator = ReconnectCoordinator(
+    rate=float(os.getenv("RECONNECT_RATE", "50")),
+    burst=int(os.getenv("RECONNECT_BURST", "50")),
+    max_concurrent=int(os.getenv("RECONNECT_CONCURRENCY", "16")),
+    base_delay=float(os.getenv("RECONNECT_BASE_DELAY", "0.5")),
+    max_delay=float(os.getenv("RECONNECT_MAX_DELAY", "60"))
+)
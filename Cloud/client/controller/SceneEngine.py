@@ -0,0 +1,361 @@
+"""
+场景：一组设备的目标状态，作为对象保存（可持久化到 JSON 文件），一次激活原子地切换全部设备
+
+定义时按 CommandSchema 校验并预编译成发布计划：每台设备一条 control/update 命令（主题、负载字节、期望状态），
+激活时不再做校验和编码，全部命令以 QoS 1 连续发出（不限制在途消息数），
+再按设备回传的状态（带本次激活的 trace ID 且与期望一致）确认完成；
+超时未确认或发布失败时，把已发出命令的设备恢复到激活前的状态（来自订阅 home/+/+/state 缓存的最新状态）
+
+    with SceneEngine("127.0.0.1", 1883) as engine:
+        engine.define("movie", {"living_lamp": {"type": "light", "state": "on", "brightness": 20}})
+        engine.activate("movie")
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+from Cloud.client.controller.ReconnectCoordinator import coordinator
+from Cloud.client.util import Tracing
+from Cloud.client.util.Codec import dumps
+from Cloud.client.util.CommandSchema import SCHEMAS, CommandError
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.Metrics import MQTT_PUBLISHED, MQTT_RECEIVED, SCENE_ACTIVATION_SECONDS
+from Cloud.client.util.Payload import JSON, decode_message, publish_properties
+from Cloud.client.util.Tracing import tracer
+
+
+class SceneError(ValueError):
+    pass
+
+
+def _light_expected(params: Dict) -> Dict:
+    # 关灯时灯泡忽略亮度和颜色
+    return {"state": "off"} if params["state"] == "off" else dict(params)
+
+
+def _light_restore(state: Dict) -> Dict:
+    if state.get("state") == "on":
+        return {"state": "on", "brightness": state["brightness"], "color": state["color"]}
+    return {"state": "off"}
+
+
+# 支持场景的设备类型 -> (必填参数, 由命令参数得到期望状态, 由设备上报的状态得到恢复用的参数)
+TRANSITIONS: Dict[str, Tuple[Tuple[str, ...], Callable[[Dict], Dict], Callable[[Dict], Dict]]] = {
+    "light": (("state",), _light_expected, _light_restore),
+    "lock": (("locked",), dict, lambda state: {"locked": state["locked"]})
+}
+
+
+class Step(NamedTuple):
+    """发布计划中的一条命令"""
+    device_id: str
+    device_type: str
+    topic: str
+    payload: bytes
+    expected: Dict[str, Any]
+
+
+class Scene:
+    def __init__(self, name: str, targets: Dict[str, Dict[str, Any]], plan: List[Step]):
+        self.name = name
+        self.targets = targets
+        self.plan = plan
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "targets": self.targets, "devices": len(self.plan)}
+
+
+def compile_scene(name: str, targets: Dict[str, Dict[str, Any]]) -> Scene:
+    """校验目标状态并生成发布计划；targets: 设备 ID -> {"type": 设备类型, 参数...}"""
+    if not name:
+        raise SceneError("scene name is required")
+    if not isinstance(targets, dict) or not targets:
+        raise SceneError("targets must be a non-empty object keyed by device_id")
+    normalized, plan = {}, []
+    for device_id, target in targets.items():
+        if not isinstance(target, dict):
+            raise SceneError(f"{device_id}: target must be an object")
+        params = dict(target)
+        device_type = params.pop("type", None)
+        if device_type not in TRANSITIONS:
+            raise SceneError(f"{device_id}: type must be one of {sorted(TRANSITIONS)}")
+        required, expected, _ = TRANSITIONS[device_type]
+        missing = [field for field in required if field not in params]
+        if missing:
+            raise SceneError(f"{device_id}: missing {missing}")
+        schema = SCHEMAS[device_type]
+        try:
+            params = schema.validate("update", params)
+        except CommandError as e:
+            raise SceneError(f"{device_id}: {e}") from e
+        normalized[device_id] = {"type": device_type, **params}
+        plan.append(Step(device_id, device_type, f"home/{schema.kind}/{device_id}/control/update",
+                         dumps(params), expected(params)))
+    return Scene(name, normalized, plan)
+
+
+class _Activation:
+    """一次下发（激活或回滚）：等待确认的设备及各自的确认耗时"""
+
+    def __init__(self, trace_id: str, plan: List[Step]):
+        self.trace_id = trace_id
+        self.pending = {step.device_id: step.expected for step in plan}
+        self.confirmed: Dict[str, float] = {}
+        self.started = time.perf_counter()
+        self.done = threading.Event()
+
+    def confirm(self, device_id: str, state: Dict) -> bool:
+        expected = self.pending.get(device_id)
+        if expected is None or any(state.get(key) != value for key, value in expected.items()):
+            return False
+        del self.pending[device_id]
+        self.confirmed[device_id] = time.perf_counter() - self.started
+        if not self.pending:
+            self.done.set()
+        return True
+
+
+class SceneEngine:
+    """
+    场景引擎：一条 MQTT 连接负责下发全部场景命令，并订阅所有设备状态用于确认和回滚
+    path 不为空时场景保存到该 JSON 文件，启动时加载
+    """
+
+    def __init__(self, broker: str, port: int = 1883, path: Optional[str] = None, timeout: float = 5.0):
+        self.broker = broker
+        self.port = port
+        self.path = path
+        self.timeout = timeout
+        self.scenes: Dict[str, Scene] = {}
+        self.logger = get_logger("controller", "scenes")
+
+        # 设备 ID -> 最近一次上报的状态（回滚依据）
+        self._states: Dict[str, Dict] = {}
+        # trace ID -> 进行中的下发
+        self._active: Dict[str, _Activation] = {}
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=f"scenes_{os.getpid()}_{id(self):x}",
+            protocol=mqtt.MQTTv5,
+            reconnect_on_failure=False  # 断线重连交给 ReconnectCoordinator 统一调度
+        )
+        # 一个场景的全部 QoS 1 命令同时在途，不按默认的 20 条分批等待 PUBACK
+        self.client.max_inflight_messages_set(0)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.on_disconnect = self._on_disconnect
+
+        if path:
+            self._load()
+
+    # ---------- 连接 ----------
+    def connect(self, wait: float = 5.0) -> bool:
+        """连接代理并等待订阅发出（最多 wait 秒）"""
+        return self._open() and self._connected.wait(wait)
+
+    def _open(self) -> bool:
+        try:
+            self.client.connect(self.broker, self.port, keepalive=60)
+            self.client.loop_start()
+            return True
+        except Exception as e:
+            self.logger.error(f"Connection failed: {str(e)}")
+            return False
+
+    def disconnect(self):
+        coordinator.cancel(self._reconnect_key)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    @property
+    def _reconnect_key(self) -> str:
+        return f"controller:scenes:{id(self):x}"
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            self.logger.error(f"Connection failed with reason code: {reason_code}")
+            return
+        # 保留消息会立即带回所有设备的最新状态
+        client.subscribe("home/+/+/state", qos=1)
+        self._connected.set()
+
+    def _on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
+        self._connected.clear()
+        if reason_code != mqtt.MQTT_ERR_SUCCESS:
+            self.logger.warning(f"Disconnected with reason: {reason_code}")
+            coordinator.request(self._reconnect_key, self._attempt_reconnect, "controller")
+
+    def _attempt_reconnect(self) -> bool:
+        self.client.loop_stop()
+        return self._open()
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            kind, device_id = msg.topic.split("/")[1:3]
+            MQTT_RECEIVED.inc("controller", f"{kind}/state")
+            state = decode_message(msg)
+            if not isinstance(state, dict):
+                return
+            trace_id = Tracing.from_message(msg)
+            with self._lock:
+                self._states[device_id] = state
+                activation = self._active.get(trace_id) if trace_id else None
+                if activation is not None:
+                    activation.confirm(device_id, state)
+        except Exception as e:
+            self.logger.error(f"Error processing message: {str(e)}")
+
+    def state_of(self, device_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._states.get(device_id)
+
+    # ---------- 场景管理 ----------
+    def define(self, name: str, targets: Dict[str, Dict[str, Any]]) -> Scene:
+        """新建或替换场景"""
+        scene = compile_scene(name, targets)
+        with self._lock:
+            self.scenes[name] = scene
+            self._save()
+        return scene
+
+    def delete(self, name: str) -> bool:
+        with self._lock:
+            if self.scenes.pop(name, None) is None:
+                return False
+            self._save()
+            return True
+
+    def list_scenes(self) -> List[Dict]:
+        with self._lock:
+            return [scene.to_dict() for scene in self.scenes.values()]
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for name, targets in json.load(f).items():
+                try:
+                    self.scenes[name] = compile_scene(name, targets)
+                except SceneError as e:
+                    self.logger.error(f"Skipping stored scene {name}: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({name: scene.targets for name, scene in self.scenes.items()}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    # ---------- 激活 ----------
+    def activate(self, name: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        激活场景并等待全部设备确认；部分失败时回滚已下发的设备
+        返回 status 为 applied / rolled_back / failed（回滚也未完成）及各阶段耗时
+        """
+        with self._lock:
+            scene = self.scenes.get(name)
+            if scene is None:
+                raise SceneError(f"scene {name} not found")
+            # 激活前的状态快照（回滚依据）
+            previous = {step.device_id: self._states.get(step.device_id) for step in scene.plan}
+        timeout = self.timeout if timeout is None else timeout
+
+        started = time.time()
+        activation, publish_failed, publish_seconds = self._dispatch(scene.plan, timeout)
+        result = {
+            "scene": name,
+            "devices": len(scene.plan),
+            "confirmed": len(activation.confirmed),
+            "publish_ms": round(publish_seconds * 1000, 3),
+            "device_p50_ms": None,
+            "device_max_ms": None,
+            "failed": sorted(set(activation.pending) | set(publish_failed))
+        }
+        if activation.confirmed:
+            samples = sorted(activation.confirmed.values())
+            result["device_p50_ms"] = round(samples[len(samples) // 2] * 1000, 3)
+            result["device_max_ms"] = round(samples[-1] * 1000, 3)
+        elapsed = time.perf_counter() - activation.started
+        result["latency_ms"] = round(elapsed * 1000, 3)
+        tracer.record(activation.trace_id, "scene.activate", started, elapsed, scene=name,
+                      devices=len(scene.plan), confirmed=len(activation.confirmed))
+
+        if not result["failed"]:
+            result["status"] = "applied"
+            SCENE_ACTIVATION_SECONDS.observe(elapsed, "applied")
+            return result
+
+        self.logger.warning("Scene %s failed on %d/%d devices, rolling back",
+                            name, len(result["failed"]), len(scene.plan))
+        result.update(self._rollback(scene.plan, previous, set(publish_failed), timeout))
+        result["status"] = "rolled_back" if not result["rollback_failed"] else "failed"
+        SCENE_ACTIVATION_SECONDS.observe(time.perf_counter() - activation.started, result["status"])
+        return result
+
+    def _dispatch(self, plan: List[Step], timeout: float) -> Tuple[_Activation, List[str], float]:
+        """按计划连续发出全部命令，等待确认或超时；返回 (下发记录, 发布失败的设备, 发布耗时)"""
+        trace_id = tracer.start_trace() or os.urandom(8).hex()
+        activation = _Activation(trace_id, plan)
+        properties = publish_properties(JSON, trace_id=trace_id)
+        failed = []
+        with self._lock:
+            self._active[trace_id] = activation
+        try:
+            for step in plan:
+                info = self.client.publish(step.topic, step.payload, qos=1, properties=properties)
+                if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                    failed.append(step.device_id)
+                else:
+                    MQTT_PUBLISHED.inc("controller", f"{SCHEMAS[step.device_type].kind}/control")
+            publish_seconds = time.perf_counter() - activation.started
+            if failed:
+                with self._lock:
+                    for device_id in failed:
+                        activation.pending.pop(device_id, None)
+                    if not activation.pending:
+                        activation.done.set()
+            activation.done.wait(timeout)
+        finally:
+            with self._lock:
+                del self._active[trace_id]
+        return activation, failed, publish_seconds
+
+    def _rollback(self, plan: List[Step], previous: Dict[str, Optional[Dict]], skip: set,
+                  timeout: float) -> Dict[str, Any]:
+        """把已发出命令的设备恢复到激活前的状态"""
+        steps, unrestorable = [], []
+        for step in plan:
+            if step.device_id in skip:
+                continue
+            state = previous.get(step.device_id)
+            if state is None:
+                unrestorable.append(step.device_id)
+                continue
+            params = TRANSITIONS[step.device_type][2](state)
+            steps.append(step._replace(payload=dumps(params), expected=TRANSITIONS[step.device_type][1](params)))
+        restored, failed = {}, []
+        if steps:
+            activation, failed, _ = self._dispatch(steps, timeout)
+            restored = activation.confirmed
+            failed = failed + list(activation.pending)
+        # 没见过状态的设备无从恢复，单独列出（多半是离线设备，命令也不会生效）
+        return {
+            "rolled_back": sorted(restored),
+            "rollback_failed": sorted(failed),
+            "unrestorable": sorted(unrestorable)
+        }
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
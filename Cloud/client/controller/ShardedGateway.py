@@ -0,0 +1,415 @@
+"""
+分片网关：N 个 DeviceController 工作进程按设备 ID 的哈希各管一部分设备，
+前端路由进程把 HTTP / WebSocket 请求转发给设备所在的分片，设备列表等跨分片请求并发查询后合并
+
+每个工作进程有自己的 DeviceManager、MQTT 连接和 GIL，吞吐随核数扩展
+路由规则：
+    POST /api/devices                  按请求体中的 device_id
+    /api/devices/<device_id>[/...]     按路径中的 device_id
+    GET  /api/devices/view             查询全部分片后合并
+    GET  /api/devices/changes          查询全部分片后合并，游标为各分片游标用 _ 连接（带 shard 参数时只同步该分片）
+    /api/groups[/...]                  分组定义（创建 / 删除）广播到全部分片，成员增删按设备 ID，读取时合并各分片的聚合
+    /socket.io/...                     按查询参数 device_id（没有则按 shard，默认 0）
+    其他（/metrics、/api/traces 等）    按查询参数 shard，默认 0
+
+用法（仓库根目录）：
+    python -m Cloud.client.controller.ShardedGateway --shards 4 --port 5000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import zlib
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from Cloud.client.util import Compression
+from Cloud.client.util.Http import MAX_HEAD, Head, dechunk, error_response, read_body, read_head, response
+from Cloud.client.util.Logs import get_logger
+
+FANOUT = -1
+# 每个分片保留的空闲长连接上限，超出的连接用完即关
+MAX_IDLE_PER_SHARD = int(os.getenv("GATEWAY_MAX_IDLE_PER_SHARD", "64"))
+
+
+def shard_of(device_id: str, shards: int) -> int:
+    """设备 ID -> 分片编号（跨进程稳定，不能用内置 hash）"""
+    return zlib.crc32(device_id.encode("utf-8")) % shards
+
+
+def _weighted(pairs) -> Optional[float]:
+    """各分片的 (均值, 个数) -> 总体均值；分片返回的均值已四舍五入，合并结果有同等量级的误差"""
+    total = sum(count for value, count in pairs if value is not None)
+    if not total:
+        return None
+    return sum(value * count for value, count in pairs if value is not None) / total
+
+
+def merge_group_summaries(summaries: List[dict]) -> dict:
+    """合并同一分组在各分片上的聚合状态（每个分片只统计自己的设备）"""
+    merged = dict(summaries[0])
+    merged["member_count"] = sum(s["member_count"] for s in summaries)
+    if "devices" in merged:
+        merged["devices"] = sorted(d for s in summaries for d in s.get("devices", ()))
+    lights = [s["lights"] for s in summaries]
+    on = sum(l["on"] for l in lights)
+    brightness = _weighted([(l["average_brightness"], l["on"]) for l in lights])
+    merged["lights"] = {"total": sum(l["total"] for l in lights), "on": on,
+                        "average_brightness": round(brightness, 1) if brightness is not None else None}
+    locks = [s["locks"] for s in summaries]
+    unlocked = sum(l["unlocked"] for l in locks)
+    merged["locks"] = {"total": sum(l["total"] for l in locks), "unlocked": unlocked, "any_unlocked": unlocked > 0}
+    sensors = [s["sensors"] for s in summaries]
+    temperature = _weighted([(s["mean_temperature"], s["total"]) for s in sensors])
+    humidity = _weighted([(s["mean_humidity"], s["total"]) for s in sensors])
+    merged["sensors"] = {"total": sum(s["total"] for s in sensors),
+                         "mean_temperature": round(temperature, 2) if temperature is not None else None,
+                         "mean_humidity": round(humidity, 2) if humidity is not None else None}
+    return merged
+
+
+# ---------- 工作进程 ----------
+def _run_shard(index: int, shards: int, host: str, conn, registry_dir: Optional[str]):
+    os.environ["GATEWAY_SHARD"] = str(index)
+    os.environ["GATEWAY_SHARDS"] = str(shards)
+    if registry_dir:
+        # 每个分片持久化自己的那部分设备
+        os.environ["DEVICE_REGISTRY_DIR"] = os.path.join(registry_dir, f"shard-{index}")
+    from werkzeug.serving import make_server
+    from Cloud.client.controller import DeviceController
+    from Cloud.client.util.Wsgi import KeepAliveRequestHandler
+
+    # 逐请求的访问日志在高并发下开销明显，分片只记录告警以上
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(host, 0, DeviceController.app, threaded=True, request_handler=KeepAliveRequestHandler)
+    conn.send(server.port)
+    conn.close()
+    server.serve_forever()
+
+
+# ---------- 前端路由 ----------
+class ShardRouter:
+    """
+    前端路由（asyncio）：与各分片之间保持长连接池，按设备 ID 转发请求
+    ports 为各分片监听的端口
+    """
+
+    def __init__(self, ports: List[int], host: str = "127.0.0.1", max_idle: int = MAX_IDLE_PER_SHARD):
+        self.ports = ports
+        self.host = host
+        self.max_idle = max_idle
+        self.logger = get_logger("gateway")
+        self._idle: List[List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = [[] for _ in ports]
+        self.forwarded = [0] * len(ports)
+        self.snapshots = Compression.SnapshotCache()
+
+    @property
+    def shards(self) -> int:
+        return len(self.ports)
+
+    def route(self, method: str, target: str, body: bytes) -> int:
+        """请求 -> 分片编号（FANOUT 表示需要查询全部分片）"""
+        url = urlsplit(target)
+        path = url.path
+        if path.startswith("/api/devices"):
+            parts = path.split("/")
+            if len(parts) == 3:
+                if method == "POST":
+                    device_id = json.loads(body or b"{}").get("device_id")
+                    return shard_of(str(device_id), self.shards) if device_id is not None else 0
+                return 0
+            if parts[3] == "view":
+                return FANOUT
+            if parts[3] != "changes":
+                return shard_of(parts[3], self.shards)
+            if "shard" not in parse_qs(url.query):
+                return FANOUT
+
+        if path == "/api/groups" or path.startswith("/api/groups/"):
+            return FANOUT
+
+        query = parse_qs(url.query)
+        if path.startswith("/socket.io") and "device_id" in query:
+            return shard_of(query["device_id"][0], self.shards)
+        shard = int(query.get("shard", ["0"])[0])
+        return shard if 0 <= shard < self.shards else 0
+
+    # ---------- 与分片的连接 ----------
+    async def _acquire(self, shard: int):
+        idle = self._idle[shard]
+        if idle:
+            return idle.pop(), True
+        return await asyncio.open_connection(self.host, self.ports[shard]), False
+
+    def _release(self, shard: int, connection):
+        idle = self._idle[shard]
+        if len(idle) < self.max_idle:
+            idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def forward(self, shard: int, request: bytes) -> Tuple[Head, bytes]:
+        """把完整请求发给分片并读回完整响应；复用的空闲连接已被关闭时换新连接重试一次"""
+        for _ in range(2):
+            (reader, writer), reused = await self._acquire(shard)
+            try:
+                writer.write(request)
+                await writer.drain()
+                head = await read_head(reader)
+                if head is None:
+                    raise ConnectionResetError("shard closed the connection")
+                body, reusable = await read_body(reader, head, response=True)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            if reusable and head.keep_alive:
+                self._release(shard, (reader, writer))
+            else:
+                writer.close()
+            self.forwarded[shard] += 1
+            return head, body
+        raise ConnectionResetError("shard unavailable")
+
+    @staticmethod
+    def _dechunked(head: Head, body: bytes) -> Tuple[Head, bytes]:
+        """chunked 请求体还原后改为按 Content-Length 转发（路由要解析请求体，分片收到定长请求体才能保持长连接）"""
+        body = dechunk(body)
+        lines = [line for line in head.raw.split(b"\r\n")
+                 if line and not line.lower().startswith(b"transfer-encoding:")]
+        lines.append(f"Content-Length: {len(body)}".encode("latin-1"))
+        return Head(b"\r\n".join(lines) + b"\r\n\r\n"), body
+
+    @staticmethod
+    def _uncompressed(head: Head, body: bytes, target: Optional[str] = None) -> bytes:
+        """转发给分片的请求：去掉 Accept-Encoding（合并前需要明文），可替换请求目标"""
+        lines = head.raw.split(b"\r\n")
+        if target is not None:
+            lines[0] = f"{head.start[0]} {target} {head.start[2]}".encode("latin-1")
+        return b"\r\n".join(line for line in lines if not line.lower().startswith(b"accept-encoding:")) + body
+
+    async def _fan_out(self, head: Head, body: bytes) -> bytes:
+        path = urlsplit(head.start[1]).path.rstrip("/")
+        if path.startswith("/api/groups"):
+            return await self._groups(head, body)
+        if path.endswith("/changes"):
+            return await self._changes(head, body)
+        return await self._list_devices(head, body)
+
+    async def _list_devices(self, head: Head, body: bytes) -> bytes:
+        """跨分片设备列表：并发查询各分片（不压缩）后合并，合并结果按客户端的 Accept-Encoding 压缩"""
+        request = self._uncompressed(head, body)
+        results = await asyncio.gather(*(self.forward(shard, request) for shard in range(self.shards)))
+        devices = []
+        for shard_head, shard_body in results:
+            if shard_head.start[1] != "200":
+                return error_response(502, "shard_list_failed")
+            devices.extend(json.loads(shard_body))
+        merged, headers = self.snapshots.encode(
+            "view", lambda: json.dumps(devices, ensure_ascii=False).encode("utf-8"), head.headers.get("accept-encoding"))
+        return response(200, merged, headers=headers)
+
+    async def _groups(self, head: Head, body: bytes) -> bytes:
+        """
+        分组：每个分片都有全部分组的定义，但只统计自己的设备
+        创建 / 删除分组广播到全部分片；成员增删转发到设备所在分片；读取时合并各分片的聚合
+        """
+        method = head.start[0]
+        parts = urlsplit(head.start[1]).path.rstrip("/").split("/")
+        request = self._uncompressed(head, body)
+        if len(parts) == 6 and parts[4] == "devices":
+            member_head, member_body = await self.forward(shard_of(parts[5], self.shards), request)
+            if member_head.start[1] != "200":
+                return member_head.raw + member_body
+            return await self._read_groups(head, f"/api/groups/{parts[3]}")
+        if method == "GET":
+            return await self._read_groups(head, head.start[1])
+
+        results = await asyncio.gather(*(self.forward(shard, request) for shard in range(self.shards)))
+        for result_head, result_body in results:
+            if not result_head.start[1].startswith("2"):
+                return result_head.raw + result_body
+        return results[0][0].raw + results[0][1]
+
+    async def _read_groups(self, head: Head, target: str) -> bytes:
+        request = f"GET {target} HTTP/1.1\r\nHost: {head.headers.get('host', self.host)}\r\n\r\n".encode("latin-1")
+        results = await asyncio.gather(*(self.forward(shard, request) for shard in range(self.shards)))
+        for result_head, result_body in results:
+            if result_head.start[1] != "200":
+                return result_head.raw + result_body
+        bodies = [json.loads(result_body) for _, result_body in results]
+        if isinstance(bodies[0], list):
+            by_id = {}
+            for summaries in bodies:
+                for summary in summaries:
+                    by_id.setdefault(summary["group_id"], []).append(summary)
+            merged = [merge_group_summaries(by_id[summary["group_id"]]) for summary in bodies[0]]
+        else:
+            merged = merge_group_summaries(bodies)
+        encoded, headers = Compression.encode(json.dumps(merged, ensure_ascii=False).encode("utf-8"),
+                                              head.headers.get("accept-encoding"))
+        return response(200, encoded, headers=headers)
+
+    async def _changes(self, head: Head, body: bytes) -> bytes:
+        """
+        跨分片增量同步：游标是各分片游标用 _ 连接的字符串，按分片拆开分别查询后合并
+        任一分片要求全量（reset）时其余分片也改为全量，客户端据此替换整个缓存；limit 对每个分片分别生效
+        """
+        url = urlsplit(head.start[1])
+        query = parse_qs(url.query)
+        parts = query.get("since", [""])[0].split("_")
+        cursors = parts if len(parts) == self.shards and all(p.isdigit() for p in parts) else ["0"] * self.shards
+        limit = query.get("limit", [None])[0]
+
+        async def query_shard(shard: int, since: str):
+            params = {"since": since}
+            if limit is not None:
+                params["limit"] = limit
+            shard_head, shard_body = await self.forward(
+                shard, self._uncompressed(head, body, f"{url.path}?{urlencode(params)}"))
+            if shard_head.start[1] != "200":
+                raise ValueError(f"shard {shard} returned {shard_head.start[1]}")
+            return json.loads(shard_body)
+
+        try:
+            results = await asyncio.gather(*(query_shard(shard, cursors[shard]) for shard in range(self.shards)))
+            if any(result["reset"] for result in results):
+                stale = [shard for shard, result in enumerate(results) if not result["reset"]]
+                for shard, result in zip(stale, await asyncio.gather(*(query_shard(s, "0") for s in stale))):
+                    results[shard] = result
+        except ValueError:
+            return error_response(502, "shard_changes_failed")
+
+        merged = {
+            "cursor": "_".join(str(result["cursor"]) for result in results),
+            "reset": any(result["reset"] for result in results),
+            "changes": [change for result in results for change in result["changes"]],
+            "deleted": [device_id for result in results for device_id in result["deleted"]],
+            "more": any(result["more"] for result in results)
+        }
+        encoded, headers = Compression.encode(json.dumps(merged, ensure_ascii=False).encode("utf-8"),
+                                              head.headers.get("accept-encoding"))
+        return response(200, encoded, headers=headers)
+
+    # ---------- 客户端连接 ----------
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await read_head(reader)
+                if head is None or len(head.start) < 3:
+                    break
+                body, _ = await read_body(reader, head, response=False)
+                method, target = head.start[0], head.start[1]
+                try:
+                    if "chunked" in head.headers.get("transfer-encoding", "").lower():
+                        head, body = self._dechunked(head, body)
+                    shard = self.route(method, target, body)
+                except (ValueError, AttributeError):
+                    writer.write(error_response(400, "invalid_request"))
+                    break
+
+                if "upgrade" in head.headers:
+                    # WebSocket：与分片单独建连后双向透传，直到任一方关闭
+                    await self._tunnel(shard, head.raw + body, reader, writer)
+                    return
+
+                try:
+                    if shard == FANOUT:
+                        writer.write(await self._fan_out(head, body))
+                    else:
+                        response_head, response_body = await self.forward(shard, head.raw + body)
+                        writer.write(response_head.raw + response_body)
+                except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+                    self.logger.error("Shard %s unavailable: %s", shard, e)
+                    writer.write(error_response(502, "shard_unavailable"))
+                await writer.drain()
+                if not head.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _tunnel(self, shard: int, request: bytes, reader, writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection(self.host, self.ports[shard])
+        upstream_writer.write(request)
+
+        async def pipe(source, sink):
+            try:
+                while data := await source.read(65536):
+                    sink.write(data)
+                    await sink.drain()
+            except ConnectionError:
+                pass
+            finally:
+                sink.close()
+
+        await asyncio.gather(pipe(reader, upstream_writer), pipe(upstream_reader, writer))
+
+    async def serve(self, port: int, ready=None):
+        server = await asyncio.start_server(self.handle, self.host, port, limit=MAX_HEAD)
+        self.port = server.sockets[0].getsockname()[1]
+        self.logger.info("Gateway listening on %s:%s with %d shards", self.host, self.port, self.shards)
+        if ready is not None:
+            ready(self.port)
+        async with server:
+            await server.serve_forever()
+
+
+class ShardedGateway:
+    """启动 N 个分片工作进程和前端路由"""
+
+    def __init__(self, shards: Optional[int] = None, host: str = "127.0.0.1", registry_dir: Optional[str] = None):
+        self.shards = shards or int(os.getenv("GATEWAY_SHARDS", "0")) or os.cpu_count() or 1
+        self.host = host
+        self.registry_dir = registry_dir or os.getenv("DEVICE_REGISTRY_DIR")
+        self.processes: List[multiprocessing.Process] = []
+        self.router: Optional[ShardRouter] = None
+
+    def start_shards(self) -> List[int]:
+        """启动工作进程（spawn，各自重新导入 DeviceController），返回各分片端口"""
+        context = multiprocessing.get_context("spawn")
+        ports = []
+        for index in range(self.shards):
+            parent, child = context.Pipe(duplex=False)
+            process = context.Process(target=_run_shard, name=f"gateway-shard-{index}", daemon=True,
+                                      args=(index, self.shards, self.host, child, self.registry_dir))
+            process.start()
+            self.processes.append(process)
+            ports.append(parent.recv())
+        self.router = ShardRouter(ports, self.host)
+        return ports
+
+    def serve(self, port: int = 5000, ready=None):
+        if self.router is None:
+            self.start_shards()
+        try:
+            asyncio.run(self.router.serve(port, ready))
+        finally:
+            self.stop()
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(timeout=5)
+        self.processes.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded device gateway")
+    parser.add_argument("--shards", type=int, default=None, help="分片进程数（默认 GATEWAY_SHARDS 或 CPU 核数）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    if os.getenv("MQTT_EMBEDDED_BROKER") == "1":
+        # 代理放在前端进程，分片进程通过环境变量连接它
+        from Cloud.broker.EmbeddedBroker import EmbeddedBroker
+        broker = EmbeddedBroker("127.0.0.1", int(os.getenv("MQTT_PORT", "1883"))).start_in_thread()
+        os.environ["MQTT_BROKER"] = "127.0.0.1"
+        os.environ["MQTT_PORT"] = str(broker.port)
+    ShardedGateway(args.shards, args.host).serve(args.port)
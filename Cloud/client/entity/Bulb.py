@@ -1,7 +1,12 @@
 import paho.mqtt.client as mqtt
-import json
+from Cloud.client.util.Payload import PayloadNegotiator, decode_message
+from Cloud.client.util import Tracing
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.Tracing import tracer
+from Cloud.client.util.Metrics import COMMAND_SECONDS, MQTT_PUBLISHED, MQTT_RECEIVED
+from Cloud.client.util.CommandSchema import LIGHT, CommandError
+from Cloud.client.controller.ReconnectCoordinator import coordinator
 import time
-import logging
 from typing import Optional, Dict, Any
 
 class SmartBulb:
@@ -9,7 +14,7 @@ class SmartBulb:
     MQTT智能灯泡设备模拟器（使用最新的paho-mqtt API VERSION2）
     """
 
-    def __init__(self, device_id: str, broker: str, port: int = 1883):
+    def __init__(self, device_id: str, broker: str, port: int = 1883, payload_format: str = "json"):
         self.device_id = device_id
         self.broker = broker
         self.port = port
@@ -17,24 +22,39 @@ class SmartBulb:
         self.brightness = 0  # 0-100
         self.color = "white"  # RGB values or color names
 
-        # 设置日志
-        self.logger = logging.getLogger(f"Bulb_{device_id}")
-        self.logger.setLevel(logging.INFO)
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
+        # 回调监听（状态变化后以 current_state 调用，如设备分组的聚合统计）
+        self.state_listeners = []
 
+        # 状态负载格式（json / msgpack / cbor / auto 协商）
+        self.payload = PayloadNegotiator(payload_format)
+
+        # 惰性连接模式下由 LazyConnector 设置：发布状态前调用，挂起中的设备先被唤醒
+        self.activity_hook = None
+
+        # 设置日志（统一日志管道，重复创建同 ID 设备不会叠加处理器）
+        self.logger = get_logger("bulb", device_id)
+
+        self._init_mqtt()
+
+        # 基础主题
+        self.base_topic = f"home/lights/{device_id}"
+
+    def _init_mqtt(self):
+        """初始化MQTT客户端"""
         # 使用新版MQTT API (VERSION2)
         self.client = mqtt.Client(
             mqtt.CallbackAPIVersion.VERSION2,  # 明确使用VERSION2
-            client_id=device_id
+            client_id=self.device_id,
+            protocol=mqtt.MQTTv5,  # Content-Type / User Property 需要 MQTT 5.0
+            reconnect_on_failure=False  # 断线重连交给 ReconnectCoordinator 统一调度
         )
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
+        self.client.on_disconnect = self._on_disconnect
 
-        # 基础主题
-        self.base_topic = f"home/lights/{device_id}"
+    def renew_client(self):
+        """断开后换用新的MQTT客户端（旧客户端被回收时关闭其网络循环的 socketpair）"""
+        self._init_mqtt()
 
     def connect(self) -> bool:
         """连接MQTT代理"""
@@ -49,15 +69,28 @@ class SmartBulb:
 
     def disconnect(self) -> bool:
         """断开MQTT连接"""
+        coordinator.cancel(f"bulb:{self.device_id}")
         try:
-            self.client.loop_stop()
+            # 先发 DISCONNECT 唤醒网络线程，再等它退出（反过来 loop_stop 要等 select 超时）
             self.client.disconnect()
+            self.client.loop_stop()
             self.logger.info("Disconnected from MQTT broker")
             return True
         except Exception as e:
             self.logger.error(f"Disconnection failed: {str(e)}")
             return False
 
+    def _on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
+        """意外断线时登记到全局重连调度"""
+        if reason_code != mqtt.MQTT_ERR_SUCCESS:
+            self.logger.warning(f"Unexpected disconnect: {reason_code}")
+            coordinator.request(f"bulb:{self.device_id}", self._attempt_reconnect, "bulb")
+
+    def _attempt_reconnect(self) -> bool:
+        """单次重连尝试（由 ReconnectCoordinator 按退避和准入控制调度）"""
+        self.client.loop_stop()  # 回收已退出的网络线程
+        return self.connect()
+
     def _on_connect(self, client, userdata, flags, reason_code, properties):
         """MQTT连接回调（新版API签名）"""
         if reason_code.is_failure:
@@ -76,72 +109,101 @@ class SmartBulb:
     def _on_message(self, client, userdata, msg):
         """MQTT消息回调"""
         try:
-            topic_parts = msg.topic.split('/')
-            command = topic_parts[-1]  # 最后一个部分是命令
-
-            payload = {}
-            if msg.payload:
-                payload = json.loads(msg.payload.decode('utf-8'))
-
-            self.logger.debug(f"Received command '{command}' with payload: {payload}")
-
-            # 处理不同命令
-            if command == "set_state":
-                self._handle_set_state(payload)
-            elif command == "set_brightness":
-                self._handle_set_brightness(payload)
-            elif command == "set_color":
-                self._handle_set_color(payload)
-            elif command == "get_state":
-                self._publish_state()
-            else:
-                self.logger.warning(f"Unknown command: {command}")
+            command = msg.topic.rpartition('/')[2]  # 最后一级是命令
+            entry = self._DISPATCH.get(command)
+
+            MQTT_RECEIVED.inc("bulb", "lights/control")
+            self.payload.observe(msg)
+            payload = decode_message(msg)
+
+            self.logger.debug("Received command '%s' with payload: %s", command, payload)
+
+            # 沿用命令中的 trace ID，状态消息会把它带回控制端
+            # 未知命令在指标中统一记为 unknown，避免标签无限增长
+            with Tracing.activate(Tracing.from_message(msg)), tracer.span(f"bulb.{command}", device_id=self.device_id), \
+                    COMMAND_SECONDS.time("bulb", command if entry else "unknown"):
+                if entry is None:
+                    self.logger.warning("Unknown command: %s", command)
+                    return
+                validate, handler = entry
+                try:
+                    args = validate(payload)
+                except CommandError as e:
+                    self.logger.warning("Invalid command: %s", e)
+                    return
+                handler(self, **args)
 
         except Exception as e:
-            self.logger.error(f"Error processing message: {str(e)}")
+            self.logger.error("Error processing message: %s", e)
 
-    def _handle_set_state(self, payload: Dict[str, Any]):
+    # 命令处理函数接收的参数已按 CommandSchema.LIGHT 校验和规范化
+    def _handle_set_state(self, state: str):
         """处理设置状态命令"""
-        new_state = payload.get("state", "").lower()
-        if new_state in ["on", "off"]:
-            self.state = new_state
-            self.brightness = 100 if new_state == "on" else 0
-            self.logger.info(f"Bulb state changed to {new_state}")
-            self._publish_state()
-        else:
-            self.logger.warning(f"Invalid state value: {new_state}")
+        self.state = state
+        self.brightness = 100 if state == "on" else 0
+        self.logger.info("Bulb state changed to %s", state)
+        self._publish_state()
+        self._notify_listeners()
 
-    def _handle_set_brightness(self, payload: Dict[str, Any]):
+    def _handle_set_brightness(self, brightness: int):
         """处理设置亮度命令"""
         if self.state != "on":
             self.logger.warning("Cannot set brightness when bulb is off")
             return
+        self.brightness = brightness
+        self.logger.info("Brightness set to %d%%", brightness)
+        self._publish_state()
+        self._notify_listeners()
 
-        brightness = payload.get("brightness", 0)
-        try:
-            brightness = int(brightness)
-            if 0 <= brightness <= 100:
-                self.brightness = brightness
-                self.logger.info(f"Brightness set to {brightness}%")
-                self._publish_state()
-            else:
-                self.logger.warning(f"Brightness out of range: {brightness}")
-        except ValueError:
-            self.logger.warning(f"Invalid brightness value: {brightness}")
-
-    def _handle_set_color(self, payload: Dict[str, Any]):
+    def _handle_set_color(self, color: str):
         """处理设置颜色命令"""
         if self.state != "on":
             self.logger.warning("Cannot set color when bulb is off")
             return
-
-        color = payload.get("color", "white")
         self.color = color
-        self.logger.info(f"Color changed to {color}")
+        self.logger.info("Color changed to %s", color)
         self._publish_state()
+        self._notify_listeners()
+
+    def update_state(self, state: Optional[str] = None, brightness: Optional[int] = None,
+                     color: Optional[str] = None):
+        """
+        直接更新灯泡状态（供 DeviceController 调用），多个字段只发布一次状态
+        参数须已经过 LIGHT.validate("update", ...) 校验
+        """
+        with tracer.span("bulb.update_state", device_id=self.device_id), COMMAND_SECONDS.time("bulb", "update_state"):
+            self._update_state(state, brightness, color)
+
+    def _update_state(self, state: Optional[str] = None, brightness: Optional[int] = None,
+                      color: Optional[str] = None):
+        if state is not None:
+            self.state = state
+            self.brightness = 100 if state == "on" else 0
+
+        if self.state != "on" and (brightness is not None or color is not None):
+            self.logger.warning("Cannot set brightness or color when bulb is off")
+        else:
+            if brightness is not None:
+                self.brightness = brightness
+            if color is not None:
+                self.color = color
+
+        self._publish_state()
+        self._notify_listeners()
+
+    def _notify_listeners(self):
+        """通知状态监听器"""
+        state = self.current_state
+        for listener in self.state_listeners:
+            try:
+                listener(state)
+            except Exception as e:
+                self.logger.error(f"State listener error: {str(e)}")
 
     def _publish_state(self):
         """发布当前状态"""
+        if self.activity_hook is not None:
+            self.activity_hook(self)
         state = {
             "state": self.state,
             "brightness": self.brightness,
@@ -150,8 +212,22 @@ class SmartBulb:
         }
 
         topic = f"{self.base_topic}/state"
-        self.client.publish(topic, json.dumps(state), qos=1, retain=True)
-        self.logger.debug(f"Published state to {topic}: {state}")
+        trace_id = Tracing.current()
+        data, properties = self.payload.encode(state, trace_id)
+        with tracer.span("mqtt.publish_state", trace_id):
+            self.client.publish(topic, data, qos=1, retain=True, properties=properties)
+        MQTT_PUBLISHED.inc("bulb", "lights/state")
+        self.logger.debug("Published state to %s: %s", topic, state)
+
+    @property
+    def current_state(self) -> Dict[str, Any]:
+        """获取当前状态快照"""
+        return {
+            "device_id": self.device_id,
+            "state": self.state,
+            "brightness": self.brightness,
+            "color": self.color
+        }
 
     def run(self):
         """运行设备"""
@@ -162,6 +238,16 @@ class SmartBulb:
         except KeyboardInterrupt:
             self.disconnect()
 
+    # MQTT 命令分发表：命令名 -> (校验函数, 处理函数)
+    _DISPATCH = LIGHT.bind({
+        "set_state": _handle_set_state,
+        "set_brightness": _handle_set_brightness,
+        "set_color": _handle_set_color,
+        "get_state": _publish_state,
+        # 多个字段一条命令、只发布一次状态（场景下发）
+        "update": _update_state
+    })
+
 
 if __name__ == "__main__":
     # 示例用法
@@ -1,7 +1,12 @@
 import paho.mqtt.client as mqtt
-import json
+from Cloud.client.util.Payload import PayloadNegotiator, decode_message
+from Cloud.client.util import Tracing
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.Tracing import tracer
+from Cloud.client.util.Metrics import COMMAND_SECONDS, MQTT_PUBLISHED, MQTT_RECEIVED
+from Cloud.client.util.CommandSchema import LOCK, CommandError
+from Cloud.client.controller.ReconnectCoordinator import coordinator
 import time
-import logging
 from threading import Lock
 from typing import Dict, Any, Optional
 
@@ -10,7 +15,7 @@ class SmartLock:
     智能门锁设备
     """
 
-    def __init__(self, device_id: str, broker: str, port: int = 1883):
+    def __init__(self, device_id: str, broker: str, port: int = 1883, payload_format: str = "json"):
         self.device_id = device_id
         self.broker = broker
         self.port = port
@@ -27,24 +32,27 @@ class SmartLock:
         # 回调监听
         self.state_listeners = []
 
+        # 状态负载格式（json / msgpack / cbor / auto 协商）
+        self.payload = PayloadNegotiator(payload_format)
+
+        # 惰性连接模式下由 LazyConnector 设置：发布状态前调用，挂起中的设备先被唤醒
+        self.activity_hook = None
+
         # 初始化
         self._setup_logger()
         self._init_mqtt()
 
     def _setup_logger(self):
-        """配置日志系统"""
-        self.logger = logging.getLogger(f"Lock_{self.device_id}")
-        self.logger.setLevel(logging.INFO)
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
+        """配置日志系统（统一日志管道）"""
+        self.logger = get_logger("lock", self.device_id)
 
     def _init_mqtt(self):
         """初始化MQTT客户端"""
         self.client = mqtt.Client(
             mqtt.CallbackAPIVersion.VERSION2,
-            client_id=f"lock_{self.device_id}_{int(time.time())}"
+            client_id=f"lock_{self.device_id}_{int(time.time())}",
+            protocol=mqtt.MQTTv5,  # Content-Type / User Property 需要 MQTT 5.0
+            reconnect_on_failure=False  # 断线重连交给 ReconnectCoordinator 统一调度
         )
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
@@ -53,25 +61,20 @@ class SmartLock:
         # 主题设置
         self.base_topic = f"home/locks/{self.device_id}"
 
+    def renew_client(self):
+        """断开后换用新的MQTT客户端（旧客户端被回收时关闭其网络循环的 socketpair）"""
+        self._init_mqtt()
+
     def _on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
         """MQTT断开连接回调"""
         if reason_code != mqtt.MQTT_ERR_SUCCESS:
             self.logger.warning(f"意外断开连接，代码: {reason_code}")
-            self._attempt_reconnect()
+            coordinator.request(f"lock:{self.device_id}", self._attempt_reconnect, "lock")
 
-    def _attempt_reconnect(self):
-        """自动重连机制"""
-        retry_count = 0
-        while retry_count < 3:
-            try:
-                self.logger.info(f"尝试重连({retry_count + 1}/3)...")
-                if self.connect():
-                    return True
-            except Exception as e:
-                self.logger.error(f"重连失败: {str(e)}")
-            retry_count += 1
-            time.sleep(2)
-        return False
+    def _attempt_reconnect(self) -> bool:
+        """单次重连尝试（由 ReconnectCoordinator 按退避和准入控制调度）"""
+        self.client.loop_stop()  # 回收已退出的网络线程
+        return self.connect()
 
     # ---------- 状态管理 ----------
     @property
@@ -82,10 +85,21 @@ class SmartLock:
 
     def set_lock(self, locked: bool):
         """设置门锁状态"""
-        with self._state_lock:
-            self._locked = locked
-            self._last_updated = time.time()
-        self._publish_state()
+        with tracer.span("lock.set_lock", device_id=self.device_id), COMMAND_SECONDS.time("lock", "lock"):
+            with self._state_lock:
+                self._locked = locked
+                self._last_updated = time.time()
+            self._publish_state()
+        self._notify_listeners()
+
+    def _notify_listeners(self):
+        """通知状态监听器"""
+        state = self.current_state
+        for listener in self.state_listeners:
+            try:
+                listener(state)
+            except Exception as e:
+                self.logger.error(f"State listener error: {str(e)}")
 
 
 
@@ -103,10 +117,11 @@ class SmartLock:
 
     def disconnect(self):
         """安全断开 MQTT 连接"""
+        coordinator.cancel(f"lock:{self.device_id}")
         if  self.client.is_connected():
             self.client.disconnect()
             self.client.loop_stop()  # 停止网络循环
-            print("MQTT 连接已断开")
+            self.logger.info("MQTT 连接已断开")
 
     def _on_connect(self, client, userdata, flags, reason_code, properties):
         """连接回调"""
@@ -116,34 +131,53 @@ class SmartLock:
 
         self.logger.info("MQTT connection established")
         self.client.subscribe([
-            (f"{self.base_topic}/control/lock", 1)
+            (f"{self.base_topic}/control/+", 1)
         ])
         self._publish_state()
 
     def _on_message(self, client, userdata, msg):
         """处理MQTT消息"""
         try:
-            payload = json.loads(msg.payload.decode()) if msg.payload else {}
-            command = msg.topic.split('/')[-1]
-
-            if command == "lock":
-                self.set_lock(payload.get("locked", True))
+            MQTT_RECEIVED.inc("lock", "locks/control")
+            self.payload.observe(msg)
+            payload = decode_message(msg)
+            command = msg.topic.rpartition('/')[2]
+
+            entry = self._DISPATCH.get(command)
+            if entry is None:
+                self.logger.warning("Unknown command: %s", command)
+                return
+            validate, handler = entry
+            try:
+                args = validate(payload)
+            except CommandError as e:
+                self.logger.warning("Invalid command: %s", e)
+                return
+            with Tracing.activate(Tracing.from_message(msg)):
+                handler(self, **args)
 
         except Exception as e:
-            self.logger.error(f"Message processing error: {str(e)}")
+            self.logger.error("Message processing error: %s", e)
 
     def _publish_state(self):
         """发布当前状态"""
+        if self.activity_hook is not None:
+            self.activity_hook(self)
         state = {
             "locked": self.locked,
             "timestamp": self._last_updated
         }
-        self.client.publish(
-            f"{self.base_topic}/state",
-            payload=json.dumps(state),
-            qos=1,
-            retain=True
-        )
+        trace_id = Tracing.current()
+        data, properties = self.payload.encode(state, trace_id)
+        with tracer.span("mqtt.publish_state", trace_id):
+            self.client.publish(
+                f"{self.base_topic}/state",
+                payload=data,
+                qos=1,
+                retain=True,
+                properties=properties
+            )
+        MQTT_PUBLISHED.inc("lock", "locks/state")
 
     @property
     def current_state(self) -> Dict[str, Any]:
@@ -163,3 +197,6 @@ class SmartLock:
                 time.sleep(1)
         except KeyboardInterrupt:
             self.client.disconnect()
+
+    # MQTT 命令分发表：命令名 -> (校验函数, 处理函数)
+    _DISPATCH = LOCK.bind({"lock": set_lock, "update": set_lock})
@@ -1,16 +1,21 @@
 import paho.mqtt.client as mqtt
-import json
+from Cloud.client.util.Payload import PayloadNegotiator, decode_message
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.Metrics import COMMAND_SECONDS, MQTT_PUBLISHED, MQTT_RECEIVED
+from Cloud.client.util.CommandSchema import SENSOR, CommandError
+from Cloud.client.controller.ReconnectCoordinator import coordinator
 import time
-import logging
 from threading import Lock
 from typing import Dict, Any, Optional
+from Cloud.client.entity.SensorHistory import SensorHistory
 
 class EnvironmentSensor:
     """
     环境传感器设备（温湿度+光照）
     """
 
-    def __init__(self, device_id: str, broker: str, port: int = 1883):
+    def __init__(self, device_id: str, broker: str, port: int = 1883, history_capacity: int = 3600,
+                 payload_format: str = "json"):
         self.device_id = device_id
         self.broker = broker
         self.port = port
@@ -21,6 +26,9 @@ class EnvironmentSensor:
         self._light = 500
         self._last_updated = time.time()
 
+        # 历史读数（定长环形缓冲 + 分钟/小时聚合）
+        self.history = SensorHistory(raw_capacity=history_capacity)
+
         # 同步控制
         self._state_lock = Lock()
         self._pending_commands = {}
@@ -29,24 +37,27 @@ class EnvironmentSensor:
         # 回调监听
         self.state_listeners = []
 
+        # 状态负载格式（json / msgpack / cbor / auto 协商）
+        self.payload = PayloadNegotiator(payload_format)
+
+        # 惰性连接模式下由 LazyConnector 设置：发布状态前调用，挂起中的设备先被唤醒
+        self.activity_hook = None
+
         # 初始化
         self._setup_logger()
         self._init_mqtt()
 
     def _setup_logger(self):
-        """配置日志系统"""
-        self.logger = logging.getLogger(f"Sensor_{self.device_id}")
-        self.logger.setLevel(logging.INFO)
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
+        """配置日志系统（统一日志管道）"""
+        self.logger = get_logger("sensor", self.device_id)
 
     def _init_mqtt(self):
         """初始化MQTT客户端"""
         self.client = mqtt.Client(
             mqtt.CallbackAPIVersion.VERSION2,
-            client_id=f"sensor_{self.device_id}_{int(time.time())}"
+            client_id=f"sensor_{self.device_id}_{int(time.time())}",
+            protocol=mqtt.MQTTv5,  # Content-Type / User Property 需要 MQTT 5.0
+            reconnect_on_failure=False  # 断线重连交给 ReconnectCoordinator 统一调度
         )
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
@@ -55,25 +66,20 @@ class EnvironmentSensor:
         # 主题设置
         self.base_topic = f"home/sensors/{self.device_id}"
 
+    def renew_client(self):
+        """断开后换用新的MQTT客户端（旧客户端被回收时关闭其网络循环的 socketpair）"""
+        self._init_mqtt()
+
     def _on_disconnect(self, client, userdata, disconnect_flags, reason_code, properties):
         """MQTT断开连接回调"""
         if reason_code != mqtt.MQTT_ERR_SUCCESS:
             self.logger.warning(f"意外断开连接，代码: {reason_code}")
-            self._attempt_reconnect()
+            coordinator.request(f"sensor:{self.device_id}", self._attempt_reconnect, "sensor")
 
-    def _attempt_reconnect(self):
-        """自动重连机制"""
-        retry_count = 0
-        while retry_count < 3:
-            try:
-                self.logger.info(f"尝试重连({retry_count + 1}/3)...")
-                if self.connect():
-                    return True
-            except Exception as e:
-                self.logger.error(f"重连失败: {str(e)}")
-            retry_count += 1
-            time.sleep(2)
-        return False
+    def _attempt_reconnect(self) -> bool:
+        """单次重连尝试（由 ReconnectCoordinator 按退避和准入控制调度）"""
+        self.client.loop_stop()  # 回收已退出的网络线程
+        return self.connect()
 
     # ---------- 状态管理 ----------
     @property
@@ -98,7 +104,18 @@ class EnvironmentSensor:
             self._humidity = humidity
             self._light = light
             self._last_updated = time.time()
+            self.history.append(self._last_updated, temperature, humidity, light)
         self._publish_state()
+        self._notify_listeners()
+
+    def _notify_listeners(self):
+        """通知读数监听器"""
+        state = self.current_state
+        for listener in self.state_listeners:
+            try:
+                listener(state)
+            except Exception as e:
+                self.logger.error(f"State listener error: {str(e)}")
 
     # ---------- MQTT通信 ----------
     def connect(self) -> bool:
@@ -114,10 +131,11 @@ class EnvironmentSensor:
 
     def disconnect(self):
         """安全断开 MQTT 连接"""
+        coordinator.cancel(f"sensor:{self.device_id}")
         if  self.client.is_connected():
             self.client.disconnect()
             self.client.loop_stop()  # 停止网络循环
-            print("MQTT 连接已断开")
+            self.logger.info("MQTT 连接已断开")
 
     def _on_connect(self, client, userdata, flags, reason_code, properties):
         """连接回调"""
@@ -135,41 +153,54 @@ class EnvironmentSensor:
     def _on_message(self, client, userdata, msg):
         """处理MQTT消息"""
         try:
-            payload = json.loads(msg.payload.decode()) if msg.payload else {}
-            command = msg.topic.split('/')[-1]
-
-            if command == "update_interval":
-                self._handle_update_interval(payload)
-            elif command == "calibrate":
-                self._handle_calibration(payload)
+            MQTT_RECEIVED.inc("sensor", "sensors/control")
+            self.payload.observe(msg)
+            payload = decode_message(msg)
+            command = msg.topic.rpartition('/')[2]
+            entry = self._DISPATCH.get(command)
+
+            with COMMAND_SECONDS.time("sensor", command if entry else "unknown"):
+                if entry is None:
+                    self.logger.warning("Unknown command: %s", command)
+                    return
+                validate, handler = entry
+                try:
+                    args = validate(payload)
+                except CommandError as e:
+                    self.logger.warning("Invalid command: %s", e)
+                    return
+                handler(self, **args)
 
         except Exception as e:
-            self.logger.error(f"Message processing error: {str(e)}")
+            self.logger.error("Message processing error: %s", e)
 
-    def _handle_update_interval(self, payload: Dict[str, Any]):
+    def _handle_update_interval(self, interval: int):
         """处理更新间隔设置"""
-        interval = payload.get("interval", 10)
-        self.logger.info(f"Update interval set to {interval} seconds")
+        self.logger.info("Update interval set to %s seconds", interval)
 
-    def _handle_calibration(self, payload: Dict[str, Any]):
+    def _handle_calibration(self, offset: Dict[str, float]):
         """处理校准命令"""
-        offset = payload.get("offset", {})
-        self.logger.info(f"Applying calibration offsets: {offset}")
+        self.logger.info("Applying calibration offsets: %s", offset)
 
     def _publish_state(self):
         """发布当前状态"""
+        if self.activity_hook is not None:
+            self.activity_hook(self)
         state = {
             "temperature": self.temperature,
             "humidity": self.humidity,
             "light": self.light,
             "timestamp": self._last_updated
         }
+        data, properties = self.payload.encode(state)
         self.client.publish(
             f"{self.base_topic}/state",
-            payload=json.dumps(state),
+            payload=data,
             qos=1,
-            retain=True
+            retain=True,
+            properties=properties
         )
+        MQTT_PUBLISHED.inc("sensor", "sensors/state")
 
     @property
     def current_state(self) -> Dict[str, Any]:
@@ -192,3 +223,9 @@ class EnvironmentSensor:
         except KeyboardInterrupt:
             self.client.disconnect()
 
+    # MQTT 命令分发表：命令名 -> (校验函数, 处理函数)
+    _DISPATCH = SENSOR.bind({
+        "update_interval": _handle_update_interval,
+        "calibrate": _handle_calibration
+    })
+
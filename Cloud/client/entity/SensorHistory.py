@@ -0,0 +1,174 @@
+import time
+from array import array
+from threading import Lock
+from typing import Dict, List, Optional, Sequence
+
+# 传感器记录的指标（与 EnvironmentSensor 的读数一一对应）
+METRICS = ("temperature", "humidity", "light")
+
+# 聚合分辨率：名称 -> 桶宽（秒）
+RESOLUTIONS = {"1m": 60, "1h": 3600}
+
+
+class _RollupRing:
+    """
+    固定容量的聚合桶环：每个桶保存各指标的 min/max/sum/count
+    插入时增量更新当前桶，旧桶按槽位自然覆盖
+    """
+
+    def __init__(self, width: int, capacity: int):
+        self.width = width
+        self.capacity = capacity
+        self.bucket_start = array('d', [-1.0]) * capacity
+        self.count = array('L', [0]) * capacity
+        self.mins = [array('f', [0.0]) * capacity for _ in METRICS]
+        self.maxs = [array('f', [0.0]) * capacity for _ in METRICS]
+        self.sums = [array('d', [0.0]) * capacity for _ in METRICS]
+
+    def add(self, timestamp: float, values: Sequence[float]):
+        bucket = int(timestamp // self.width)
+        slot = bucket % self.capacity
+        start = float(bucket * self.width)
+        if self.bucket_start[slot] != start:
+            # 新的时间桶，覆盖该槽位上的旧数据
+            self.bucket_start[slot] = start
+            self.count[slot] = 0
+            for m, value in enumerate(values):
+                self.mins[m][slot] = value
+                self.maxs[m][slot] = value
+                self.sums[m][slot] = 0.0
+
+        self.count[slot] += 1
+        for m, value in enumerate(values):
+            if value < self.mins[m][slot]:
+                self.mins[m][slot] = value
+            if value > self.maxs[m][slot]:
+                self.maxs[m][slot] = value
+            self.sums[m][slot] += value
+
+    def buckets(self, metric: int, start: float, end: float) -> List[Dict]:
+        """返回 [start, end] 范围内的非空桶（只访问窗口覆盖的槽位）"""
+        first = int(start // self.width)
+        last = int(end // self.width)
+        # 窗口超过环容量时只有最近 capacity 个桶仍然有效
+        first = max(first, last - self.capacity + 1)
+        result = []
+        for bucket in range(first, last + 1):
+            slot = bucket % self.capacity
+            if self.bucket_start[slot] != bucket * self.width or not self.count[slot]:
+                continue
+            count = self.count[slot]
+            result.append({
+                "t": self.bucket_start[slot],
+                "min": self.mins[metric][slot],
+                "max": self.maxs[metric][slot],
+                "avg": self.sums[metric][slot] / count,
+                "count": count
+            })
+        return result
+
+
+class SensorHistory:
+    """
+    传感器读数的定长时序环形缓冲区
+    原始样本以 float32 列存储，同时增量维护 1 分钟 / 1 小时 的 min/max/avg 聚合
+    缓冲区在第一条读数写入时才分配（每个传感器约 200KB），大量空闲传感器不占内存
+    """
+
+    def __init__(self, raw_capacity: int = 3600, minute_capacity: int = 1440, hour_capacity: int = 720):
+        self._lock = Lock()
+        self._capacity = raw_capacity
+        self._rollup_capacity = {"1m": minute_capacity, "1h": hour_capacity}
+        self._head = 0
+        self._size = 0
+        self._timestamps = None
+        self._columns = None
+        self._rollups = {}
+
+    def _allocate(self):
+        self._timestamps = array('d', [0.0]) * self._capacity
+        self._columns = [array('f', [0.0]) * self._capacity for _ in METRICS]
+        self._rollups = {name: _RollupRing(RESOLUTIONS[name], capacity)
+                         for name, capacity in self._rollup_capacity.items()}
+
+    def append(self, timestamp: float, temperature: float, humidity: float, light: float):
+        """写入一条读数，并增量更新各级聚合"""
+        values = (float(temperature), float(humidity), float(light))
+        with self._lock:
+            if self._timestamps is None:
+                self._allocate()
+            slot = self._head
+            self._timestamps[slot] = timestamp
+            for column, value in zip(self._columns, values):
+                column[slot] = value
+            self._head = (slot + 1) % self._capacity
+            self._size = min(self._size + 1, self._capacity)
+
+            for rollup in self._rollups.values():
+                rollup.add(timestamp, values)
+
+    def __len__(self):
+        return self._size
+
+    def _raw_buckets(self, metric: int, start: float, end: float) -> List[Dict]:
+        # 从最新样本向前遍历，遇到早于窗口的样本即停止
+        result = []
+        for i in range(self._size):
+            slot = (self._head - 1 - i) % self._capacity
+            timestamp = self._timestamps[slot]
+            if timestamp < start:
+                break
+            if timestamp <= end:
+                value = self._columns[metric][slot]
+                result.append({"t": timestamp, "min": value, "max": value, "avg": value, "count": 1})
+        result.reverse()
+        return result
+
+    @staticmethod
+    def _pick_resolution(start: float, end: float) -> str:
+        span = end - start
+        if span <= 300:
+            return "raw"
+        if span <= 6 * 3600:
+            return "1m"
+        return "1h"
+
+    def query(self, metric: str, start: Optional[float] = None, end: Optional[float] = None,
+              resolution: str = "auto") -> Dict:
+        """
+        查询时间窗口内的聚合结果
+        :param metric: temperature / humidity / light
+        :param start: 起始时间戳（默认 end 前 1 小时）
+        :param end: 结束时间戳（默认当前时间）
+        :param resolution: raw / 1m / 1h / auto（按窗口长度自动选择）
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        if resolution == "auto":
+            resolution = self._pick_resolution(start, end)
+        if resolution != "raw" and resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+
+        index = METRICS.index(metric)
+        with self._lock:
+            if self._timestamps is None:
+                buckets = []
+            elif resolution == "raw":
+                buckets = self._raw_buckets(index, start, end)
+            else:
+                buckets = self._rollups[resolution].buckets(index, start, end)
+
+        count = sum(b["count"] for b in buckets)
+        return {
+            "metric": metric,
+            "resolution": resolution,
+            "start": start,
+            "end": end,
+            "count": count,
+            "min": min((b["min"] for b in buckets), default=None),
+            "max": max((b["max"] for b in buckets), default=None),
+            "avg": sum(b["avg"] * b["count"] for b in buckets) / count if count else None,
+            "buckets": buckets
+        }
@@ -0,0 +1,338 @@
+"""
+不依赖框架的 ASGI 应用骨架和内置服务器
+
+App 按路由模板（如 /api/devices/<device_id>/control）分发到 async 处理函数，
+每个请求自动建立 trace（X-Trace-Id）并记录 http_request_duration_seconds，默认提供 GET /metrics
+run() 在安装了 uvicorn 时用 uvicorn 运行，否则用本模块基于 asyncio 的 HTTP/1.1 服务器（支持长连接和 lifespan）
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote
+
+from Cloud.client.util import Codec, Metrics, Tracing
+from Cloud.client.util.Http import MAX_HEAD, REASONS, dechunk, read_body, read_head
+from Cloud.client.util.Logs import get_logger
+from Cloud.client.util.Tracing import tracer
+
+# 长连接空闲多久后由服务器关闭（秒），避免大量闲置客户端长期占用连接
+KEEP_ALIVE_TIMEOUT = float(os.getenv("HTTP_KEEP_ALIVE_TIMEOUT", "75"))
+
+_PARAM = re.compile(r"<([a-zA-Z_][a-zA-Z0-9_]*)>")
+
+
+class Request:
+    __slots__ = ("scope", "method", "path", "query", "headers", "body", "params")
+
+    def __init__(self, scope, body: bytes, params: Dict[str, str]):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        self.headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        self.body = body
+        self.params = params
+
+    def json(self) -> Any:
+        """请求体 JSON；为空或无法解析时返回 None（与 Flask 的 get_json(silent=True) 一致）"""
+        if not self.body:
+            return None
+        try:
+            return Codec.loads(self.body)
+        except ValueError:
+            return None
+
+    def arg(self, name: str, default=None, type: Optional[Callable] = None):
+        value = self.query.get(name)
+        if value is None:
+            return default
+        if type is None:
+            return value
+        try:
+            return type(value)
+        except (TypeError, ValueError):
+            return default
+
+
+class Response:
+    __slots__ = ("status", "body", "content_type", "headers")
+
+    def __init__(self, body: bytes = b"", status: int = 200, content_type: Optional[str] = "application/json",
+                 headers: Optional[List[Tuple[str, str]]] = None):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or []
+
+
+def json_response(obj: Any, status: int = 200) -> Response:
+    return Response(Codec.dumps(obj), status)
+
+
+async def run_blocking(fn: Callable, *args, **kwargs):
+    """在线程池中执行阻塞调用（如建立 MQTT 连接），沿用当前 trace 等上下文变量"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(context.run, fn, *args, **kwargs))
+
+
+class App:
+    """ASGI 应用：路由表 + lifespan 钩子"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.logger = get_logger("asgi", name)
+        self._exact: Dict[str, Dict[str, Tuple[str, Callable]]] = {}
+        self._patterns: List[Tuple[re.Pattern, str, Dict[str, Callable]]] = []
+        self._startup: List[Callable[[], Awaitable]] = []
+        self._shutdown: List[Callable[[], Awaitable]] = []
+        self.route("/metrics")(self._metrics)
+
+    # ---------- 注册 ----------
+    def route(self, template: str, methods=("GET",)):
+        def decorator(handler: Callable[..., Awaitable[Response]]):
+            if "<" not in template:
+                table = self._exact.setdefault(template, {})
+                for method in methods:
+                    table[method] = (template, handler)
+                return handler
+            regex = re.compile("^" + _PARAM.sub(r"(?P<\1>[^/]+)", template) + "$")
+            for pattern, existing, table in self._patterns:
+                if existing == template:
+                    break
+            else:
+                table = {}
+                self._patterns.append((regex, template, table))
+            for method in methods:
+                table[method] = handler
+            return handler
+        return decorator
+
+    def on_startup(self, fn):
+        self._startup.append(fn)
+        return fn
+
+    def on_shutdown(self, fn):
+        self._shutdown.append(fn)
+        return fn
+
+    def match(self, method: str, path: str):
+        """返回 (路由模板, 处理函数, 路径参数)；路径存在但方法不符时处理函数为 None"""
+        table = self._exact.get(path)
+        if table is not None:
+            entry = table.get(method)
+            return (entry[0], entry[1], {}) if entry else (path, None, {})
+        for regex, template, handlers in self._patterns:
+            found = regex.match(path)
+            if found:
+                params = {name: unquote(value) for name, value in found.groupdict().items()}
+                return template, handlers.get(method), params
+        return None, None, {}
+
+    async def _metrics(self, request: Request) -> Response:
+        return Response(Metrics.render().encode("utf-8"), content_type=Metrics.CONTENT_TYPE)
+
+    # ---------- ASGI ----------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        started, begin = time.time(), time.perf_counter()
+        method = scope["method"]
+        template, handler, params = self.match(method, scope["path"])
+        trace_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-trace-id":
+                trace_id = value.decode("latin-1")
+        trace_id = trace_id or tracer.start_trace()
+
+        with Tracing.activate(trace_id):
+            if template is None:
+                response = json_response({"error": "not_found"}, 404)
+            elif handler is None:
+                response = json_response({"error": "method_not_allowed"}, 405)
+            else:
+                try:
+                    response = await handler(Request(scope, bytes(body), params), **params)
+                except Exception as e:
+                    self.logger.error("Unhandled error in %s %s: %s", method, template, e, exc_info=True)
+                    response = json_response({"error": "internal_error", "message": str(e)}, 500)
+
+        elapsed = time.perf_counter() - begin
+        Metrics.HTTP_REQUEST_SECONDS.observe(elapsed, self.name, method, template or "unmatched", response.status)
+        headers = [(b"content-length", str(len(response.body)).encode())]
+        if response.content_type:
+            headers.append((b"content-type", response.content_type.encode("latin-1")))
+        if trace_id is not None:
+            tracer.record(trace_id, f"http {method} {template or scope['path']}", started, elapsed,
+                          status=response.status)
+            headers.append((Tracing.HTTP_HEADER.encode(), trace_id.encode()))
+        headers.extend((name.encode("latin-1"), value.encode("latin-1")) for name, value in response.headers)
+        await send({"type": "http.response.start", "status": response.status, "headers": headers})
+        await send({"type": "http.response.body", "body": response.body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    for fn in self._startup:
+                        await fn()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for fn in self._shutdown:
+                    await fn()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+# ---------- 内置服务器 ----------
+class Server:
+    """
+    运行任意 ASGI 应用的最小 HTTP/1.1 服务器（单事件循环、长连接、不支持 WebSocket）
+    响应体在 http.response.body 全部到齐后一次写出
+    """
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 8000, keep_alive_timeout: float = KEEP_ALIVE_TIMEOUT):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.keep_alive_timeout = keep_alive_timeout
+        self.logger = get_logger("asgi")
+        self._lifespan: Optional[asyncio.Task] = None
+        self._lifespan_queue: Optional[asyncio.Queue] = None
+        self._lifespan_sent: Optional[asyncio.Queue] = None
+        self._lifespan_supported = True
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        await self._lifespan_event("startup")
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEAD)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info("ASGI server listening on %s:%s", self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self._lifespan_event("shutdown")
+
+    async def serve_forever(self, ready: Optional[Callable[[int], None]] = None):
+        await self.start()
+        if ready is not None:
+            ready(self.port)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _lifespan_event(self, event: str):
+        """按 ASGI lifespan 协议通知应用启动 / 关闭；应用不支持 lifespan 时忽略"""
+        if not self._lifespan_supported:
+            return
+        if self._lifespan is None:
+            if event != "startup":
+                return
+            self._lifespan_queue = asyncio.Queue()
+            self._lifespan_sent = asyncio.Queue()
+
+            async def run():
+                try:
+                    await self.app({"type": "lifespan", "asgi": {"version": "3.0"}},
+                                   self._lifespan_queue.get, self._lifespan_sent.put)
+                except Exception:
+                    pass
+                # 应用退出（或不处理 lifespan）后不再等待它的回复
+                await self._lifespan_sent.put({"type": "lifespan.unsupported"})
+            self._lifespan = asyncio.create_task(run())
+        await self._lifespan_queue.put({"type": f"lifespan.{event}"})
+        reply = await self._lifespan_sent.get()
+        if reply["type"] == "lifespan.unsupported":
+            self._lifespan_supported = False
+        elif reply["type"].endswith(".failed"):
+            raise RuntimeError(f"ASGI {event} failed: {reply.get('message', '')}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                head = await asyncio.wait_for(read_head(reader), self.keep_alive_timeout)
+                if head is None or len(head.start) < 3:
+                    break
+                body, _ = await read_body(reader, head, response=False)
+                if "chunked" in head.headers.get("transfer-encoding", "").lower():
+                    body = dechunk(body)
+                writer.write(await self._call(head, body, peer))
+                await writer.drain()
+                if not head.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    async def _call(self, head, body: bytes, peer) -> bytes:
+        method, target, version = head.start
+        path, _, query = target.partition("?")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": version.partition("/")[2] or "1.1",
+            "method": method, "scheme": "http", "path": unquote(path), "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"), "root_path": "",
+            "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in head.headers.items()],
+            "client": peer, "server": (self.host, self.port)
+        }
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {"type": "http.disconnect"}
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        status, headers, chunks = 500, [], []
+
+        async def send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status, headers = message["status"], message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        payload = b"".join(chunks)
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}".encode("latin-1")]
+        for name, value in headers:
+            if name.lower() != b"content-length":
+                lines.append(name + b": " + value)
+        lines.append(b"content-length: " + str(len(payload)).encode())
+        return b"\r\n".join(lines) + b"\r\n\r\n" + payload
+
+
+def run(app, host: str = "127.0.0.1", port: int = 8000):
+    """运行 ASGI 应用：优先 uvicorn（可选依赖），否则用内置服务器"""
+    try:
+        import uvicorn
+    except ImportError:
+        uvicorn = None
+    if uvicorn is not None:
+        uvicorn.run(app, host=host, port=port, log_level="warning", timeout_keep_alive=int(KEEP_ALIVE_TIMEOUT))
+    else:
+        asyncio.run(Server(app, host, port).serve_forever())
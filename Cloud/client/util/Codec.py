@@ -0,0 +1,85 @@
+import dataclasses
+import json
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """标准库 json / orjson 都无法直接处理的类型"""
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, dt_time)):
+        return obj.isoformat()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# 标准库编码器只创建一次，紧凑输出、保留中文
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+_decoder = json.JSONDecoder()
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        """编码为 UTF-8 JSON 字节串"""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """解码 JSON（bytes 或 str）"""
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any) -> bytes:
+        """编码为 UTF-8 JSON 字节串"""
+        return _encoder.encode(obj).encode('utf-8')
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """解码 JSON（bytes 或 str）"""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode('utf-8')
+        return _decoder.decode(data)
+
+
+def dumps_str(obj: Any) -> str:
+    """编码为 JSON 字符串"""
+    return dumps(obj).decode('utf-8')
+
+
+def install_flask(app):
+    """让 Flask 的 jsonify / request.json 统一使用本编解码器"""
+    from flask.json.provider import JSONProvider
+
+    class CodecJSONProvider(JSONProvider):
+        mimetype = "application/json"
+
+        def dumps(self, obj, **kwargs):
+            return dumps_str(obj)
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+    app.json = CodecJSONProvider(app)
+    return app
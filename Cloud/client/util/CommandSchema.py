@@ -0,0 +1,215 @@
+"""
+设备控制命令的声明式定义
+
+每种设备类型声明各命令的参数（类型、取值范围、是否必填、默认值），导入时编译成校验函数：
+    LIGHT.validate("set_brightness", {"brightness": "80"}) -> {"brightness": 80}
+HTTP 接口、BulbController、IoT 后端在下发前校验，实体收到 MQTT 命令时按同一份定义校验并分发，
+非法输入在到达 MQTT 之前就被拒绝，各处不再各写一套 if/elif 和范围检查
+"""
+import copy
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+_MISSING = object()
+
+
+class CommandError(ValueError):
+    """命令或参数不合法"""
+
+    def __init__(self, command: str, message: str, field: Optional[str] = None):
+        self.command = command
+        self.field = field
+        super().__init__(f"{command}.{field}: {message}" if field else f"{command}: {message}")
+
+
+class Field:
+    """参数定义；required=False 且没有 default 的参数缺省时不出现在结果中；可变的 default 每次校验返回副本"""
+
+    def __init__(self, required: bool = True, default: Any = _MISSING):
+        self.required = required and default is _MISSING
+        self.default = default
+
+    def compile(self) -> Callable[[Any], Any]:
+        """返回转换函数：合法时返回规范化后的值，否则抛 ValueError"""
+        raise NotImplementedError
+
+
+class Int(Field):
+    """整数（接受整数值的浮点数和数字字符串），可限定闭区间"""
+
+    def __init__(self, minimum: Optional[int] = None, maximum: Optional[int] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def compile(self):
+        low = float("-inf") if self.minimum is None else self.minimum
+        high = float("inf") if self.maximum is None else self.maximum
+
+        def convert(value):
+            if type(value) is not int:
+                if isinstance(value, bool):
+                    raise ValueError(f"expected integer, got {value!r}")
+                if isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                elif isinstance(value, str) and value.strip().lstrip("-").isdigit():
+                    value = int(value)
+                else:
+                    raise ValueError(f"expected integer, got {value!r}")
+            if not low <= value <= high:
+                raise ValueError(f"{value} out of range [{self.minimum}, {self.maximum}]")
+            return value
+        return convert
+
+
+class Bool(Field):
+    """布尔值（兼容 0 / 1）"""
+
+    def compile(self):
+        accepted = {True: True, False: False}
+
+        def convert(value):
+            if type(value) in (bool, int) and value in accepted:
+                return accepted[value]
+            raise ValueError(f"expected boolean, got {value!r}")
+        return convert
+
+
+class Choice(Field):
+    """枚举字符串（不区分大小写，返回小写）"""
+
+    def __init__(self, *values: str, **kwargs):
+        super().__init__(**kwargs)
+        self.values = frozenset(v.lower() for v in values)
+
+    def compile(self):
+        values = self.values
+
+        def convert(value):
+            if isinstance(value, str):
+                value = value.lower()
+                if value in values:
+                    return value
+            raise ValueError(f"expected one of {sorted(values)}, got {value!r}")
+        return convert
+
+
+class Str(Field):
+    """非空字符串，限制长度"""
+
+    def __init__(self, max_length: int = 64, **kwargs):
+        super().__init__(**kwargs)
+        self.max_length = max_length
+
+    def compile(self):
+        max_length = self.max_length
+
+        def convert(value):
+            if isinstance(value, str) and 0 < len(value) <= max_length:
+                return value
+            raise ValueError(f"expected string of 1-{max_length} characters, got {value!r}")
+        return convert
+
+
+class Numbers(Field):
+    """名称 -> 数值 的映射（如传感器校准偏移）"""
+
+    def compile(self):
+        def convert(value):
+            if isinstance(value, dict) and all(
+                    isinstance(k, str) and isinstance(v, (int, float)) and not isinstance(v, bool)
+                    for k, v in value.items()):
+                return dict(value)
+            raise ValueError(f"expected mapping of names to numbers, got {value!r}")
+        return convert
+
+
+def _compile_command(command: str, fields: Dict[str, Field], require_any: bool):
+    """把参数定义编译成一个校验函数：payload(dict) -> 规范化后的参数 dict"""
+    plan: Tuple = tuple((name, field.compile(), field.required, field.default) for name, field in fields.items())
+
+    def validate(payload) -> Dict[str, Any]:
+        if payload is None:
+            payload = {}
+        elif not isinstance(payload, dict):
+            raise CommandError(command, f"expected object, got {type(payload).__name__}")
+        result = {}
+        for name, convert, required, default in plan:
+            value = payload.get(name, _MISSING)
+            if value is _MISSING or value is None:
+                if required:
+                    raise CommandError(command, "missing required parameter", name)
+                if default is not _MISSING:
+                    # 可变默认值（如 Numbers 的 {}）给每次调用一份副本，处理函数修改结果不会改到定义
+                    result[name] = copy.deepcopy(default) if isinstance(default, (dict, list, set)) else default
+                continue
+            try:
+                result[name] = convert(value)
+            except ValueError as e:
+                raise CommandError(command, str(e), name) from None
+        if require_any and not result:
+            raise CommandError(command, f"expected at least one of {[name for name, *_ in plan]}")
+        return result
+
+    return validate
+
+
+class CommandSchema:
+    """
+    一种设备类型的全部命令
+    commands: 命令名 -> {参数名: Field}；require_any 中的命令至少要给出一个参数
+    """
+
+    def __init__(self, device_type: str, kind: str, commands: Dict[str, Dict[str, Field]],
+                 require_any: Iterable[str] = ()):
+        self.device_type = device_type
+        self.kind = kind  # MQTT 主题中的类别，如 lights
+        require_any = set(require_any)
+        self.validators: Dict[str, Callable[[Any], Dict[str, Any]]] = {
+            command: _compile_command(command, fields, command in require_any)
+            for command, fields in commands.items()
+        }
+        self.commands = tuple(self.validators)
+
+    def validate(self, command: str, payload=None) -> Dict[str, Any]:
+        validator = self.validators.get(command)
+        if validator is None:
+            raise CommandError(command, f"unknown command for {self.device_type}")
+        return validator(payload)
+
+    def bind(self, handlers: Dict[str, Callable[..., Any]]) -> Dict[str, Tuple[Callable, Callable]]:
+        """
+        生成分发表：命令名 -> (校验函数, 处理函数)，处理函数以关键字参数接收校验后的参数
+        只接受 schema 中声明过的命令
+        """
+        unknown = set(handlers) - set(self.validators)
+        if unknown:
+            raise ValueError(f"Handlers for undeclared {self.device_type} commands: {sorted(unknown)}")
+        return {command: (self.validators[command], handler) for command, handler in handlers.items()}
+
+
+LIGHT = CommandSchema("light", "lights", {
+    "set_state": {"state": Choice("on", "off")},
+    "set_brightness": {"brightness": Int(0, 100)},
+    "set_color": {"color": Str()},
+    "get_state": {},
+    # HTTP 接口和场景一次更新多个字段
+    "update": {
+        "state": Choice("on", "off", required=False),
+        "brightness": Int(0, 100, required=False),
+        "color": Str(required=False)
+    }
+}, require_any=("update",))
+
+LOCK = CommandSchema("lock", "locks", {
+    "lock": {"locked": Bool(default=True)},
+    # HTTP 接口和场景必须明确给出 locked
+    "update": {"locked": Bool()}
+})
+
+SENSOR = CommandSchema("sensor", "sensors", {
+    "update_interval": {"interval": Int(1, 86400, default=10)},
+    "calibrate": {"offset": Numbers(default={})}
+})
+
+SCHEMAS = {schema.device_type: schema for schema in (LIGHT, LOCK, SENSOR)}
+BY_KIND = {schema.kind: schema for schema in SCHEMAS.values()}
@@ -0,0 +1,158 @@
+"""
+HTTP 响应压缩：按请求头 Accept-Encoding 协商编码（zstd / br / gzip），响应体小于 MIN_SIZE 时不压缩
+brotli、zstandard 为可选依赖，未安装时只提供 gzip
+
+SnapshotCache 缓存设备列表这类大快照的响应体和各编码的压缩结果，内容未变时不重复序列化 / 压缩
+"""
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时不提供 br
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时不提供 zstd
+    zstandard = None
+
+MIN_SIZE = int(os.getenv("HTTP_COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("HTTP_BROTLI_QUALITY", "5"))
+ZSTD_LEVEL = int(os.getenv("HTTP_ZSTD_LEVEL", "3"))
+
+# 可用编码，q 值相同时靠前的优先
+ENCODINGS = tuple(name for name, available in (("zstd", zstandard is not None), ("br", brotli is not None),
+                                               ("gzip", True)) if available)
+
+
+def _accepted(accept_encoding: Optional[str]) -> dict:
+    """解析 Accept-Encoding：编码 -> q 值"""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.lower()] = q
+    return accepted
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """选出客户端接受的编码中 q 值最高的一个；不接受任何压缩时返回 None"""
+    accepted = _accepted(accept_encoding)
+    best, best_q = None, 0.0
+    for name in ENCODINGS:
+        q = accepted.get(name, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # mtime=0：相同内容压缩结果相同
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def decompress(body: bytes, encoding: Optional[str]) -> bytes:
+    if not encoding or encoding == "identity":
+        return body
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br" and brotli is not None:
+        return brotli.decompress(body)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def encode(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, List[Tuple[str, str]]]:
+    """按协商结果压缩响应体，返回 (响应体, 需要附加的响应头)"""
+    headers = [("Vary", "Accept-Encoding")]
+    if len(body) < MIN_SIZE:
+        return body, headers
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return body, headers
+    headers.append(("Content-Encoding", encoding))
+    return compress(body, encoding), headers
+
+
+class _Snapshot:
+    __slots__ = ("version", "body", "variants")
+
+    def __init__(self, version, body: bytes, variants: Optional[Dict[str, bytes]] = None):
+        self.version = version
+        self.body = body
+        self.variants = variants if variants is not None else {}
+
+
+class SnapshotCache:
+    """
+    按 key 缓存最近一次的响应体及其各编码的压缩结果
+    给出 version（如变更日志序号）时版本不变即直接复用，连序列化也省去；
+    不给 version 时每次调用 render 重新序列化，与缓存的响应体相同则复用压缩结果
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[object, _Snapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, key, render: Callable[[], bytes], accept_encoding: Optional[str],
+               version=None) -> Tuple[bytes, List[Tuple[str, str]]]:
+        """
+        返回 (响应体, 需要附加的响应头)，与 encode() 相同
+        version 须在读取数据之前取得：渲染期间数据又有变化时，缓存的内容只会比版本新，下个版本会重新渲染
+        """
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+        if snapshot is None or version is None or snapshot.version != version:
+            body = render()
+            if snapshot is not None and snapshot.body == body:
+                snapshot = _Snapshot(version, body, snapshot.variants)
+            else:
+                snapshot = _Snapshot(version, body)
+            with self._lock:
+                self._entries[key] = snapshot
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        headers = [("Vary", "Accept-Encoding")]
+        encoding = negotiate(accept_encoding) if len(snapshot.body) >= MIN_SIZE else None
+        if encoding is None:
+            return snapshot.body, headers
+        headers.append(("Content-Encoding", encoding))
+        compressed = snapshot.variants.get(encoding)
+        if compressed is None:
+            self.misses += 1
+            # 并发请求可能重复压缩同一份内容，结果相同，后写入的覆盖即可
+            compressed = snapshot.variants[encoding] = compress(snapshot.body, encoding)
+        else:
+            self.hits += 1
+        return compressed, headers
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
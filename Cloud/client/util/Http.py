@@ -0,0 +1,93 @@
+"""
+asyncio 上的最小 HTTP/1.1 报文读写（分片网关的转发和内置 ASGI 服务器共用）
+只解析分帧和路由需要的字段，报文头原样保留以便透传
+"""
+import asyncio
+import json
+from typing import Dict, Iterable, Optional, Tuple
+
+MAX_HEAD = 64 * 1024
+
+REASONS = {
+    200: "OK", 201: "Created", 204: "No Content", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 411: "Length Required", 500: "Internal Server Error", 502: "Bad Gateway",
+    503: "Service Unavailable", 504: "Gateway Timeout"
+}
+
+
+class Head:
+    """请求 / 响应头：start 为起始行的三段，headers 的键为小写"""
+
+    __slots__ = ("raw", "start", "headers")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        lines = raw.decode("latin-1").split("\r\n")
+        self.start = lines[0].split(" ", 2)
+        self.headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                self.headers[name.strip().lower()] = value.strip()
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.start[0] == "HTTP/1.0" or self.start[-1] == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+async def read_head(reader: asyncio.StreamReader) -> Optional[Head]:
+    """读取报文头；对端在报文之间关闭连接时返回 None"""
+    try:
+        raw = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    return Head(raw)
+
+
+async def read_body(reader: asyncio.StreamReader, head: Head, response: bool) -> Tuple[bytes, bool]:
+    """读取报文体（保留 chunked 分帧原样），返回 (报文体, 连接是否还能复用)"""
+    length = head.headers.get("content-length")
+    if length is not None:
+        return await reader.readexactly(int(length)), True
+    if "chunked" in head.headers.get("transfer-encoding", "").lower():
+        chunks = []
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            chunks.append(size_line)
+            size = int(size_line.split(b";")[0], 16)
+            chunks.append(await reader.readexactly(size + 2))
+            if size == 0:
+                return b"".join(chunks), True
+    if response and head.start[1] not in ("204", "304"):
+        # 没有长度信息的响应读到连接关闭为止
+        return await reader.read(), False
+    return b"", True
+
+
+def dechunk(body: bytes) -> bytes:
+    """把 chunked 分帧的报文体还原"""
+    data, offset = bytearray(), 0
+    while True:
+        end = body.index(b"\r\n", offset)
+        size = int(body[offset:end].split(b";")[0], 16)
+        if size == 0:
+            return bytes(data)
+        data += body[end + 2:end + 2 + size]
+        offset = end + 2 + size + 2
+
+
+def response(status: int, body: bytes, content_type: Optional[str] = "application/json",
+             headers: Iterable[Tuple[str, str]] = ()) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    if content_type:
+        lines.append(f"Content-Type: {content_type}")
+    lines.extend(f"{name}: {value}" for name, value in headers)
+    lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def error_response(status: int, error: str) -> bytes:
+    return response(status, json.dumps({"error": error}).encode())
@@ -0,0 +1,150 @@
+"""
+统一日志管道
+所有设备/控制器日志挂在 "home.<子系统>" 下，只在顶层 "home" 上挂一个 QueueHandler；
+调用线程（多为 MQTT 回调线程）只做过滤和入队，格式化与写 stderr 由 QueueListener 后台线程完成
+
+子系统可单独设置级别、采样率与限速（只作用于 WARNING 以下的记录，告警和错误始终输出）：
+    configure_subsystem("bulb", level=logging.DEBUG, sample_rate=0.01, rate_limit=50)
+
+环境变量 LOG_LEVEL 设置默认级别（默认 INFO）
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from Cloud.client.util.Metrics import Counter
+
+ROOT = "home"
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records dropped by sampling or rate limiting",
+                              ("subsystem", "reason"))
+
+
+class _SubsystemPolicy:
+    """单个子系统的采样率与令牌桶限速"""
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: Optional[float] = None, burst: Optional[float] = None):
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.burst = burst if burst is not None else (rate_limit or 0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> Optional[str]:
+        """放行返回 None，否则返回丢弃原因"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return "sampled"
+        if self.rate_limit is None:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_limit)
+            self._updated = now
+            if self._tokens < 1:
+                return "rate_limited"
+            self._tokens -= 1
+        return None
+
+
+class SubsystemFilter(logging.Filter):
+    """按记录所属子系统（logger 名第二段）应用采样与限速"""
+
+    def __init__(self):
+        super().__init__()
+        self.policies: Dict[str, _SubsystemPolicy] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.policies:
+            return True
+        subsystem = record.name.split(".", 2)[1] if record.name.startswith(ROOT + ".") else ROOT
+        policy = self.policies.get(subsystem)
+        if policy is None:
+            return True
+        reason = policy.allow()
+        if reason is None:
+            return True
+        LOG_RECORDS_DROPPED.inc(subsystem, reason)
+        return False
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    入队前只合并消息参数（"%s" 形式的参数在此才格式化，级别未开启时完全不格式化），
+    时间戳、异常堆栈等完整格式化留给监听线程
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_filter = SubsystemFilter()
+
+
+def setup(level: Optional[int] = None, stream=None, fmt: str = FORMAT) -> logging.Logger:
+    """初始化日志管道（重复调用无副作用），返回顶层 logger"""
+    global _listener
+    root = logging.getLogger(ROOT)
+    with _lock:
+        if _listener is not None:
+            return root
+        records = queue.SimpleQueue()
+        handler = _LazyQueueHandler(records)
+        handler.addFilter(_filter)
+
+        output = logging.StreamHandler(stream)
+        output.setFormatter(logging.Formatter(fmt))
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
+
+        root.addHandler(handler)
+        root.setLevel(level if level is not None else os.getenv("LOG_LEVEL", "INFO").upper())
+        # 已由本管道输出，不再传给根 logger（避免与 basicConfig 的处理器重复打印）
+        root.propagate = False
+    return root
+
+
+def shutdown():
+    """停止监听线程并输出队列中剩余的记录"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            logging.getLogger(ROOT).handlers.clear()
+
+
+def get_logger(subsystem: str, name: Optional[str] = None) -> logging.Logger:
+    """
+    取 home.<subsystem>[.<name>] logger；不挂任何处理器，同一设备重复创建也不会叠加输出
+    例：get_logger("bulb", device_id)
+    """
+    setup()
+    return logging.getLogger(f"{ROOT}.{subsystem}.{name}" if name else f"{ROOT}.{subsystem}")
+
+
+def configure_subsystem(subsystem: str, level: Optional[int] = None, sample_rate: float = 1.0,
+                        rate_limit: Optional[float] = None, burst: Optional[float] = None):
+    """
+    设置子系统的级别、采样率（0-1）与限速（条/秒，burst 为突发上限，默认等于 rate_limit）
+    sample_rate=1 且 rate_limit=None 时取消该子系统的采样与限速
+    """
+    setup()
+    if level is not None:
+        logging.getLogger(f"{ROOT}.{subsystem}").setLevel(level)
+    if sample_rate >= 1.0 and rate_limit is None:
+        _filter.policies.pop(subsystem, None)
+    else:
+        _filter.policies[subsystem] = _SubsystemPolicy(sample_rate, rate_limit, burst)
@@ -0,0 +1,319 @@
+"""
+Prometheus 文本格式指标（不依赖 prometheus_client）
+计数器与直方图按线程分片：热路径只写本线程的字典，不加锁；抓取时合并所有分片，
+已退出线程的分片并入汇总后丢弃，避免短命的请求线程让分片无限增长
+
+暴露方式：
+    Flask 应用调用 install_flask(app, "device_controller")，自动统计各路由耗时并注册 GET /metrics
+    无 Web 服务的脚本可设置 METRICS_PORT，调用 start_http_server() 单独开端口
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 秒；覆盖本地 MQTT 往返（亚毫秒）到慢 HTTP 请求
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 大模型接口调用
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    """指标注册表，按注册顺序输出"""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional["_Metric"]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        (registry or REGISTRY).register(self)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class _ShardedMetric(_Metric):
+    """每个线程一个分片 {labels: value}；只有所属线程写入"""
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        super().__init__(name, help, labelnames, registry)
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, Dict]] = []
+        self._retired: Dict = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict:
+        values = getattr(self._local, "values", None)
+        if values is None:
+            values = {}
+            with self._lock:
+                self._compact()
+                self._shards.append((threading.current_thread(), values))
+            self._local.values = values
+        return values
+
+    def _compact(self):
+        """已退出线程的分片并入汇总（调用方持有 _lock）"""
+        alive = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                alive.append((thread, values))
+            else:
+                self._merge(self._retired, values)
+        self._shards = alive
+
+    def _collect(self) -> Dict:
+        with self._lock:
+            self._compact()
+            merged = self._merge({}, self._retired)
+            for _, values in self._shards:
+                # dict(...) 在 GIL 下一次完成，拿到的是该分片的一致快照
+                self._merge(merged, dict(values))
+        return merged
+
+    def _merge(self, into: Dict, values: Dict) -> Dict:
+        raise NotImplementedError
+
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        values = self._shard()
+        values[labels] = values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._collect().get(labels, 0.0)
+
+    def _merge(self, into, values):
+        for labels, value in values.items():
+            into[labels] = into.get(labels, 0.0) + value
+        return into
+
+    def samples(self):
+        for labels, value in sorted(self._collect().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(_ShardedMetric):
+    """固定分桶直方图；每个标签组合存 [各桶计数..., +Inf 桶计数, 总和]，总数由桶计数求和得出"""
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS, registry=None):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        values = self._shard()
+        state = values.get(labels)
+        if state is None:
+            state = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _merge(self, into, values):
+        for labels, state in values.items():
+            current = into.get(labels)
+            if current is None:
+                into[labels] = list(state)
+            else:
+                for i, value in enumerate(state):
+                    current[i] += value
+        return into
+
+    def count(self, *labels) -> int:
+        state = self._collect().get(labels)
+        return sum(state[:-1]) if state else 0
+
+    def samples(self):
+        for labels, state in sorted(self._collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{label_text} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(state[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class Gauge(_Metric):
+    """瞬时值；set_function 注册的回调在抓取时求值，返回数值或 {labels: 数值}"""
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        super().__init__(name, help, labelnames, registry)
+        self._values: Dict[Tuple, float] = {}
+        self._functions: List[Callable] = []
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def set_function(self, function: Callable):
+        self._functions.append(function)
+
+    def remove_function(self, function: Callable):
+        if function in self._functions:
+            self._functions.remove(function)
+
+    def samples(self):
+        values = dict(self._values)
+        for function in self._functions:
+            try:
+                result = function()
+            except Exception:
+                continue
+            if isinstance(result, dict):
+                for labels, value in result.items():
+                    labels = labels if isinstance(labels, tuple) else (labels,)
+                    values[labels] = values.get(labels, 0) + value
+            else:
+                values[()] = values.get((), 0) + result
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+# ---------- 项目公共指标 ----------
+MQTT_PUBLISHED = Counter("mqtt_messages_published_total", "MQTT messages published",
+                         ("component", "topic_class"))
+MQTT_RECEIVED = Counter("mqtt_messages_received_total", "MQTT messages received",
+                        ("component", "topic_class"))
+MQTT_RECONNECTS = Counter("mqtt_reconnects_total", "MQTT reconnect attempts", ("component", "outcome"))
+COMMAND_SECONDS = Histogram("device_command_seconds", "Time for a device to apply a command and publish its state",
+                            ("device_type", "command"))
+COMMAND_ROUND_TRIP_SECONDS = Histogram("command_round_trip_seconds",
+                                       "Time from publishing a command to receiving the resulting state",
+                                       ("component", "command"))
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency",
+                                 ("app", "method", "route", "status"))
+LLM_REQUEST_SECONDS = Histogram("llm_request_duration_seconds", "LLM API call latency",
+                                ("model", "outcome"), buckets=LLM_BUCKETS)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Database statement latency",
+                             ("statement", "outcome"))
+DEVICES = Gauge("devices", "Registered devices", ("device_type",))
+SCENE_ACTIVATION_SECONDS = Histogram("scene_activation_seconds",
+                                     "Time from dispatching a scene to every device confirming (or rolling back)",
+                                     ("outcome",))
+
+
+def topic_class(topic: str) -> str:
+    """home/<类别>/<设备ID>/<state|control>/... -> "<类别>/<state|control>"，避免按设备展开标签"""
+    parts = topic.split("/")
+    if len(parts) >= 4 and parts[0] == "home":
+        return f"{parts[1]}/{parts[3]}"
+    return "other"
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def install_flask(app, app_name: str):
+    """统计每个路由的耗时（按路由模板而非实际路径打标签），并注册 GET /metrics"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, app_name, request.method, route,
+                                         response.status_code)
+        return response
+
+    def metrics_endpoint():
+        return app.response_class(render(), mimetype=None, content_type=CONTENT_TYPE)
+
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint, methods=["GET"])
+    return app
+
+
+def start_http_server(port: Optional[int] = None, host: str = "0.0.0.0"):
+    """在后台线程中单独提供 /metrics（port 缺省取环境变量 METRICS_PORT，未设置时不启动）"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    if port is None:
+        if not os.getenv("METRICS_PORT"):
+            return None
+        port = int(os.getenv("METRICS_PORT"))
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
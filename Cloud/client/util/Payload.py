@@ -0,0 +1,146 @@
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from Cloud.client.util import Codec
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+# 配置中使用的简称 -> Content-Type
+FORMATS = {"json": JSON, "msgpack": MSGPACK, "cbor": CBOR}
+
+# 控制端在命令中通过该 User Property 声明可接受的负载格式（逗号分隔，按优先级）
+ACCEPT_PROPERTY = "accept"
+
+# 链路追踪 trace ID 的 User Property（见 Tracing）
+TRACE_PROPERTY = "trace-id"
+
+# Content-Type -> (编码, 解码)
+CODECS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    JSON: (Codec.dumps, Codec.loads),
+}
+
+try:
+    import msgpack
+
+    CODECS[MSGPACK] = (
+        lambda obj: msgpack.packb(obj, default=Codec._default, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False),
+    )
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+
+    CODECS[CBOR] = (
+        lambda obj: cbor2.dumps(obj, default=lambda encoder, value: encoder.encode(Codec._default(value))),
+        cbor2.loads,
+    )
+except ImportError:
+    cbor2 = None
+
+
+def available() -> list:
+    """当前环境可用的 Content-Type（JSON 始终可用）"""
+    return list(CODECS)
+
+
+def encode(obj: Any, content_type: str = JSON) -> bytes:
+    return CODECS[content_type][0](obj)
+
+
+def decode(data: bytes, content_type: Optional[str] = None) -> Any:
+    """按 Content-Type 解码；未声明类型的消息一律按 JSON 处理（兼容 MQTT 3.1.1 / 旧客户端）"""
+    if not data:
+        return {}
+    codec = CODECS.get(content_type or JSON)
+    if codec is None:
+        raise ValueError(f"Unsupported content type: {content_type}")
+    return codec[1](data)
+
+
+def content_type_of(message) -> Optional[str]:
+    properties = getattr(message, "properties", None)
+    return getattr(properties, "ContentType", None) if properties is not None else None
+
+
+def user_property(message, key: str) -> Optional[str]:
+    properties = getattr(message, "properties", None)
+    for name, value in getattr(properties, "UserProperty", None) or ():
+        if name == key:
+            return value
+    return None
+
+
+def decode_message(message) -> Any:
+    """解码 MQTT 消息负载"""
+    return decode(message.payload, content_type_of(message))
+
+
+_properties_cache: Dict[Tuple[str, Optional[str]], Properties] = {}
+
+
+def publish_properties(content_type: str = JSON, accept: Optional[Iterable[str]] = None,
+                       trace_id: Optional[str] = None) -> Properties:
+    """构造（并缓存）带 Content-Type / accept 的 PUBLISH 属性；带 trace ID 的每条消息单独构造，不缓存"""
+    accept_value = ",".join(accept) if accept else None
+    key = (content_type, accept_value)
+    properties = _properties_cache.get(key) if trace_id is None else None
+    if properties is None:
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.ContentType = content_type
+        if accept_value:
+            properties.UserProperty = (ACCEPT_PROPERTY, accept_value)
+        if trace_id is not None:
+            properties.UserProperty = (TRACE_PROPERTY, trace_id)
+            return properties
+        _properties_cache[key] = properties
+    return properties
+
+
+def accept_header(preferred: str = "auto") -> list:
+    """控制端声明的可接受格式：优先二进制格式，JSON 兜底"""
+    if preferred != "auto":
+        return [FORMATS[preferred], JSON] if FORMATS[preferred] != JSON else [JSON]
+    return [t for t in (MSGPACK, CBOR) if t in CODECS] + [JSON]
+
+
+class PayloadNegotiator:
+    """
+    设备端状态负载格式协商
+    mode 为 json / msgpack / cbor 时固定使用该格式；
+    auto 时按控制命令中的 accept 属性选择双方都支持的格式，
+    一旦收到未声明 accept 的命令（旧版 JSON 客户端），固定回退为 JSON
+    """
+
+    def __init__(self, mode: str = "auto"):
+        if mode != "auto" and mode not in FORMATS:
+            raise ValueError(f"Unknown payload format: {mode}")
+        self.mode = mode
+        self.content_type = JSON if mode == "auto" else FORMATS[mode]
+        if self.content_type not in CODECS:
+            raise ValueError(f"Payload format '{mode}' requires an optional codec package")
+        self._legacy_consumer = False
+
+    def observe(self, message):
+        """根据收到的控制命令更新协商结果"""
+        if self.mode != "auto" or self._legacy_consumer:
+            return
+        accept = user_property(message, ACCEPT_PROPERTY)
+        if not accept:
+            self._legacy_consumer = True
+            self.content_type = JSON
+            return
+        for content_type in accept.split(","):
+            content_type = content_type.strip()
+            if content_type in CODECS:
+                self.content_type = content_type
+                return
+
+    def encode(self, obj: Any, trace_id: Optional[str] = None) -> Tuple[bytes, Properties]:
+        """按协商结果编码，返回 (负载, PUBLISH 属性)；trace_id 随属性带回给控制端"""
+        return encode(obj, self.content_type), publish_properties(self.content_type, trace_id=trace_id)
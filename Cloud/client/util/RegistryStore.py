@@ -0,0 +1,250 @@
+"""
+设备注册表持久化：追加写变更日志 + 定期紧凑快照
+
+目录结构：
+    registry.snap   快照（定长条目 + 字符串区，可 mmap 后整体解码）
+    registry.log    快照之后的变更日志（每条带 CRC，尾部残缺的记录在加载时截掉）
+
+快照格式（小端）：
+    头部      magic "HCDR" | version u16 | broker 数 u16 | 设备数 u32 | 条目区偏移 u32 | 字符串区偏移 u32 | 正文 CRC32 u32
+    broker 表  (长度 u16 + UTF-8)*      同一代理地址只存一次
+    条目区    (类型 u8 | 端口 u16 | broker 下标 u16 | ID 偏移 u32 | ID 长度 u16)*
+    字符串区   所有设备 ID 首尾相接
+
+日志记录：长度 u32 | CRC32 u32 | 操作 u8 | 正文
+    新增：类型 u8 | 端口 u16 | ID 长度 u16 + ID | broker 长度 u16 + broker
+    删除：ID 长度 u16 + ID
+"""
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Iterable, NamedTuple
+
+MAGIC = b"HCDR"
+VERSION = 1
+
+SNAPSHOT_FILE = "registry.snap"
+LOG_FILE = "registry.log"
+
+_HEADER = struct.Struct("<4sHHIIII")
+_ENTRY = struct.Struct("<BHHIH")
+_U16 = struct.Struct("<H")
+_RECORD = struct.Struct("<IIB")
+_ADD = struct.Struct("<BH")
+
+OP_ADD = 1
+OP_DELETE = 2
+
+DEVICE_TYPES = ("light", "lock", "sensor")
+_TYPE_CODES = {name: code for code, name in enumerate(DEVICE_TYPES, 1)}
+
+
+class DeviceRecord(NamedTuple):
+    device_type: str
+    device_id: str
+    broker: str
+    port: int
+
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _U16.pack(len(data)) + data
+
+
+def _unpack_str(buffer, offset: int):
+    (length,) = _U16.unpack_from(buffer, offset)
+    offset += _U16.size
+    return bytes(buffer[offset:offset + length]).decode("utf-8"), offset + length
+
+
+class RegistryStore:
+    """
+    注册表的持久化存储；records 为当前全部设备（device_id -> DeviceRecord）
+    日志记录数达到 compact_every 时自动写新快照并清空日志
+    fsync=True 时每条日志都落盘（更安全，写入更慢）；快照总是 fsync 后原子替换
+    """
+
+    def __init__(self, directory: str, compact_every: int = 10000, fsync: bool = False):
+        self.directory = directory
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.records: Dict[str, DeviceRecord] = {}
+        self.log_records = 0
+        self.truncated_bytes = 0
+        self._lock = threading.Lock()
+        self._log = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.directory, LOG_FILE)
+
+    # ---------- 加载 ----------
+    def load(self) -> Dict[str, DeviceRecord]:
+        """读取快照并重放日志，返回全部设备记录"""
+        with self._lock:
+            self.records = self._read_snapshot()
+            self._replay_log()
+            self._log = open(self.log_path, "ab")
+            return dict(self.records)
+
+    def _read_snapshot(self) -> Dict[str, DeviceRecord]:
+        try:
+            f = open(self.snapshot_path, "rb")
+        except FileNotFoundError:
+            return {}
+        with f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                raise ValueError(f"Corrupt registry snapshot: {self.snapshot_path}")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                magic, version, broker_count, count, entries_at, strings_at, crc = _HEADER.unpack_from(view, 0)
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError(f"Unsupported registry snapshot: {self.snapshot_path}")
+                if zlib.crc32(view[_HEADER.size:]) != crc:
+                    raise ValueError(f"Registry snapshot checksum mismatch: {self.snapshot_path}")
+
+                brokers = []
+                offset = _HEADER.size
+                for _ in range(broker_count):
+                    broker, offset = _unpack_str(view, offset)
+                    brokers.append(broker)
+
+                strings = view[strings_at:]
+                ids = strings.decode("ascii") if strings.isascii() else None
+                entries = view[entries_at:entries_at + count * _ENTRY.size]
+                records = {}
+                for type_code, port, broker_index, id_offset, id_length in _ENTRY.iter_unpack(entries):
+                    # 纯 ASCII 时按字符切片，省去逐个解码
+                    device_id = ids[id_offset:id_offset + id_length] if ids is not None \
+                        else strings[id_offset:id_offset + id_length].decode("utf-8")
+                    records[device_id] = DeviceRecord(DEVICE_TYPES[type_code - 1], device_id,
+                                                      brokers[broker_index], port)
+                return records
+
+    def _replay_log(self):
+        try:
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        offset = 0
+        count = 0
+        while offset + _RECORD.size <= len(data):
+            length, crc, op = _RECORD.unpack_from(data, offset)
+            body_at = offset + _RECORD.size
+            body = data[body_at:body_at + length]
+            if len(body) < length or zlib.crc32(bytes([op]) + body) != crc:
+                break
+            if op == OP_ADD:
+                type_code, port = _ADD.unpack_from(body, 0)
+                device_id, at = _unpack_str(body, _ADD.size)
+                broker, _ = _unpack_str(body, at)
+                self.records[device_id] = DeviceRecord(DEVICE_TYPES[type_code - 1], device_id, broker, port)
+            elif op == OP_DELETE:
+                device_id, _ = _unpack_str(body, 0)
+                self.records.pop(device_id, None)
+            offset = body_at + length
+            count += 1
+
+        self.log_records = count
+        if offset < len(data):
+            # 上次写入中断留下的残缺记录，截掉后继续追加
+            self.truncated_bytes = len(data) - offset
+            with open(self.log_path, "r+b") as f:
+                f.truncate(offset)
+
+    # ---------- 写入 ----------
+    @staticmethod
+    def _encode(op: int, body: bytes) -> bytes:
+        return _RECORD.pack(len(body), zlib.crc32(bytes([op]) + body), op) + body
+
+    def _write(self, chunks, apply):
+        """在同一把锁内更新内存记录并追加日志，保证快照与日志顺序一致"""
+        with self._lock:
+            apply()
+            if self._log is None:
+                self._log = open(self.log_path, "ab")
+            self._log.write(b"".join(chunks))
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self.log_records += len(chunks)
+            if self.log_records >= self.compact_every:
+                self._write_snapshot()
+
+    def add(self, record: DeviceRecord):
+        self.add_many([record])
+
+    def add_many(self, records: Iterable[DeviceRecord]):
+        """批量新增：合并为一次写入"""
+        records = list(records)
+        chunks = []
+        for record in records:
+            body = _ADD.pack(_TYPE_CODES[record.device_type], record.port) \
+                + _pack_str(record.device_id) + _pack_str(record.broker)
+            chunks.append(self._encode(OP_ADD, body))
+        if chunks:
+            self._write(chunks, lambda: self.records.update((record.device_id, record) for record in records))
+
+    def delete(self, device_id: str):
+        if device_id in self.records:
+            self._write([self._encode(OP_DELETE, _pack_str(device_id))],
+                        lambda: self.records.pop(device_id, None))
+
+    # ---------- 快照 ----------
+    def snapshot(self):
+        """把当前记录写成新快照并清空日志"""
+        with self._lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        records = list(self.records.values())
+        brokers: Dict[str, int] = {}
+        id_blob = bytearray()
+        entries = bytearray()
+        for record in records:
+            broker_index = brokers.setdefault(record.broker, len(brokers))
+            encoded = record.device_id.encode("utf-8")
+            entries += _ENTRY.pack(_TYPE_CODES[record.device_type], record.port, broker_index,
+                                   len(id_blob), len(encoded))
+            id_blob += encoded
+
+        broker_table = b"".join(_pack_str(broker) for broker in brokers)
+        entries_at = _HEADER.size + len(broker_table)
+        strings_at = entries_at + len(entries)
+        body = broker_table + bytes(entries) + bytes(id_blob)
+        header = _HEADER.pack(MAGIC, VERSION, len(brokers), len(records), entries_at, strings_at, zlib.crc32(body))
+
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # 快照已包含日志中的全部变更；若在此之前崩溃，重放旧日志也是幂等的
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.log_path, "wb")
+        self.log_records = 0
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def stats(self) -> Dict:
+        return {
+            "devices": len(self.records),
+            "log_records": self.log_records,
+            "truncated_bytes": self.truncated_bytes
+        }
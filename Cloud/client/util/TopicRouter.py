@@ -0,0 +1,197 @@
+"""
+MQTT 主题路由：按层级构建的前缀树（trie），支持 + / # 通配符
+
+每条路由在注册时绑定好处理函数和上下文（slot，例如设备实例或代理会话），
+匹配只沿主题层级走一遍树，与订阅总数无关；
+匹配结果按完整主题缓存，同一主题的后续消息只需一次字典查找，不再切分字符串
+"""
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Route(NamedTuple):
+    topic_filter: str
+    handler: Optional[Callable[[Any, str, Any], Any]]
+    slot: Any
+
+
+class _Node:
+    __slots__ = ("children", "routes")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.routes: List[Route] = []
+
+
+def _is_wildcard(topic_filter: str) -> bool:
+    return "+" in topic_filter or "#" in topic_filter
+
+
+class TopicRouter:
+    """
+    主题 -> 路由 的匹配表
+    handler 的调用形式为 handler(slot, command, message)，command 为主题的末级
+    cache_size 为匹配结果缓存的主题数上限（0 关闭缓存），满了整体清空
+    """
+
+    def __init__(self, cache_size: int = 65536):
+        self.cache_size = cache_size
+        self._root = _Node()
+        self._count = 0
+        self._cache: Dict[str, Tuple[Tuple[Route, ...], str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    # ---------- 注册 ----------
+    def add(self, topic_filter: str, handler: Optional[Callable] = None, slot: Any = None) -> Route:
+        """注册路由；同一过滤器下相同 (handler, slot) 的旧路由会被替换"""
+        route = Route(topic_filter, handler, slot)
+        with self._lock:
+            node = self._root
+            for level in topic_filter.split('/'):
+                child = node.children.get(level)
+                if child is None:
+                    child = node.children[level] = _Node()
+                node = child
+            before = len(node.routes)
+            node.routes = [r for r in node.routes if r.handler != handler or r.slot != slot]
+            node.routes.append(route)
+            self._count += len(node.routes) - before
+            self._invalidate(topic_filter)
+        return route
+
+    def remove(self, topic_filter: str, handler: Optional[Callable] = None, slot: Any = None) -> int:
+        """删除过滤器下的路由（handler / slot 为 None 时不按其筛选），返回删除条数"""
+        with self._lock:
+            path = [self._root]
+            for level in topic_filter.split('/'):
+                child = path[-1].children.get(level)
+                if child is None:
+                    return 0
+                path.append(child)
+            node = path[-1]
+            kept = [r for r in node.routes
+                    if (handler is not None and r.handler != handler) or (slot is not None and r.slot != slot)]
+            removed = len(node.routes) - len(kept)
+            node.routes = kept
+            self._count -= removed
+
+            # 回收空分支
+            levels = topic_filter.split('/')
+            for depth in range(len(levels), 0, -1):
+                node = path[depth]
+                if node.routes or node.children:
+                    break
+                del path[depth - 1].children[levels[depth - 1]]
+
+            if removed:
+                self._invalidate(topic_filter)
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._root = _Node()
+            self._count = 0
+            self._cache.clear()
+
+    def _invalidate(self, topic_filter: str):
+        # 精确过滤器只影响同名主题的缓存；带通配符的可能影响任意主题
+        if _is_wildcard(topic_filter):
+            self._cache.clear()
+        else:
+            self._cache.pop(topic_filter, None)
+
+    # ---------- 匹配 ----------
+    def match(self, topic: str) -> Tuple[Route, ...]:
+        """返回匹配主题的全部路由"""
+        hit = self._cache.get(topic)
+        if hit is None:
+            hit = self._resolve(topic)
+        return hit[0]
+
+    def dispatch(self, topic: str, message: Any = None) -> int:
+        """调用匹配路由的处理函数，返回匹配的路由数"""
+        hit = self._cache.get(topic)
+        if hit is None:
+            hit = self._resolve(topic)
+        routes, command = hit
+        for route in routes:
+            if route.handler is not None:
+                route.handler(route.slot, command, message)
+        return len(routes)
+
+    def match_filter(self, topic_filter: str) -> List[Route]:
+        """
+        反向匹配：返回注册时不含通配符、且被 topic_filter 匹配的路由
+        （如以保留消息的主题建表，查找新订阅命中的保留消息），只走过滤器覆盖到的分支
+        """
+        levels = topic_filter.split('/')
+        matched: List[Route] = []
+        with self._lock:
+            stack = [(self._root, 0)]
+            while stack:
+                node, depth = stack.pop()
+                if depth == len(levels):
+                    matched.extend(node.routes)
+                    continue
+                level = levels[depth]
+                if level == '#':
+                    # "a/#" 同样匹配 "a"；以 $ 开头的系统主题不匹配首级通配符
+                    matched.extend(node.routes)
+                    subtree = [child for name, child in node.children.items() if depth or not name.startswith('$')]
+                    while subtree:
+                        child = subtree.pop()
+                        matched.extend(child.routes)
+                        subtree.extend(child.children.values())
+                elif level == '+':
+                    stack.extend((child, depth + 1) for name, child in node.children.items()
+                                 if depth or not name.startswith('$'))
+                else:
+                    child = node.children.get(level)
+                    if child is not None:
+                        stack.append((child, depth + 1))
+        return matched
+
+    def _resolve(self, topic: str) -> Tuple[Tuple[Route, ...], str]:
+        levels = topic.split('/')
+        with self._lock:
+            hit = (tuple(self._walk(levels, topic.startswith('$'))), levels[-1])
+            if self.cache_size:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.clear()
+                self._cache[topic] = hit
+        return hit
+
+    def _walk(self, levels: List[str], system: bool) -> List[Route]:
+        matched: List[Route] = []
+        nodes = [self._root]
+        for depth, level in enumerate(levels):
+            # 以 $ 开头的系统主题不匹配首级通配符
+            wildcard = not (system and depth == 0)
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if not children:
+                    continue
+                if wildcard:
+                    rest = children.get('#')
+                    if rest is not None:
+                        matched.extend(rest.routes)
+                    plus = children.get('+')
+                    if plus is not None:
+                        next_nodes.append(plus)
+                child = children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+            nodes = next_nodes
+            if not nodes:
+                return matched
+        for node in nodes:
+            matched.extend(node.routes)
+            # "a/#" 同样匹配 "a"
+            rest = node.children.get('#')
+            if rest is not None:
+                matched.extend(rest.routes)
+        return matched
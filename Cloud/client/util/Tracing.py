@@ -0,0 +1,164 @@
+"""
+轻量级链路追踪
+trace ID 在 API 层生成（或沿用请求头 X-Trace-Id），经 MQTT 5 User Property 传到设备端处理函数，
+再随状态消息带回；各段耗时以元组写入内存环形缓冲区，可通过 /api/traces 导出
+
+环境变量：
+    TRACING=0                关闭追踪
+    TRACE_SAMPLE_RATE=0.1    新建 trace 的采样率（默认全部采样；上游已带 trace ID 的始终记录）
+    TRACE_BUFFER_SIZE=4096   环形缓冲区保留的 span 数
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from Cloud.client.util.Payload import TRACE_PROPERTY, user_property
+
+# HTTP 头中的 trace ID 字段名（MQTT 侧为 User Property TRACE_PROPERTY）
+HTTP_HEADER = "X-Trace-Id"
+
+_current: contextvars.ContextVar = contextvars.ContextVar("trace_id", default=None)
+
+
+def current() -> Optional[str]:
+    """当前线程（上下文）中的 trace ID"""
+    return _current.get()
+
+
+@contextmanager
+def activate(trace_id: Optional[str]):
+    """在 with 块内把 trace_id 设为当前 trace"""
+    token = _current.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _current.reset(token)
+
+
+def from_message(message) -> Optional[str]:
+    """从 MQTT 消息的 User Property 中取 trace ID"""
+    return user_property(message, TRACE_PROPERTY)
+
+
+class Tracer:
+    """span 收集器；span 为 (trace_id, name, 开始时间戳, 耗时毫秒, 线程名, 属性) 元组"""
+
+    def __init__(self, capacity: int = 4096, sample_rate: float = 1.0, enabled: bool = True):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._spans = deque(maxlen=capacity)
+        self.dropped_traces = 0
+
+    def start_trace(self) -> Optional[str]:
+        """新建 trace；未开启或未被采样时返回 None（后续各段均不记录）"""
+        if not self.enabled:
+            return None
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.dropped_traces += 1
+            return None
+        return os.urandom(8).hex()
+
+    def record(self, trace_id: Optional[str], name: str, started: float, duration: float, **attrs):
+        """记录一段已知起止时间的 span（started 为 time.time()，duration 单位秒）"""
+        if trace_id is None or not self.enabled:
+            return
+        # deque.append 是原子操作，无需加锁
+        self._spans.append((trace_id, name, started, duration * 1000, threading.current_thread().name, attrs))
+
+    @contextmanager
+    def span(self, name: str, trace_id: Optional[str] = None, **attrs):
+        """计时 with 块；trace_id 缺省取当前 trace，没有 trace 时不计时"""
+        trace_id = trace_id or _current.get()
+        if trace_id is None or not self.enabled:
+            yield
+            return
+        started = time.time()
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(trace_id, name, started, time.perf_counter() - begin, **attrs)
+
+    def export(self, trace_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """按 trace 分组导出（最新的在前），每个 trace 内 span 按开始时间排序"""
+        traces: Dict[str, List] = {}
+        for span in reversed(list(self._spans)):
+            if trace_id is not None and span[0] != trace_id:
+                continue
+            if span[0] not in traces:
+                if len(traces) >= limit:
+                    continue
+                traces[span[0]] = []
+            traces[span[0]].append(span)
+
+        result = []
+        for tid, spans in traces.items():
+            spans.sort(key=lambda s: s[2])
+            start = spans[0][2]
+            end = max(s[2] + s[3] / 1000 for s in spans)
+            result.append({
+                "trace_id": tid,
+                "start": start,
+                "duration_ms": round((end - start) * 1000, 3),
+                "spans": [{
+                    "name": name,
+                    "offset_ms": round((started - start) * 1000, 3),
+                    "duration_ms": round(duration, 3),
+                    "thread": thread,
+                    **attrs
+                } for _, name, started, duration, thread, attrs in spans]
+            })
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "buffered_spans": len(self._spans),
+            "capacity": self._spans.maxlen,
+            "dropped_traces": self.dropped_traces
+        }
+
+    def clear(self):
+        self._spans.clear()
+
+
+tracer = Tracer(
+    capacity=int(os.getenv("TRACE_BUFFER_SIZE", "4096")),
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+    enabled=os.getenv("TRACING", "1") != "0"
+)
+
+
+def install_flask(app):
+    """为 Flask 请求建立 trace：沿用 X-Trace-Id 请求头或新建，整个请求计为一个 span 并回写响应头"""
+    from flask import g, request
+
+    @app.before_request
+    def _begin_trace():
+        trace_id = request.headers.get(HTTP_HEADER) or tracer.start_trace()
+        g.trace_token = _current.set(trace_id)
+        g.trace_started = (time.time(), time.perf_counter())
+
+    @app.after_request
+    def _end_trace(response):
+        trace_id = _current.get()
+        if trace_id is not None:
+            started, begin = g.trace_started
+            tracer.record(trace_id, f"http {request.method} {request.url_rule or request.path}",
+                          started, time.perf_counter() - begin, status=response.status_code)
+            response.headers[HTTP_HEADER] = trace_id
+        return response
+
+    @app.teardown_request
+    def _reset_trace(exc):
+        token = g.pop("trace_token", None)
+        if token is not None:
+            _current.reset(token)
+
+    return app
@@ -0,0 +1,67 @@
+"""
+werkzeug 开发服务器的长连接支持
+
+werkzeug 3 对每个响应都发送 Connection: close（它不会在读下一个请求前排空上一个请求体，
+响应写完后还会把套接字里剩余的数据全部读掉），即使 protocol_version 为 HTTP/1.1 也不复用连接。
+KeepAliveRequestHandler 在处理前把请求体整个读入内存，使套接字始终停在下一个请求的开头，
+并让 werkzeug 写完响应后的排空读不到下一个请求；请求体过大、分块上传或 WebSocket 升级时仍按原样关闭连接
+
+用法：make_server(..., request_handler=KeepAliveRequestHandler) 或 app.run(..., request_handler=KeepAliveRequestHandler)
+"""
+import io
+import os
+import socket
+
+from werkzeug.serving import WSGIRequestHandler
+
+# 超过该大小的请求体不预读，处理完后关闭连接
+MAX_BUFFERED_BODY = int(os.getenv("HTTP_KEEP_ALIVE_MAX_BODY", str(1024 * 1024)))
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # 响应头和响应体分两次写出：连接复用时 Nagle 与延迟确认叠加会让每个响应多等约 40 毫秒
+        try:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:  # 非 TCP 套接字
+            pass
+
+    def _can_keep_alive(self) -> bool:
+        if self.close_connection or "Upgrade" in self.headers:
+            return False
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            return False
+        try:
+            return int(self.headers.get("Content-Length") or 0) <= MAX_BUFFERED_BODY
+        except ValueError:
+            return False
+
+    def make_environ(self):
+        environ = super().make_environ()
+        self._keep_alive = self._can_keep_alive()
+        if self._keep_alive:
+            length = int(self.headers.get("Content-Length") or 0)
+            environ["wsgi.input"] = io.BytesIO(self.rfile.read(length) if length else b"")
+        return environ
+
+    def send_header(self, keyword, value):
+        if getattr(self, "_keep_alive", False) and keyword.lower() == "connection" and value.lower() == "close":
+            return
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        super().end_headers()
+        if getattr(self, "_keep_alive", False):
+            # 请求体已读完，werkzeug 响应后的排空只会读到下一个请求，改为读一个空流
+            self.rfile = io.BytesIO()
+
+    def run_wsgi(self):
+        rfile = self.rfile
+        self._keep_alive = False
+        try:
+            super().run_wsgi()
+        finally:
+            self.rfile = rfile
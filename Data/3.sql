@@ -7,6 +7,10 @@ CREATE TABLE IF NOT EXISTS user_home_data (
     home_status JSON NOT NULL COMMENT '家居状态数据（JSON格式，{"老人":"有/无","小孩":"有/无"）',
     create_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '记录创建时间',
     update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '记录更新时间（修改时自动更新）',
+    has_elder TINYINT(1) AS (JSON_UNQUOTE(JSON_EXTRACT(home_status, '$."老人"')) = '有') VIRTUAL COMMENT '由 home_status 生成：是否有老人',
+    has_child TINYINT(1) AS (JSON_UNQUOTE(JSON_EXTRACT(home_status, '$."小孩"')) = '有') VIRTUAL COMMENT '由 home_status 生成：是否有小孩',
     UNIQUE KEY uk_user_date (user_id, data_date),
+    KEY idx_has_elder (has_elder, data_date),
+    KEY idx_has_child (has_child, data_date),
     PRIMARY KEY (id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='用户家居状态数据表';
\ No newline at end of file
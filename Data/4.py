@@ -1,80 +1,142 @@
-from db_connect import GaussDBConnector
+import os
+import sys
+
+from storage_backend import create_backend, HOME_STATUS_FLAGS
+from statement_cache import StatementRegistry
+
+# 复用 Cloud 中的指标模块（与 iot 模块相同，把项目根目录加入路径）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Cloud.client.util.Metrics import DB_QUERY_SECONDS
+
+
+def _observe_statement(name, elapsed, failed):
+    DB_QUERY_SECONDS.observe(elapsed, name, "error" if failed else "ok")
+
+
+# 所有语句形状只构建一次，跨连接/跨实例复用
+STATEMENTS = StatementRegistry(observer=_observe_statement)
+
+# 用户id,日期，家庭特殊情况（老人/小孩/无）
+INSERT_HOME_DATA = STATEMENTS.register("insert_home_data", """
+    INSERT INTO user_home_data (user_id, data_date, home_status)
+    VALUES (%s, %s, %s)
+""")
+SELECT_BY_USER = STATEMENTS.register(
+    "select_by_user", "SELECT * FROM user_home_data WHERE user_id = %s"
+)
+SELECT_BY_USER_DATE = STATEMENTS.register(
+    "select_by_user_date", "SELECT * FROM user_home_data WHERE user_id = %s AND data_date = %s"
+)
+UPDATE_HOME_STATUS = STATEMENTS.register("update_home_status", """
+    UPDATE user_home_data
+    SET home_status = %s, update_time = CURRENT_TIMESTAMP
+    WHERE id = %s
+""")
+DELETE_HOME_DATA = STATEMENTS.register(
+    "delete_home_data", "DELETE FROM user_home_data WHERE id = %s"
+)
+
 
 class HomeDataOperator:
-    def __init__(self):
-        self.db_connector = GaussDBConnector()
+    def __init__(self, backend=None):
+        # 默认按 .env 配置选择后端（云端 GaussDB 或本地 SQLite）
+        self.backend = backend or create_backend()
 
     def create_user_home_data(self, user_id, data_date, home_status):
         """新增用户家居数据"""
-        sql = """
-            INSERT INTO user_home_data (user_id, data_date, home_status) #用户id,日期，家庭特殊情况（老人/小孩/无）
-            VALUES (%s, %s, %s)
-        """
         try:
-            with self.db_connector as db:
-                db.cursor.execute(sql, (user_id, data_date, home_status))
-                db.connection.commit()
-                print(f"✅ 新增成功，记录ID：{db.cursor.lastrowid}")
-                return db.cursor.lastrowid
+            _, record_id = INSERT_HOME_DATA.execute(self.backend, (user_id, data_date, home_status))
+            print(f"✅ 新增成功，记录ID：{record_id}")
+            return record_id
         except Exception as e:
             print(f"❌ 新增失败：{str(e)}")
-            db.connection.rollback() 
             return None
 
     def get_user_home_data(self, user_id, data_date=None):
         """查询用户家居数据（支持按日期筛选）"""
-        sql = "SELECT * FROM user_home_data WHERE user_id = %s"
-        params = [user_id]
+        try:
+            if data_date:
+                result = SELECT_BY_USER_DATE.fetchall(self.backend, (user_id, data_date))
+            else:
+                result = SELECT_BY_USER.fetchall(self.backend, (user_id,))  # 获取所有匹配记录
+            print(f"✅ 查询到 {len(result)} 条记录")
+            return result
+        except Exception as e:
+            print(f"❌ 查询失败：{str(e)}")
+            return None
+
+    def find_homes_by_status(self, data_date=None, **flags):
+        """
+        按家庭特殊状态筛选记录（走 home_status 生成列上的索引）
+        例：find_homes_by_status(has_elder=True, data_date="2024-05-01")
+        """
+        unknown = set(flags) - set(HOME_STATUS_FLAGS)
+        if unknown:
+            print(f"❌ 未知的状态标志：{unknown}")
+            return None
+
+        columns = sorted(column for column, value in flags.items() if value is not None)
+        params = [1 if flags[column] else 0 for column in columns]
         if data_date:
-            sql += " AND data_date = %s"
+            columns.append("data_date")
             params.append(data_date)
-        
+
+        def build_sql():
+            sql = "SELECT * FROM user_home_data"
+            if columns:
+                sql += " WHERE " + " AND ".join(f"{column} = %s" for column in columns)
+            return sql
+
+        statement = STATEMENTS.get_or_build("find_homes:" + ",".join(columns), build_sql)
         try:
-            with self.db_connector as db:
-                db.cursor.execute(sql, params)
-                result = db.cursor.fetchall()  # 获取所有匹配记录
-                print(f"✅ 查询到 {len(result)} 条记录")
-                return result
+            result = statement.fetchall(self.backend, params)
+            print(f"✅ 查询到 {len(result)} 条记录")
+            return result
         except Exception as e:
             print(f"❌ 查询失败：{str(e)}")
             return None
 
     def update_home_status(self, record_id, new_home_status):
         """更新家居状态"""
-        sql = """
-            UPDATE user_home_data 
-            SET home_status = %s, update_time = NOW()
-            WHERE id = %s
-        """
         try:
-            with self.db_connector as db:
-                affected_rows = db.cursor.execute(sql, (new_home_status, record_id))
-                db.connection.commit()
-                if affected_rows > 0:
-                    print(f"✅ 更新成功，影响 {affected_rows} 条记录")
-                    return True
-                else:
-                    print("⚠️ 未找到待更新的记录")
-                    return False
+            affected_rows, _ = UPDATE_HOME_STATUS.execute(self.backend, (new_home_status, record_id))
+            if affected_rows > 0:
+                print(f"✅ 更新成功，影响 {affected_rows} 条记录")
+                return True
+            else:
+                print("⚠️ 未找到待更新的记录")
+                return False
         except Exception as e:
             print(f"❌ 更新失败：{str(e)}")
-            db.connection.rollback()
             return False
 
     def delete_user_home_data(self, record_id):
         """删除指定记录"""
-        sql = "DELETE FROM user_home_data WHERE id = %s"
         try:
-            with self.db_connector as db:
-                affected_rows = db.cursor.execute(sql, [record_id])
-                db.connection.commit()
-                if affected_rows > 0:
-                    print(f"✅ 删除成功，影响 {affected_rows} 条记录")
-                    return True
-                else:
-                    print("⚠️ 未找到待删除的记录")
-                    return False
+            affected_rows, _ = DELETE_HOME_DATA.execute(self.backend, (record_id,))
+            if affected_rows > 0:
+                print(f"✅ 删除成功，影响 {affected_rows} 条记录")
+                return True
+            else:
+                print("⚠️ 未找到待删除的记录")
+                return False
         except Exception as e:
             print(f"❌ 删除失败：{str(e)}")
-            db.connection.rollback()
             return False
+
+    def sync_to_cloud(self, remote_backend, batch_size=500):
+        """将本地（SQLite）后端的变更批量同步到云端后端"""
+        if not hasattr(self.backend, "sync_to"):
+            print("⚠️ 当前后端无需同步")
+            return 0
+        try:
+            synced = self.backend.sync_to(remote_backend, batch_size=batch_size)
+            print(f"✅ 同步完成，共 {synced} 条记录")
+            return synced
+        except Exception as e:
+            print(f"❌ 同步失败：{str(e)}")
+            return 0
+
+    def statement_stats(self):
+        """各 SQL 语句的调用次数与耗时分位数"""
+        return STATEMENTS.stats()
@@ -0,0 +1,95 @@
+"""
+home_status 查询基准：JSON 全表扫描 vs. 生成列索引（本地 SQLite 后端）
+
+用法：python bench_status_index.py [--rows 10000000] [--path bench.db]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from storage_backend import SQLiteBackend
+
+SCAN_SQL = ("SELECT COUNT(*) AS n FROM user_home_data NOT INDEXED "
+            "WHERE json_extract(home_status, '$.\"老人\"') = '有' AND data_date = %s")
+INDEX_SQL = "SELECT COUNT(*) AS n FROM user_home_data WHERE has_elder = %s AND data_date = %s"
+
+
+def populate(backend, rows, batch_size=100_000):
+    """批量写入测试数据：约 10% 家庭有老人、30% 有小孩"""
+    statuses = [
+        json.dumps({"老人": elder, "小孩": child}, ensure_ascii=False)
+        for elder in ("有", "无") for child in ("有", "无")
+    ]
+    weights = [0.03, 0.07, 0.27, 0.63]
+    start = date(2024, 1, 1)
+    conn = backend._connection()
+    # 在已有数据之后追加，避免与已有行的 (user_id, data_date) 冲突
+    first_user = conn.execute("SELECT COALESCE(MAX(user_id) + 1, 0) FROM user_home_data").fetchone()[0]
+    # 压测数据不需要进入同步队列：写入期间暂时去掉插入触发器，结束后（包括出错时）按原定义恢复
+    trigger = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_user_home_data_insert'"
+    ).fetchone()
+    conn.execute("DROP TRIGGER IF EXISTS trg_user_home_data_insert")
+    try:
+        inserted = 0
+        while inserted < rows:
+            n = min(batch_size, rows - inserted)
+            batch = [
+                (first_user + inserted + i, (start + timedelta(days=(inserted + i) % 365)).isoformat(),
+                 random.choices(statuses, weights)[0])
+                for i in range(n)
+            ]
+            with conn:
+                conn.executemany(
+                    "INSERT INTO user_home_data (user_id, data_date, home_status) VALUES (?, ?, ?)", batch
+                )
+            inserted += n
+    finally:
+        if trigger is not None:
+            with conn:
+                conn.execute(trigger[0])
+
+
+def timed(backend, sql, params, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = backend.fetchall(sql, params)[0]["n"]
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--path", default=None, help="数据库文件（默认临时目录）")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(), "bench_status.db")
+    backend = SQLiteBackend(path)
+    existing = backend.fetchall("SELECT COUNT(*) AS n FROM user_home_data")[0]["n"]
+    if existing < args.rows:
+        t0 = time.perf_counter()
+        populate(backend, args.rows - existing)
+        print(f"写入 {args.rows - existing} 行耗时 {time.perf_counter() - t0:.1f}s")
+    backend._connection().execute("ANALYZE")
+
+    day = "2024-03-01"
+    scan_time, scan_n = timed(backend, SCAN_SQL, (day,), args.repeat)
+    index_time, index_n = timed(backend, INDEX_SQL, (1, day), args.repeat)
+    assert scan_n == index_n, "扫描与索引结果不一致"
+
+    print(f"rows={args.rows} 匹配={index_n}")
+    print(f"JSON 全表扫描: {scan_time * 1000:10.2f} ms")
+    print(f"生成列索引:    {index_time * 1000:10.2f} ms  (加速 {scan_time / max(index_time, 1e-9):.0f}x)")
+    backend.close()
+
+
+if __name__ == "__main__":
+    main()
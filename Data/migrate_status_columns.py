@@ -0,0 +1,30 @@
+"""
+为已按旧版 3.sql 建好的 user_home_data 表补充 home_status 生成列与索引
+
+用法：
+    python migrate_status_columns.py           # 直接对 .env 配置的数据库执行
+    python migrate_status_columns.py --print   # 仅打印 MySQL/GaussDB 迁移 SQL
+"""
+import sys
+from storage_backend import create_backend, status_column_ddl
+
+
+def migration_sql(dialect="mysql"):
+    """返回迁移 SQL 文本"""
+    lines = ["USE home_manager;", ""]
+    for _, add_column, create_index in status_column_ddl(dialect):
+        lines.append(add_column + ";")
+        lines.append(create_index + ";")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if "--print" in sys.argv:
+        print(migration_sql())
+    else:
+        backend = create_backend()
+        added = backend.ensure_status_columns()
+        if added:
+            print(f"✅ 已新增生成列及索引：{added}")
+        else:
+            print("⚠️ 生成列已存在，无需迁移")
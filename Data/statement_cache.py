@@ -0,0 +1,111 @@
+import threading
+import time
+import weakref
+
+
+class Statement:
+    """
+    已注册的 SQL 语句：SQL 文本只构建一次，按后端缓存预编译结果，并统计调用次数与耗时
+    """
+
+    def __init__(self, name, sql, sample_size=1024, observer=None):
+        self.name = name
+        self.sql = sql
+        self.observer = observer
+        self.calls = 0
+        self.errors = 0
+        # 以后端对象本身为键（弱引用）：后端释放后条目随之消失，不会因 id 复用拿到别的方言的 SQL
+        self._prepared = weakref.WeakKeyDictionary()
+        self._samples = [0.0] * sample_size
+        self._sample_count = 0
+        self._lock = threading.Lock()
+
+    def _prepare(self, backend):
+        prepared = self._prepared.get(backend)
+        if prepared is None:
+            prepared = backend.prepare(self.sql)
+            with self._lock:
+                self._prepared[backend] = prepared
+        return prepared
+
+    def _record(self, elapsed, failed):
+        with self._lock:
+            self.calls += 1
+            if failed:
+                self.errors += 1
+            self._samples[self._sample_count % len(self._samples)] = elapsed
+            self._sample_count += 1
+        if self.observer is not None:
+            self.observer(self.name, elapsed, failed)
+
+    def _run(self, method, backend, params):
+        prepared = self._prepare(backend)
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = getattr(backend, method)(prepared, params)
+            failed = False
+            return result
+        finally:
+            self._record(time.perf_counter() - start, failed)
+
+    def execute(self, backend, params=()):
+        """执行写语句，返回 (影响行数, 新记录ID)"""
+        return self._run("execute", backend, params)
+
+    def fetchall(self, backend, params=()):
+        """执行查询语句，返回 dict 列表"""
+        return self._run("fetchall", backend, params)
+
+    def stats(self):
+        """调用次数与最近样本的耗时分位数（毫秒）"""
+        with self._lock:
+            count = min(self._sample_count, len(self._samples))
+            samples = sorted(self._samples[:count])
+            calls, errors = self.calls, self.errors
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(count - 1, int(p * count))] * 1000
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "p50_ms": round(percentile(0.50), 3),
+            "p95_ms": round(percentile(0.95), 3),
+            "p99_ms": round(percentile(0.99), 3),
+        }
+
+
+class StatementRegistry:
+    """
+    SQL 语句注册表：同一语句形状只注册一次，所有连接共享
+    observer(name, elapsed, failed) 在每次执行后调用，用于对接外部指标
+    """
+
+    def __init__(self, sample_size=1024, observer=None):
+        self.sample_size = sample_size
+        self.observer = observer
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, sql):
+        """注册语句（同名重复注册返回已有语句）"""
+        with self._lock:
+            statement = self._statements.get(name)
+            if statement is None:
+                statement = Statement(name, sql, self.sample_size, self.observer)
+                self._statements[name] = statement
+            return statement
+
+    def get_or_build(self, name, build_sql):
+        """按形状名取语句，不存在时调用 build_sql() 构建后注册"""
+        statement = self._statements.get(name)
+        if statement is None:
+            statement = self.register(name, build_sql())
+        return statement
+
+    def stats(self):
+        """所有语句的统计信息"""
+        return {name: statement.stats() for name, statement in list(self._statements.items())}
@@ -0,0 +1,355 @@
+import os
+import json
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# SQLite 版 user_home_data，字段与 3.sql 保持一致，便于边缘网关离线使用
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_home_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    data_date DATE NOT NULL,
+    home_status JSON NOT NULL CHECK (json_valid(home_status)),
+    create_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+    update_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, data_date)
+);
+
+-- 待同步到云端的变更队列（由触发器自动维护）
+CREATE TABLE IF NOT EXISTS sync_outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    data_date DATE NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_user_home_data_insert AFTER INSERT ON user_home_data
+BEGIN
+    INSERT INTO sync_outbox (op, user_id, data_date) VALUES ('upsert', NEW.user_id, NEW.data_date);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_home_data_update AFTER UPDATE ON user_home_data
+BEGIN
+    INSERT INTO sync_outbox (op, user_id, data_date) VALUES ('upsert', NEW.user_id, NEW.data_date);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_home_data_delete AFTER DELETE ON user_home_data
+BEGIN
+    INSERT INTO sync_outbox (op, user_id, data_date) VALUES ('delete', OLD.user_id, OLD.data_date);
+END;
+"""
+
+# home_status 中需要建索引的标志位：生成列名 -> JSON 键（值为“有”时列为 1）
+HOME_STATUS_FLAGS = {
+    "has_elder": "老人",
+    "has_child": "小孩",
+}
+
+
+def status_column_ddl(dialect):
+    """
+    生成 home_status 标志位的虚拟列及索引 DDL
+    :param dialect: "mysql"（GaussDB）或 "sqlite"
+    :return: [(列名, 加列语句, 建索引语句)]
+    """
+    statements = []
+    for column, key in HOME_STATUS_FLAGS.items():
+        if dialect == "mysql":
+            add_column = (
+                f"ALTER TABLE user_home_data ADD COLUMN {column} TINYINT(1) "
+                f"AS (JSON_UNQUOTE(JSON_EXTRACT(home_status, '$.\"{key}\"')) = '有') VIRTUAL "
+                f"COMMENT '由 home_status 生成：是否有{key}'"
+            )
+        elif dialect == "sqlite":
+            add_column = (
+                f"ALTER TABLE user_home_data ADD COLUMN {column} INTEGER "
+                f"GENERATED ALWAYS AS (json_extract(home_status, '$.\"{key}\"') = '有') VIRTUAL"
+            )
+        else:
+            raise ValueError(f"不支持的方言: {dialect}")
+        create_index = f"CREATE INDEX idx_{column} ON user_home_data ({column}, data_date)"
+        statements.append((column, add_column, create_index))
+    return statements
+
+
+class StorageBackend:
+    """
+    存储后端接口：HomeDataOperator 只依赖 execute / fetchall
+    SQL 统一使用 %s 占位符，由具体后端负责转换
+    """
+
+    def execute(self, sql, params=()):
+        """执行写操作，返回 (影响行数, 新记录ID)"""
+        raise NotImplementedError
+
+    def executemany(self, sql, seq_of_params):
+        """批量执行写操作，返回影响行数"""
+        raise NotImplementedError
+
+    def fetchall(self, sql, params=()):
+        """执行查询，返回 dict 列表"""
+        raise NotImplementedError
+
+    def prepare(self, sql):
+        """把统一格式的 SQL 编译为后端可直接执行的形式（每种语句只调用一次）"""
+        return sql
+
+    def ensure_status_columns(self):
+        """确保 home_status 标志位的虚拟列和索引存在，返回新增的列名"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class GaussDBBackend(StorageBackend):
+    """
+    云端 GaussDB 后端（沿用 GaussDBConnector 的连接配置）
+    连接放入连接池复用，避免每条语句都重新建连
+    pymysql 不支持服务端预编译语句，prepare 直接返回 SQL 文本
+    """
+
+    def __init__(self, connector_factory=None, pool_size=4):
+        if connector_factory is None:
+            from db_connect import GaussDBConnector
+            connector_factory = GaussDBConnector
+        self._connector_factory = connector_factory
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _checkout(self):
+        """取出池中可用的连接；池空时新建，重连失败的连接直接丢弃"""
+        while True:
+            try:
+                db = self._pool.get_nowait()
+            except queue.Empty:
+                db = self._connector_factory()
+                db.connect()
+                return db
+            try:
+                db.connection.ping(reconnect=True)
+                return db
+            except Exception:
+                self._discard(db)
+
+    @staticmethod
+    def _discard(db):
+        try:
+            db.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def _connection(self):
+        """从连接池取出连接，用完归还（池满或回滚失败则关闭）"""
+        db = self._checkout()
+        reusable = True
+        try:
+            yield db
+        except Exception:
+            try:
+                db.connection.rollback()
+            except Exception:
+                reusable = False
+            raise
+        finally:
+            if reusable:
+                try:
+                    self._pool.put_nowait(db)
+                except queue.Full:
+                    self._discard(db)
+            else:
+                self._discard(db)
+
+    def execute(self, sql, params=()):
+        with self._connection() as db:
+            affected_rows = db.cursor.execute(sql, params)
+            db.connection.commit()
+            return affected_rows, db.cursor.lastrowid
+
+    def executemany(self, sql, seq_of_params):
+        with self._connection() as db:
+            affected_rows = db.cursor.executemany(sql, seq_of_params)
+            db.connection.commit()
+            return affected_rows
+
+    def fetchall(self, sql, params=()):
+        with self._connection() as db:
+            db.cursor.execute(sql, params)
+            return db.cursor.fetchall()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def ensure_status_columns(self):
+        existing = {
+            row["COLUMN_NAME"] for row in self.fetchall(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_home_data'"
+            )
+        }
+        added = []
+        for column, add_column, create_index in status_column_ddl("mysql"):
+            if column not in existing:
+                self.execute(add_column)
+                self.execute(create_index)
+                added.append(column)
+        return added
+
+    def upsert_home_data(self, rows):
+        """按 (user_id, data_date) 批量写入/覆盖，供边缘端同步使用"""
+        sql = """
+            INSERT INTO user_home_data (user_id, data_date, home_status)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE home_status = VALUES(home_status), update_time = CURRENT_TIMESTAMP
+        """
+        return self.executemany(sql, [(r["user_id"], r["data_date"], r["home_status"]) for r in rows])
+
+    def delete_home_data(self, keys):
+        """按 (user_id, data_date) 批量删除"""
+        sql = "DELETE FROM user_home_data WHERE user_id = %s AND data_date = %s"
+        return self.executemany(sql, list(keys))
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    嵌入式 SQLite 后端（WAL 模式），用于边缘网关本地低延迟存储和离线测试
+    每个线程复用一个连接，写操作在本地提交后由 sync_to 批量上传云端
+    """
+
+    def __init__(self, path="home_manager.db"):
+        self.path = path
+        self._local = threading.local()
+        self._sql_cache = {}
+        self._sync_lock = threading.Lock()
+        self._connection().executescript(SQLITE_SCHEMA)
+        self.ensure_status_columns()
+
+    def _connection(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            # cached_statements：每个连接缓存已编译的 sqlite3_stmt，同一 SQL 文本不再重复解析
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = conn
+        return conn
+
+    def _translate(self, sql):
+        """把 MySQL 风格的 %s 占位符转换为 SQLite 的 ?（结果缓存）"""
+        translated = self._sql_cache.get(sql)
+        if translated is None:
+            translated = sql.replace("%s", "?")
+            self._sql_cache[sql] = translated
+            self._sql_cache[translated] = translated
+        return translated
+
+    def prepare(self, sql):
+        return self._translate(sql)
+
+    @staticmethod
+    def _encode(params):
+        # home_status 允许直接传 dict，统一存成 JSON 文本
+        return [json.dumps(p, ensure_ascii=False) if isinstance(p, dict) else p for p in params]
+
+    def execute(self, sql, params=()):
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(self._translate(sql), self._encode(params))
+            return cursor.rowcount, cursor.lastrowid
+
+    def executemany(self, sql, seq_of_params):
+        conn = self._connection()
+        with conn:
+            cursor = conn.executemany(self._translate(sql), (self._encode(p) for p in seq_of_params))
+            return cursor.rowcount
+
+    def fetchall(self, sql, params=()):
+        cursor = self._connection().execute(self._translate(sql), self._encode(params))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def ensure_status_columns(self):
+        conn = self._connection()
+        existing = {row["name"] for row in conn.execute("PRAGMA table_xinfo(user_home_data)")}
+        added = []
+        with conn:
+            for column, add_column, create_index in status_column_ddl("sqlite"):
+                if column not in existing:
+                    conn.execute(add_column)
+                    conn.execute(create_index)
+                    added.append(column)
+        return added
+
+    def pending_changes(self):
+        """待同步的变更条数"""
+        return self.fetchall("SELECT COUNT(*) AS n FROM sync_outbox")[0]["n"]
+
+    def sync_to(self, remote, batch_size=500):
+        """
+        将本地变更按批次同步到云端后端
+        同一 (user_id, data_date) 的多次变更只上传最后一次结果
+        :return: 同步的记录数
+        """
+        synced = 0
+        with self._sync_lock:
+            while True:
+                batch = self.fetchall(
+                    "SELECT seq, op, user_id, data_date FROM sync_outbox ORDER BY seq LIMIT %s",
+                    (batch_size,)
+                )
+                if not batch:
+                    return synced
+
+                latest = {}
+                for change in batch:
+                    latest[(change["user_id"], change["data_date"])] = change["op"]
+
+                upsert_keys = [key for key, op in latest.items() if op == "upsert"]
+                delete_keys = [key for key, op in latest.items() if op == "delete"]
+
+                rows = []
+                for user_id, data_date in upsert_keys:
+                    found = self.fetchall(
+                        "SELECT user_id, data_date, home_status FROM user_home_data "
+                        "WHERE user_id = %s AND data_date = %s",
+                        (user_id, data_date)
+                    )
+                    if found:
+                        rows.extend(found)
+                    else:
+                        # 同一批次内插入后又被删除
+                        delete_keys.append((user_id, data_date))
+
+                if rows:
+                    remote.upsert_home_data(rows)
+                if delete_keys:
+                    remote.delete_home_data(delete_keys)
+
+                self.execute("DELETE FROM sync_outbox WHERE seq <= %s", (batch[-1]["seq"],))
+                synced += len(latest)
+
+    def close(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is not None:
+            conn.close()
+            self._local.connection = None
+
+
+def create_backend():
+    """根据 .env 中的 STORAGE_BACKEND 创建后端（gaussdb / sqlite）"""
+    kind = os.getenv("STORAGE_BACKEND", "gaussdb").strip().lower()
+    if kind == "sqlite":
+        return SQLiteBackend(os.getenv("SQLITE_PATH", "home_manager.db"))
+    if kind == "gaussdb":
+        return GaussDBBackend()
+    raise ValueError(f"未知的存储后端: {kind}")
@@ -18,4 +18,23 @@ function request(path, method='GET', data={}, token=''){
   });
 }
 
-module.exports = { request };
\ No newline at end of file
+// 设备增量同步：本地缓存 + 游标，每次只拉取游标之后新增、变化或删除的设备
+const deviceCache = { cursor: 0, devices: {} };
+
+function syncDevices(token=''){
+  const page = () => request('/api/devices/changes?since=' + deviceCache.cursor + '&limit=500', 'GET', {}, token)
+    .then(res => {
+      // 游标原样回传（分片网关下是各分片游标拼成的字符串）；
+      // 游标失效（首次同步或服务端重启）时服务端返回全量，先清空缓存
+      if (res.reset) deviceCache.devices = {};
+      res.changes.forEach(item => {
+        deviceCache.devices[item.id] = { device_id: item.id, type: item.type, state: item.state };
+      });
+      res.deleted.forEach(id => { delete deviceCache.devices[id]; });
+      deviceCache.cursor = res.cursor;
+      return res.more ? page() : Object.values(deviceCache.devices);
+    });
+  return page();
+}
+
+module.exports = { request, syncDevices };
\ No newline at end of file
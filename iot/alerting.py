@@ -0,0 +1,173 @@
+import threading
+import time
+import numpy as np
+
+# 监测的指标，顺序即数组的行号
+METRICS = ("temperature", "humidity")
+
+# 默认阈值：(下限, 上限, 回差, 最大变化率/秒)
+DEFAULT_RULES = {
+    "temperature": (5.0, 35.0, 1.0, 0.5),
+    "humidity": (20.0, 80.0, 3.0, 2.0),
+}
+
+
+class AlertEngine:
+    """
+    传感器阈值告警引擎
+    所有传感器的最新读数和阈值保存在连续的 NumPy 数组中（行=指标，列=设备），
+    每个 tick 用一次向量化计算完成越限、回差和变化率判断
+    读数由监听器 / MQTT 线程写入、tick 在监控线程执行，数组的读写都在 _lock 内进行
+    """
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.Lock()
+        self._index = {}          # device_id -> 列号
+        self._device_ids = []
+        self._user_ids = []
+        self._size = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        shape = (len(METRICS), capacity)
+        old_size = self._size
+        fields = {
+            "values": np.full(shape, np.nan),
+            "prev_values": np.full(shape, np.nan),
+            "low": np.full(shape, -np.inf),
+            "high": np.full(shape, np.inf),
+            "hysteresis": np.zeros(shape),
+            "max_rate": np.full(shape, np.inf),
+            "alarm": np.zeros(shape, dtype=bool),
+            "rate_alarm": np.zeros(shape, dtype=bool),
+        }
+        vectors = {
+            "timestamps": np.zeros(capacity),
+            "prev_timestamps": np.zeros(capacity),
+            "fresh": np.zeros(capacity, dtype=bool),
+        }
+        for name, array in fields.items():
+            if old_size:
+                array[:, :old_size] = getattr(self, name)[:, :old_size]
+            setattr(self, name, array)
+        for name, array in vectors.items():
+            if old_size:
+                array[:old_size] = getattr(self, name)[:old_size]
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def register(self, device_id, user_id, **rules):
+        """
+        注册传感器及其阈值规则
+        rules 形如 temperature=(下限, 上限, 回差, 最大变化率)，缺省使用 DEFAULT_RULES
+        """
+        with self._lock:
+            slot = self._index.get(device_id)
+            if slot is None:
+                if self._size == self._capacity:
+                    self._allocate(self._capacity * 2)
+                slot = self._size
+                self._size += 1
+                self._index[device_id] = slot
+                self._device_ids.append(device_id)
+                self._user_ids.append(user_id)
+            else:
+                self._user_ids[slot] = user_id
+
+            for row, metric in enumerate(METRICS):
+                low, high, hysteresis, max_rate = rules.get(metric, DEFAULT_RULES[metric])
+                self.low[row, slot] = low
+                self.high[row, slot] = high
+                self.hysteresis[row, slot] = hysteresis
+                self.max_rate[row, slot] = max_rate
+            return slot
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, device_id):
+        return device_id in self._index
+
+    def update(self, device_id, temperature, humidity, timestamp=None):
+        """写入单个传感器的最新读数（只做数组赋值，判断推迟到 tick）"""
+        with self._lock:
+            slot = self._index[device_id]
+            self.prev_values[:, slot] = self.values[:, slot]
+            self.prev_timestamps[slot] = self.timestamps[slot]
+            self.values[0, slot] = temperature
+            self.values[1, slot] = humidity
+            self.timestamps[slot] = time.time() if timestamp is None else timestamp
+            self.fresh[slot] = True
+
+    def update_many(self, slots, temperatures, humidities, timestamp=None):
+        """批量写入读数（slots 为 register 返回的列号数组）"""
+        slots = np.asarray(slots)
+        with self._lock:
+            self.prev_values[:, slots] = self.values[:, slots]
+            self.prev_timestamps[slots] = self.timestamps[slots]
+            self.values[0, slots] = temperatures
+            self.values[1, slots] = humidities
+            self.timestamps[slots] = time.time() if timestamp is None else timestamp
+            self.fresh[slots] = True
+
+    def tick(self):
+        """
+        对所有传感器做一次向量化评估
+        :return: 告警列表 [(指标, device_id, user_id, 附加数据)]
+        """
+        with self._lock:
+            return self._evaluate()
+
+    def _evaluate(self):
+        n = self._size
+        if not n:
+            return []
+
+        values = self.values[:, :n]
+        low = self.low[:, :n]
+        high = self.high[:, :n]
+        hysteresis = self.hysteresis[:, :n]
+        alarm = self.alarm[:, :n]
+        fresh = self.fresh[:n]
+
+        # 越限 + 回差：进入告警需越过阈值，解除告警需回到阈值内侧 hysteresis 以内
+        with np.errstate(invalid="ignore"):
+            out_of_range = (values > high) | (values < low)
+            cleared = (values <= high - hysteresis) & (values >= low + hysteresis)
+        raised = out_of_range & ~alarm
+        alarm &= ~cleared
+        alarm |= raised
+
+        # 变化率：只对本 tick 有新读数且有上一读数的传感器判断
+        # 同样锁存：超速时告警一次，直到某次新读数的变化率回到 max_rate 以内才解除；已在越限告警中的不再重复告警
+        dt = self.timestamps[:n] - self.prev_timestamps[:n]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.abs(values - self.prev_values[:, :n]) / np.where(dt > 0, dt, np.inf)
+            too_fast = fresh & (rate > self.max_rate[:, :n])
+            calm = fresh & (rate <= self.max_rate[:, :n])
+        rate_alarm = self.rate_alarm[:, :n]
+        rate_raised = too_fast & ~rate_alarm & ~alarm
+        rate_alarm &= ~calm
+        rate_alarm |= too_fast
+
+        fresh[:] = False
+
+        triggered = raised | rate_raised
+        if not triggered.any():
+            return []
+
+        alerts = []
+        rows, slots = np.nonzero(triggered)
+        for row, slot in zip(rows.tolist(), slots.tolist()):
+            value = float(values[row, slot])
+            reason = "rate_of_change" if not raised[row, slot] else (
+                "above_threshold" if value > high[row, slot] else "below_threshold")
+            alerts.append((METRICS[row], self._device_ids[slot], self._user_ids[slot], {
+                "metric": METRICS[row],
+                "value": value,
+                "reason": reason,
+                "low": float(low[row, slot]),
+                "high": float(high[row, slot]),
+                "rate": float(rate[row, slot]) if np.isfinite(rate[row, slot]) else None
+            }))
+        return alerts
@@ -0,0 +1,105 @@
+"""
+IoT 模块接口的 ASGI 版本：/api/iot/* 的路由和返回与 iot.py（Flask）一致，共用同一个 IoTModule
+
+用法（iot 目录下）：python async_iot.py [--port 8081]
+"""
+import argparse
+
+# iot.py 负责把仓库根目录加入 sys.path
+from iot import iot_module, snapshots
+from Cloud.client.util import Asgi
+from Cloud.client.util.Asgi import Response, json_response, run_blocking
+from Cloud.client.util.Codec import dumps
+
+app = Asgi.App("iot_asgi")
+
+
+@app.route('/api/iot/get_device_event')
+async def get_device_event(request):
+    """获取设备事件"""
+    return json_response(iot_module.get_device_event())
+
+
+@app.route('/api/iot/device_status')
+async def get_device_status(request):
+    """获取设备状态"""
+    device_id = request.arg('device_id')
+    if not device_id:
+        return json_response({"error": "缺少device_id参数"}, 400)
+
+    status = iot_module.get_device_status(device_id)
+    if status:
+        return json_response(status)
+    return json_response({"error": "设备不存在"}, 404)
+
+
+@app.route('/api/iot/control_device', methods=('POST',))
+async def control_device(request):
+    """控制设备（MQTT 后端下发命令可能阻塞，放到线程池执行）"""
+    data = request.json() or {}
+    device_id = data.get('device_id')
+    action = data.get('action')
+    value = data.get('value')
+
+    if not device_id or not action:
+        return json_response({"error": "缺少必要参数"}, 400)
+
+    return json_response(await run_blocking(iot_module.control_device, device_id, action, value))
+
+
+@app.route('/api/iot/user_devices')
+async def get_user_devices(request):
+    """获取用户的所有设备"""
+    user_id = request.arg('user_id')
+    if not user_id:
+        return json_response({"error": "缺少user_id参数"}, 400)
+    body, headers = snapshots.encode(("user_devices", user_id),
+                                     lambda: dumps(iot_module.get_user_devices(user_id)),
+                                     request.headers.get('accept-encoding'))
+    return Response(body, headers=headers)
+
+
+@app.route('/api/iot/rules')
+async def list_rules(request):
+    """获取所有联动规则"""
+    return json_response(iot_module.rule_engine.list_rules())
+
+
+@app.route('/api/iot/rules', methods=('POST',))
+async def add_rule(request):
+    """添加联动规则"""
+    data = request.json() or {}
+    name = data.get('name')
+    conditions = data.get('conditions')
+    actions = data.get('actions')
+
+    if not name or not conditions or not actions:
+        return json_response({"error": "缺少必要参数"}, 400)
+
+    try:
+        rule = iot_module.rule_engine.add_rule(name, conditions, actions)
+    except (TypeError, ValueError) as e:
+        return json_response({"error": str(e)}, 400)
+    return json_response(rule.to_dict(), 201)
+
+
+@app.route('/api/iot/rules/<name>', methods=('DELETE',))
+async def delete_rule(request, name):
+    """删除联动规则"""
+    if iot_module.rule_engine.remove_rule(name):
+        return json_response({"success": True})
+    return json_response({"error": "规则不存在"}, 404)
+
+
+@app.route('/api/iot/backend_stats')
+async def get_backend_stats(request):
+    """设备后端统计"""
+    return json_response(iot_module.backend.stats())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="IoT API (ASGI)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    Asgi.run(app, args.host, args.port)
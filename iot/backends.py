@@ -0,0 +1,285 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from enums import DeviceType
+from Cloud.client.util.Codec import dumps
+from Cloud.client.util.Payload import accept_header, decode_message, publish_properties, JSON
+from Cloud.client.util.CommandSchema import BY_KIND
+from Cloud.client.util.Metrics import COMMAND_ROUND_TRIP_SECONDS, MQTT_PUBLISHED, MQTT_RECEIVED, topic_class
+
+
+class DeviceBackend:
+    """
+    IoTModule 的设备后端接口
+    load_devices 返回的字典即 IoTModule.devices，后端负责保持其中状态最新
+    reports_state 为 True 的后端异步回报设备状态，状态变化经 on_state 回调通知，control 返回时状态尚未改变
+    """
+
+    reports_state = False
+
+    def load_devices(self):
+        """返回 {device_id: device_info}"""
+        raise NotImplementedError
+
+    def start(self, on_state=None):
+        """启动后端；on_state(device_id, device_info) 在设备状态变化时回调"""
+        self.on_state = on_state
+
+    def control(self, device_id, action, value=None):
+        """下发控制命令，返回 True 表示命令已受理"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+    def stop(self):
+        pass
+
+
+class InMemoryBackend(DeviceBackend):
+    """内存模拟设备（原 IoTModule 的行为）"""
+
+    def __init__(self):
+        self.devices = {}
+        self.on_state = None
+
+    def load_devices(self):
+        now = datetime.now()
+        self.devices = {
+            "ac_001": {
+                "type": DeviceType.AIR_CONDITIONER,
+                "name": "客厅空调",
+                "status": "off",
+                "temperature": 26,
+                "last_update": now,
+                "user_id": "user_001"
+            },
+            "light_001": {
+                "type": DeviceType.LIGHT,
+                "name": "主卧灯",
+                "status": "off",
+                "brightness": 70,
+                "last_update": now,
+                "user_id": "user_001"
+            },
+            "lock_001": {
+                "type": DeviceType.DOOR_LOCK,
+                "name": "大门锁",
+                "status": "locked",
+                "last_update": now,
+                "user_id": "user_001"
+            },
+            "temp_001": {
+                "type": DeviceType.TEMPERATURE_SENSOR,
+                "name": "客厅温度传感器",
+                "status": "normal",
+                "value": 25,
+                "last_update": now,
+                "user_id": "user_001"
+            }
+        }
+        return self.devices
+
+    def control(self, device_id, action, value=None):
+        device = self.devices[device_id]
+        if device["type"] == DeviceType.AIR_CONDITIONER:
+            if action == "turn_on":
+                device["status"] = "on"
+            elif action == "turn_off":
+                device["status"] = "off"
+            elif action == "set_temperature" and value is not None:
+                device["temperature"] = value
+
+        elif device["type"] == DeviceType.LIGHT:
+            if action == "turn_on":
+                device["status"] = "on"
+            elif action == "turn_off":
+                device["status"] = "off"
+            elif action == "set_brightness" and value is not None:
+                device["brightness"] = value
+
+        device["last_update"] = datetime.now()
+        return True
+
+
+class DeviceManagerBackend(DeviceBackend):
+    """
+    对接 Cloud/client 中 DeviceManager 管理的 MQTT 设备实体
+    命令经 home/<kind>/<id>/control/<command> 下发，
+    状态通过订阅 home/+/+/state 镜像到本地缓存，读状态不需要往返设备
+    manager 为空时从保留的状态消息中发现设备（实体由 DeviceController 所在进程持有，
+    在这里再建一个 DeviceManager 会用相同的 client_id 重复连接同一批设备，互相挤掉会话）
+    """
+
+    # 主题中的设备类别 -> (DeviceType 名称, 设备名前缀)
+    KINDS = {
+        "lights": ("LIGHT", "灯"),
+        "locks": ("DOOR_LOCK", "门锁"),
+        "sensors": ("TEMPERATURE_SENSOR", "环境传感器"),
+    }
+    MANAGER_KINDS = {"light": "lights", "lock": "locks", "sensor": "sensors"}
+    reports_state = True
+
+    def __init__(self, manager=None, broker="test.mosquitto.org", port=1883, user_id="user_001",
+                 latency_samples=1024):
+        import paho.mqtt.client as mqtt
+        self.manager = manager
+        self.broker = broker
+        self.port = port
+        self.user_id = user_id
+        self.on_state = None
+        self.devices = {}
+        self._kinds = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._latencies = deque(maxlen=latency_samples)
+
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=f"iot_bridge_{int(time.time())}",
+            protocol=mqtt.MQTTv5
+        )
+        self._command_properties = publish_properties(JSON, accept=accept_header())
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+
+    def _device_info(self, kind, device_id):
+        type_name, label = self.KINDS[kind]
+        return {
+            "type": DeviceType[type_name],
+            "name": f"{label}{device_id}",
+            "status": "unknown",
+            "last_update": datetime.now(),
+            "user_id": self.user_id
+        }
+
+    def load_devices(self):
+        if self.manager is not None:
+            for device in self.manager.list_devices():
+                kind = self.MANAGER_KINDS[device["type"]]
+                self._kinds[device["device_id"]] = kind
+                self.devices[device["device_id"]] = self._device_info(kind, device["device_id"])
+        return self.devices
+
+    def start(self, on_state=None):
+        self.on_state = on_state
+        self.client.connect(self.broker, self.port, keepalive=60)
+        self.client.loop_start()
+
+    def stop(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            print(f"设备桥接连接失败: {reason_code}")
+            return
+        client.subscribe("home/+/+/state", qos=1)
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            _, kind, device_id, _ = msg.topic.split('/')
+            if kind not in self.KINDS:
+                return
+            state = decode_message(msg)
+        except ValueError:
+            return
+        MQTT_RECEIVED.inc("iot_bridge", topic_class(msg.topic))
+
+        with self._lock:
+            pending = self._pending.pop(device_id, None)
+            if pending is not None:
+                action, sent_at = pending
+                elapsed = time.perf_counter() - sent_at
+                self._latencies.append(elapsed)
+                COMMAND_ROUND_TRIP_SECONDS.observe(elapsed, "iot_bridge", action)
+
+            device = self.devices.get(device_id)
+            if device is None:
+                device = self._device_info(kind, device_id)
+                self.devices[device_id] = device
+                self._kinds[device_id] = kind
+
+            if kind == "lights":
+                device["status"] = state.get("state", device["status"])
+                device["brightness"] = state.get("brightness")
+                device["color"] = state.get("color")
+            elif kind == "locks":
+                device["status"] = "locked" if state.get("locked") else "unlocked"
+            else:
+                device["status"] = "normal"
+                device["value"] = state.get("temperature")
+                device["humidity"] = state.get("humidity")
+                device["light"] = state.get("light")
+            device["last_update"] = datetime.now()
+
+        if self.on_state:
+            self.on_state(device_id, device)
+
+    def _command(self, kind, action, value):
+        """把 IoTModule 的动作翻译为实体的 MQTT 控制命令"""
+        if kind == "lights":
+            if action == "turn_on":
+                return "set_state", {"state": "on"}
+            if action == "turn_off":
+                return "set_state", {"state": "off"}
+            if action == "set_brightness" and value is not None:
+                return "set_brightness", {"brightness": value}
+            if action == "set_color" and value is not None:
+                return "set_color", {"color": value}
+        elif kind == "locks":
+            if action in ("lock", "unlock"):
+                return "lock", {"locked": action == "lock"}
+        return None
+
+    def control(self, device_id, action, value=None):
+        kind = self._kinds.get(device_id)
+        command = self._command(kind, action, value)
+        if command is None:
+            raise ValueError(f"设备{device_id}不支持操作{action}")
+        name, payload = command
+        # 参数不合法时抛 CommandError（ValueError 子类），不会发出
+        payload = BY_KIND[kind].validate(name, payload)
+        with self._lock:
+            self._pending[device_id] = (action, time.perf_counter())
+        result = self.client.publish(
+            f"home/{kind}/{device_id}/control/{name}", dumps(payload), qos=1,
+            properties=self._command_properties
+        )
+        if result.rc == 0:
+            MQTT_PUBLISHED.inc("iot_bridge", f"{kind}/control")
+        return result.rc == 0
+
+    def stats(self):
+        """控制命令到状态可见的延迟（毫秒）"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return {"samples": 0}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3)
+
+        return {
+            "samples": len(samples),
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(samples[-1] * 1000, 3)
+        }
+
+
+def create_backend():
+    """根据环境变量 IOT_BACKEND 选择后端（memory / device_manager）"""
+    kind = os.getenv("IOT_BACKEND", "memory")
+    if kind == "memory":
+        return InMemoryBackend()
+    if kind == "device_manager":
+        # 不在本进程创建设备实体，设备列表来自代理上保留的 home/+/+/state 消息
+        return DeviceManagerBackend(
+            broker=os.getenv("MQTT_BROKER", "test.mosquitto.org"),
+            port=int(os.getenv("MQTT_PORT", "1883"))
+        )
+    raise ValueError(f"未知的IoT后端: {kind}")
@@ -0,0 +1,19 @@
+from enum import Enum
+
+# 设备事件类型枚举
+class EventType(Enum):
+    NONE = "none"
+    DEVICE_FAULT = "device_fault"
+    FAMILY_RETURN = "family_return"
+    DEVICE_RISK = "device_risk"
+    DEVICE_STATUS_UPDATE = "device_status_update"
+    TEMPERATURE_ALERT = "temperature_alert"
+    HUMIDITY_ALERT = "humidity_alert"
+
+# 设备类型枚举
+class DeviceType(Enum):
+    AIR_CONDITIONER = "air_conditioner"
+    LIGHT = "light"
+    DOOR_LOCK = "door_lock"
+    TEMPERATURE_SENSOR = "temperature_sensor"
+    GAS_SENSOR = "gas_sensor"
@@ -1,36 +1,42 @@
 
-import json
+import os
+import sys
 import time
 from datetime import datetime
-from enum import Enum
 import threading
 import random  # 用于模拟设备事件，实际应用中移除
 
-# 设备事件类型枚举
-class EventType(Enum):
-    NONE = "none"
-    DEVICE_FAULT = "device_fault"
-    FAMILY_RETURN = "family_return"
-    DEVICE_RISK = "device_risk"
-    DEVICE_STATUS_UPDATE = "device_status_update"
-    TEMPERATURE_ALERT = "temperature_alert"
-    HUMIDITY_ALERT = "humidity_alert"
-
-# 设备类型枚举
-class DeviceType(Enum):
-    AIR_CONDITIONER = "air_conditioner"
-    LIGHT = "light"
-
+# 共享仓库根目录下的 Cloud 包（编解码器、设备实体等）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from enums import EventType, DeviceType
+from alerting import AlertEngine
+from rules import RuleEngine
+from backends import create_backend
 
 # IoT模块主类
 
 
 
 class IoTModule:
-    def __init__(self, api_port=8081):
+    def __init__(self, api_port=8081, backend=None):
         self.api_url = f"http://localhost:{api_port}/api/iot"
+        # 设备后端：默认内存模拟，IOT_BACKEND=device_manager 时对接真实 MQTT 设备
+        self.backend = backend or create_backend()
         self.devices = self._initialize_devices()
         self.event_listeners = []
+        # 后端上报的灯 / 门锁状态（只在变化时发出 DEVICE_STATUS_UPDATE）
+        self._reported = {}
+
+        # 温湿度告警引擎（所有传感器读数集中在数组中统一评估）
+        self.alert_engine = AlertEngine()
+        for device_id, device_info in self.devices.items():
+            if device_info["type"] == DeviceType.TEMPERATURE_SENSOR:
+                self.alert_engine.register(device_id, device_info["user_id"])
+
+        # 多设备联动规则，动作统一经 control_device 下发
+        self.rule_engine = RuleEngine(dispatch=self.control_device)
+
+        self.backend.start(on_state=self._on_backend_state)
 
         # 启动设备状态监控线程
         self.monitoring = True
@@ -39,52 +45,37 @@ class IoTModule:
         self.monitor_thread.start()
 
     def _initialize_devices(self):
-        """初始化设备列表（实际应用中应从数据库加载）"""
-        return {
-            "ac_001": {
-                "type": DeviceType.AIR_CONDITIONER,
-                "name": "客厅空调",
-                "status": "off",
-                "temperature": 26,
-                "last_update": datetime.now(),
-                "user_id": "user_001"
-            },
-            "light_001": {
-                "type": DeviceType.LIGHT,
-                "name": "主卧灯",
-                "status": "off",
-                "brightness": 70,
-                "last_update": datetime.now(),
-                "user_id": "user_001"
-            },
-            "lock_001": {
-                "type": DeviceType.DOOR_LOCK,
-                "name": "大门锁",
-                "status": "locked",
-                "last_update": datetime.now(),
-                "user_id": "user_001"
-            },
-
-            "temp_001": {
-                "type": DeviceType.TEMPERATURE_SENSOR,
-                "name": "客厅温度传感器",
-                "status": "normal",
-                "value": 25,
-                "last_update": datetime.now(),
-                "user_id": "user_001"
-            }
-        }
+        """初始化设备列表（由设备后端提供，返回的字典即后端的本地状态缓存）"""
+        return self.backend.load_devices()
+
+    def _on_backend_state(self, device_id, device_info):
+        """设备后端收到状态上报：传感器读数送入告警引擎，其他设备的状态变化作为 DEVICE_STATUS_UPDATE 事件发出"""
+        if device_info["type"] == DeviceType.TEMPERATURE_SENSOR:
+            if device_info.get("humidity") is not None:
+                if device_id not in self.alert_engine:
+                    self.alert_engine.register(device_id, device_info["user_id"])
+                self.update_sensor_reading(device_id, device_info["value"], device_info["humidity"])
+            return
+
+        state = {key: device_info[key] for key in ("status", "brightness", "color") if key in device_info}
+        if self._reported.get(device_id) == state:
+            return
+        self._reported[device_id] = state
+        self._trigger_event(EventType.DEVICE_STATUS_UPDATE, device_id, device_info["user_id"], state)
 
     def _device_monitor_loop(self):
         """设备监控循环，定期检查设备状态"""
         while self.monitoring:
             try:
-                # 检查每个设备的状态
-                for device_id, device_info in self.devices.items():
+                # 检查每个设备的状态（设备后端的线程可能同时新增设备，遍历快照）
+                for device_id, device_info in list(self.devices.items()):
                     # 模拟设备状态变化（实际应用中应通过实际设备接口获取）
                     if random.random() < 0.1:  # 10%的概率发生状态变化
                         self._simulate_device_event(device_id, device_info)
 
+                # 一次性评估所有传感器的阈值告警
+                self._evaluate_alerts()
+
                 # 休眠一段时间再检查
                 time.sleep(5)
             except Exception as e:
@@ -119,6 +110,37 @@ class IoTModule:
                 {"gas_level": round(random.uniform(0.5, 2.0), 2)}
             )
 
+    def _evaluate_alerts(self):
+        """执行一次告警评估，并把结果作为 TEMPERATURE_ALERT / HUMIDITY_ALERT 事件发出"""
+        alert_types = {
+            "temperature": EventType.TEMPERATURE_ALERT,
+            "humidity": EventType.HUMIDITY_ALERT
+        }
+        alerts = self.alert_engine.tick()
+        for metric, device_id, user_id, extra_data in alerts:
+            self._trigger_event(alert_types[metric], device_id, user_id, extra_data)
+        return alerts
+
+    def update_sensor_reading(self, device_id, temperature, humidity, timestamp=None):
+        """写入传感器最新读数（告警在下一次监控循环中统一评估）"""
+        if device_id not in self.alert_engine:
+            return False
+        self.alert_engine.update(device_id, temperature, humidity, timestamp)
+        if device_id in self.devices:
+            self.devices[device_id]["value"] = temperature
+            self.devices[device_id]["humidity"] = humidity
+            self.devices[device_id]["last_update"] = datetime.now()
+        return True
+
+    def attach_sensor(self, sensor, user_id, **rules):
+        """接入 EnvironmentSensor 实体：注册阈值规则并监听其读数变化"""
+        self.alert_engine.register(sensor.device_id, user_id, **rules)
+        sensor.state_listeners.append(
+            lambda state: self.update_sensor_reading(
+                state["device_id"], state["temperature"], state["humidity"], state["last_updated"]
+            )
+        )
+
     def _trigger_event(self, event_type, device_id, user_id, extra_data=None):
         """触发设备事件并通知所有监听器"""
         event_data = {
@@ -143,6 +165,9 @@ class IoTModule:
             except Exception as e:
                 print(f"通知事件监听器出错: {e}")
 
+        # 只评估与该事件相关的联动规则
+        self.rule_engine.process(event_data)
+
         print(f"触发事件: {event_data}")
         return event_data
 
@@ -176,31 +201,18 @@ class IoTModule:
         device = self.devices[device_id]
 
         try:
-            if device["type"] == DeviceType.AIR_CONDITIONER:
-                if action == "turn_on":
-                    device["status"] = "on"
-                elif action == "turn_off":
-                    device["status"] = "off"
-                elif action == "set_temperature" and value is not None:
-                    device["temperature"] = value
-
-            elif device["type"] == DeviceType.LIGHT:
-                if action == "turn_on":
-                    device["status"] = "on"
-                elif action == "turn_off":
-                    device["status"] = "off"
-                elif action == "set_brightness" and value is not None:
-                    device["brightness"] = value
-
-            device["last_update"] = datetime.now()
-
-            # 触发状态更新事件
-            self._trigger_event(
-                EventType.DEVICE_STATUS_UPDATE,
-                device_id,
-                device["user_id"],
-                {"status": device["status"], "action": action, "value": value}
-            )
+            # 由设备后端执行（内存模拟直接修改状态，MQTT 后端下发命令、状态异步回写缓存）
+            if not self.backend.control(device_id, action, value):
+                return {"success": False, "error": "控制命令下发失败"}
+
+            # 触发状态更新事件（异步回报状态的后端由设备上报新状态时触发，此时的状态还是旧的）
+            if not self.backend.reports_state:
+                self._trigger_event(
+                    EventType.DEVICE_STATUS_UPDATE,
+                    device_id,
+                    device["user_id"],
+                    {"status": device["status"], "action": action, "value": value}
+                )
 
             return {"success": True, "message": "设备控制成功"}
 
@@ -209,13 +221,20 @@ class IoTModule:
 
     def get_user_devices(self, user_id):
         """获取用户的所有设备"""
-        return {dev_id: info for dev_id, info in self.devices.items() if info["user_id"] == user_id}
+        return {dev_id: info for dev_id, info in list(self.devices.items()) if info["user_id"] == user_id}
 
 # Flask API实现（供其他模块调用）
 from flask import Flask, request, jsonify
+from Cloud.client.util.Codec import dumps, install_flask
+from Cloud.client.util import Compression, Metrics
+from Cloud.client.util.Wsgi import KeepAliveRequestHandler
 
 app = Flask(__name__)
+install_flask(app)
+Metrics.install_flask(app, "iot")
 iot_module = IoTModule()
+# 设备字典由多处直接修改，没有版本号：每次重新序列化，内容未变时复用压缩结果
+snapshots = Compression.SnapshotCache()
 
 @app.route('/api/iot/get_device_event', methods=['GET'])
 def get_device_event():
@@ -257,9 +276,45 @@ def get_user_devices():
     if not user_id:
         return jsonify({"error": "缺少user_id参数"}), 400
 
-    devices = iot_module.get_user_devices(user_id)
-    return jsonify(devices)
+    body, headers = snapshots.encode(("user_devices", user_id),
+                                     lambda: dumps(iot_module.get_user_devices(user_id)),
+                                     request.headers.get('Accept-Encoding'))
+    return app.response_class(body, mimetype="application/json", headers=headers)
+
+@app.route('/api/iot/rules', methods=['GET'])
+def list_rules():
+    """获取所有联动规则"""
+    return jsonify(iot_module.rule_engine.list_rules())
+
+@app.route('/api/iot/rules', methods=['POST'])
+def add_rule():
+    """添加联动规则"""
+    data = request.json or {}
+    name = data.get('name')
+    conditions = data.get('conditions')
+    actions = data.get('actions')
+
+    if not name or not conditions or not actions:
+        return jsonify({"error": "缺少必要参数"}), 400
+
+    try:
+        rule = iot_module.rule_engine.add_rule(name, conditions, actions)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(rule.to_dict()), 201
+
+@app.route('/api/iot/rules/<name>', methods=['DELETE'])
+def delete_rule(name):
+    """删除联动规则"""
+    if iot_module.rule_engine.remove_rule(name):
+        return jsonify({"success": True})
+    return jsonify({"error": "规则不存在"}), 404
+
+@app.route('/api/iot/backend_stats', methods=['GET'])
+def get_backend_stats():
+    """设备后端统计（如控制命令到状态可见的延迟）"""
+    return jsonify(iot_module.backend.stats())
 
 if __name__ == '__main__':
-    # 启动IoT模块API服务
-    app.run(port=8081, debug=True)
\ No newline at end of file
+    # 启动IoT模块API服务（HTTP/1.1 长连接）
+    app.run(port=8081, debug=True, request_handler=KeepAliveRequestHandler)
\ No newline at end of file
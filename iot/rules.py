@@ -0,0 +1,211 @@
+import operator
+import threading
+from collections import defaultdict
+
+# 条件支持的比较运算
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "in": lambda actual, expected: actual in expected,
+}
+
+# 通配设备ID：匹配任意设备的同类事件
+ANY_DEVICE = "*"
+
+
+class Condition:
+    """
+    规则条件（alpha 节点）
+    attribute 为 None 时表示瞬时事件条件（如 family_return），事件发生即满足、不保留状态；
+    否则为状态条件，满足与否会一直保持到同一属性的下一个事件；
+    通配设备的状态条件按设备分别记录，任一设备满足即满足（如“任一窗户打开”）
+    """
+
+    __slots__ = ("rule", "device_id", "event_type", "attribute", "op", "value", "_test", "satisfied", "matching")
+
+    def __init__(self, device_id, event_type, attribute=None, op="==", value=None):
+        if op not in OPERATORS:
+            raise ValueError(f"不支持的运算符: {op}")
+        self.rule = None
+        self.device_id = device_id
+        self.event_type = event_type
+        self.attribute = attribute
+        self.op = op
+        self.value = value
+        self._test = OPERATORS[op]
+        self.satisfied = False
+        # 通配条件当前满足的设备ID
+        self.matching = set()
+
+    @property
+    def momentary(self):
+        return self.attribute is None
+
+    def evaluate(self, event):
+        try:
+            return bool(self._test(event.get(self.attribute), self.value))
+        except TypeError:
+            return False
+
+    def update(self, event):
+        """用事件更新状态条件，返回更新后是否满足"""
+        result = self.evaluate(event)
+        if self.device_id != ANY_DEVICE:
+            return result
+        if result:
+            self.matching.add(event.get("device_id"))
+        else:
+            self.matching.discard(event.get("device_id"))
+        return bool(self.matching)
+
+    def to_dict(self):
+        return {
+            "device_id": self.device_id,
+            "event_type": self.event_type,
+            "attribute": self.attribute,
+            "op": self.op,
+            "value": self.value
+        }
+
+
+class Rule:
+    """联动规则：所有条件满足时依次执行动作"""
+
+    def __init__(self, name, conditions, actions):
+        if not conditions:
+            raise ValueError("规则至少需要一个条件")
+        if not actions:
+            raise ValueError("规则至少需要一个动作")
+        for action in actions:
+            # 动作在事件线程中执行，格式错误要在添加时就拒绝，而不是等到触发时才出错
+            if not isinstance(action, dict) or not action.get("device_id") or not action.get("action"):
+                raise ValueError(f"动作必须包含 device_id 和 action: {action}")
+        self.name = name
+        self.conditions = conditions
+        self.actions = actions
+        self.has_momentary = any(c.momentary for c in conditions)
+        # 尚未满足的状态条件数（beta 节点计数，增量维护）
+        self.unsatisfied = sum(1 for c in conditions if not c.momentary)
+        self.fired = 0
+        for condition in conditions:
+            condition.rule = self
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "conditions": [c.to_dict() for c in self.conditions],
+            "actions": self.actions,
+            "fired": self.fired
+        }
+
+
+class RuleEngine:
+    """
+    设备联动规则引擎（Rete 风格增量匹配）
+    条件按 (设备ID, 事件类型) -> 属性 建立索引，每个事件只评估与之相关的条件；
+    规则的满足计数随条件状态变化增量更新，不需要重新扫描全部规则
+    """
+
+    def __init__(self, dispatch, max_depth=3):
+        """
+        :param dispatch: 动作执行函数 dispatch(device_id, action, value)，如 IoTModule.control_device
+        :param max_depth: 动作触发的事件再次触发规则的最大嵌套层数，防止联动死循环
+        """
+        self.dispatch = dispatch
+        self.max_depth = max_depth
+        self.rules = {}
+        self._alpha = defaultdict(lambda: defaultdict(list))
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.evaluated = 0
+
+    def add_rule(self, name, conditions, actions):
+        """
+        添加规则
+        :param conditions: [Condition] 或等价的 dict 列表
+        :param actions: [{"device_id": ..., "action": ..., "value": ...}]
+        """
+        conditions = [c if isinstance(c, Condition) else Condition(**c) for c in conditions]
+        rule = Rule(name, conditions, list(actions))
+        with self._lock:
+            if name in self.rules:
+                self.remove_rule(name)
+            self.rules[name] = rule
+            for condition in conditions:
+                self._alpha[(condition.device_id, condition.event_type)][condition.attribute].append(condition)
+        return rule
+
+    def remove_rule(self, name):
+        with self._lock:
+            rule = self.rules.pop(name, None)
+            if rule is None:
+                return False
+            for condition in rule.conditions:
+                key = (condition.device_id, condition.event_type)
+                bucket = self._alpha[key][condition.attribute]
+                bucket.remove(condition)
+                if not bucket:
+                    del self._alpha[key][condition.attribute]
+                if not self._alpha[key]:
+                    del self._alpha[key]
+            return True
+
+    def _matching_conditions(self, event):
+        event_type = event.get("event_type")
+        for device_id in (event.get("device_id"), ANY_DEVICE):
+            by_attribute = self._alpha.get((device_id, event_type))
+            if not by_attribute:
+                continue
+            for attribute, conditions in by_attribute.items():
+                if attribute is None or attribute in event:
+                    yield from conditions
+
+    def process(self, event):
+        """
+        处理一个事件，返回本次触发的规则名列表
+        event 与 IoTModule._trigger_event 产生的事件字典格式相同
+        """
+        depth = getattr(self._local, "depth", 0)
+        if depth >= self.max_depth:
+            return []
+
+        triggered = []
+        with self._lock:
+            candidates = {}
+            for condition in self._matching_conditions(event):
+                self.evaluated += 1
+                rule = condition.rule
+                if condition.momentary:
+                    candidates[rule.name] = rule
+                    continue
+                result = condition.update(event)
+                if result != condition.satisfied:
+                    condition.satisfied = result
+                    rule.unsatisfied += -1 if result else 1
+                    if result and not rule.has_momentary:
+                        candidates[rule.name] = rule
+
+            for rule in candidates.values():
+                if rule.unsatisfied == 0:
+                    rule.fired += 1
+                    triggered.append(rule)
+
+        self._local.depth = depth + 1
+        try:
+            for rule in triggered:
+                for action in rule.actions:
+                    try:
+                        self.dispatch(action["device_id"], action["action"], action.get("value"))
+                    except Exception as e:
+                        print(f"执行规则{rule.name}动作出错: {e}")
+        finally:
+            self._local.depth = depth
+        return [rule.name for rule in triggered]
+
+    def list_rules(self):
+        with self._lock:
+            return [rule.to_dict() for rule in self.rules.values()]
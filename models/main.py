@@ -2,8 +2,14 @@ import requests
 import json
 from dotenv import load_dotenv
 import os
+import sys
+import time
 from datetime import datetime
 
+# 复用 Cloud 中的指标模块（设置 METRICS_PORT 时单独暴露 /metrics）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Cloud.client.util.Metrics import LLM_REQUEST_SECONDS, start_http_server
+
 # 1. 加载配置（敏感信息从.env文件读取，记得创建包含关键信息的.env文件在当前目录下）
 
 load_dotenv()  # 加载.env文件
@@ -74,12 +80,15 @@ def call_deepseek_api(prompt: str) -> str:
         "max_tokens": 200  # 最大生成文本token数
     }
 
+    start = time.perf_counter()
     try:
         response = requests.post(url=DEEPSEEK_API_URL, headers=headers, data=json.dumps(payload))
         response.raise_for_status()
         result = response.json()
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, payload["model"], "ok")
         return result["choices"][0]["message"]["content"].strip()  # 提取生成的对话
     except Exception as e:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, payload["model"], "error")
         print(f"DeepSeek API调用失败：{str(e)}")
         return "服务器繁忙，请稍后再试的说~"  # 经典
 
@@ -149,6 +158,7 @@ def trigger_ai_dialog() -> None:
 
 if __name__ == "__main__":
     # 本地测试：模拟触发1次AI对话（可替换为实际事件）
+    start_http_server()
     print("=== 开始测试主动触发AI对话 ===")
     trigger_ai_dialog()
     print("=== 测试结束 ===")
\ No newline at end of file